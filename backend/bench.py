@@ -0,0 +1,680 @@
+"""
+RIOimgDownload 效能量測工具 (開發用，唔會被 main.py 載入)
+
+用法:
+    python backend/bench.py thumbs --count 24 --width 4000 --height 6000
+    python backend/bench.py thumbs --dir ./samples
+    python backend/bench.py scroll --url https://example.com/gallery --runs 3
+    python backend/bench.py netparse --capture https://x.com/someone/media --dir ./payloads
+    python backend/bench.py netparse --dir ./payloads
+    python backend/bench.py offline --items 200 --latency-ms 30 --json runs/today.json --compare runs/last.json
+    python backend/bench.py offline --serve
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+
+import main
+
+
+def synthetic_jpegs(count: int, width: int, height: int) -> List[bytes]:
+    """相機 JPEG 替身: 漸層 + 噪點 (唔會壓到太細)"""
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    img = Image.blend(base, noise, 0.35)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=92)
+    data = buf.getvalue()
+    return [data] * count
+
+
+def load_dir(path: str) -> List[bytes]:
+    out = []
+    for name in sorted(os.listdir(path)):
+        p = os.path.join(path, name)
+        if os.path.isfile(p):
+            with open(p, "rb") as f:
+                out.append(f.read())
+    return out
+
+
+def _thumb_thread(b: bytes) -> int:
+    """現行路徑: Pillow 喺 thread 入面 decode + thumbnail + optimize=True encode"""
+    img, _, _, _ = main.make_image_thumb_with_info(b)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=85, optimize=True)
+    return len(buf.getvalue())
+
+
+def _thumb_process(b: bytes) -> int:
+    data, _, _, _ = main.render_thumb_in_process(b)
+    return len(data)
+
+
+def bench_thumbs(args) -> dict:
+    blobs = load_dir(args.dir) if args.dir else synthetic_jpegs(args.count, args.width, args.height)
+    if not blobs:
+        raise SystemExit("no input images")
+    print(f"[thumbs] {len(blobs)} images, {sum(map(len, blobs)) / 1e6:.1f} MB, "
+          f"THUMB_WORKERS={main.THUMB_WORKERS} THUMB_PROCESS_WORKERS={main.THUMB_PROCESS_WORKERS}")
+
+    results = {}
+    for name, fn in (("thread", _thumb_thread), ("process", _thumb_process)):
+        if name == "process":
+            # 預熱 pool，唔計 spawn 時間
+            list(ThreadPoolExecutor(max_workers=main.THUMB_PROCESS_WORKERS).map(_thumb_process, blobs[:main.THUMB_PROCESS_WORKERS]))
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=main.THUMB_WORKERS) as ex:
+            out_bytes = sum(ex.map(fn, blobs))
+        dt = time.perf_counter() - t0
+        results[name] = {"images": len(blobs), "seconds": round(dt, 3),
+                         "images_per_sec": round(len(blobs) / dt, 2), "thumb_bytes": out_bytes}
+        print(f"  {name:8s} {results[name]['images_per_sec']:8.2f} img/s  ({dt:.2f}s)")
+
+    main.reset_thumb_process_pool()
+    results["speedup"] = round(results["process"]["images_per_sec"] / results["thread"]["images_per_sec"], 2)
+    print(f"  speedup  x{results['speedup']}")
+    return results
+
+
+def _scan_once(url: str, mode: str, ultra: bool) -> dict:
+    jid = main.JM.new_job("scan", url=url)
+    t0 = time.perf_counter()
+    main.scan_worker(jid, url, ultra, False, False, 0, 0, True, True, "",
+                     cluster=False, scroll_mode=mode)
+    dt = time.perf_counter() - t0
+    st = main.JM.jobs[jid]
+    stats = st.stats
+    return {"status": st.status, "seconds": round(dt, 2), "scroll_ms": stats.get("scroll_ms", 0),
+            "rounds": stats.get("scroll_rounds", 0), "candidates": stats.get("candidates", 0),
+            "items": len(main.JM.items.get(jid, []))}
+
+
+def bench_scroll(args) -> dict:
+    """滾動策略: fixed (每輪固定等) vs adaptive (網絡 / DOM 靜落嚟就繼續)，需要真 Chrome / Edge"""
+    print(f"[scroll] {args.url} runs={args.runs} ultra={args.ultra}")
+    results = {}
+    for mode in ("fixed", "adaptive"):
+        runs = [_scan_once(args.url, mode, args.ultra) for _ in range(args.runs)]
+        avg = lambda k: round(sum(r[k] for r in runs) / len(runs), 2)
+        results[mode] = {"runs": runs, "scroll_ms": avg("scroll_ms"), "rounds": avg("rounds"),
+                         "candidates": avg("candidates"), "items": avg("items")}
+        print(f"  {mode:8s} scroll {results[mode]['scroll_ms']:8.0f} ms  rounds {results[mode]['rounds']:5.1f}  "
+              f"candidates {results[mode]['candidates']:6.1f}  items {results[mode]['items']:6.1f}")
+
+    f, a = results["fixed"], results["adaptive"]
+    results["speedup"] = round(f["scroll_ms"] / a["scroll_ms"], 2) if a["scroll_ms"] else 0
+    results["item_ratio"] = round(a["items"] / f["items"], 3) if f["items"] else 0
+    print(f"  speedup  x{results['speedup']}  items adaptive/fixed = {results['item_ratio']}")
+    return results
+
+
+def synthetic_payloads(count: int, mb: float) -> List[bytes]:
+    """GraphQL timeline 替身: 深層巢狀 JSON，夾雜 \\/ 同 \\u0026 escape 嘅媒體 URL"""
+    rnd = random.Random(1)
+    out = []
+    for n in range(count):
+        entries = []
+        size = 0
+        while size < mb * 1024 * 1024:
+            mid = "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(15))
+            e = {"entryId": f"tweet-{mid}", "content": {"itemContent": {"tweet_results": {"result": {
+                "legacy": {"full_text": "lorem ipsum " * rnd.randint(2, 20), "favorite_count": rnd.randint(0, 9999),
+                           "extended_entities": {"media": [{
+                               "media_url_https": f"https://pbs.twimg.com/media/{mid}.jpg",
+                               "expanded_url": f"https://x.com/u/status/{mid}/photo/1",
+                               "video_info": {"variants": [{"url": f"https://video.twimg.com/vid/{mid}.mp4?tag=12\u0026x=1"}]},
+                           }]}},
+                "core": {"user_results": {"result": {"legacy": {
+                    "profile_image_url_https": f"https://pbs.twimg.com/profile_images/{mid}_normal.jpg"}}}},
+            }}}}}
+            entries.append(e)
+            size += 900
+        body = json.dumps({"data": {"timeline": {"instructions": [{"entries": entries}]}}}).encode()
+        # 一半 payload 用 \/ escape (好似 Instagram / Facebook 內嵌 JSON)
+        out.append(body.replace(b"/", b"\\/") if n % 2 else body)
+    return out
+
+
+def _netparse_iter_strings(body: bytes) -> set:
+    """舊路徑: resp.json() + iter_strings 遞歸"""
+    try:
+        data = json.loads(body)
+    except Exception:
+        return set()
+    out = set()
+    for s in main.iter_strings(data):
+        if not isinstance(s, str) or not s.startswith("http"):
+            continue
+        s2 = s.replace("\\u0026", "&")
+        if main.looks_like_image_url(s2) or main.looks_like_video_url(s2):
+            out.add(s2)
+    return out
+
+
+def _netparse_regex(body: bytes) -> set:
+    return set(main.extract_media_urls(body))
+
+
+def capture_payloads(url: str, dest: str, seconds: int):
+    """用真瀏覽器開頁面滾動，將 scan 會解析嘅 JSON / JS response 原始 body 存落 dest"""
+    from playwright.sync_api import sync_playwright
+    os.makedirs(dest, exist_ok=True)
+    preset = main.detect_site_preset(url)
+    saved = []
+
+    def on_response(resp):
+        try:
+            ct = (resp.headers or {}).get("content-type", "")
+            if main.looks_like_image_url(resp.url) or main.looks_like_video_url(resp.url):
+                return
+            if main.should_parse_network_response(resp.url, ct, preset, True):
+                p = os.path.join(dest, f"{len(saved):04d}.bin")
+                with open(p, "wb") as f:
+                    f.write(resp.body())
+                saved.append(p)
+        except Exception:
+            pass
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(channel=main.default_browser_channel(), headless=True)
+        page = browser.new_page(user_agent=main.USER_AGENT)
+        page.on("response", on_response)
+        page.goto(url, wait_until=main.PAGE_GOTO_WAIT_UNTIL, timeout=main.GOTO_TIMEOUT_MS)
+        t_end = time.time() + seconds
+        while time.time() < t_end:
+            page.mouse.wheel(0, 1800)
+            page.wait_for_timeout(1000)
+        browser.close()
+    print(f"[netparse] captured {len(saved)} payloads -> {dest}")
+
+
+def bench_netparse(args) -> dict:
+    """network response URL 抽取: json + iter_strings vs raw bytes regex"""
+    if args.capture:
+        capture_payloads(args.capture, args.dir or "payloads", args.seconds)
+    blobs = load_dir(args.dir) if args.dir else synthetic_payloads(args.count, args.mb)
+    if not blobs:
+        raise SystemExit("no payloads")
+    total_mb = sum(map(len, blobs)) / 1e6
+    print(f"[netparse] {len(blobs)} payloads, {total_mb:.1f} MB, NET_PARSE_MAX_BYTES={main.NET_PARSE_MAX_BYTES}")
+
+    results = {}
+    found = {}
+    for name, fn in (("iter_strings", _netparse_iter_strings), ("regex", _netparse_regex)):
+        t0 = time.perf_counter()
+        urls = set()
+        worst = 0.0
+        for b in blobs:
+            t1 = time.perf_counter()
+            urls |= fn(b)
+            worst = max(worst, time.perf_counter() - t1)
+        dt = time.perf_counter() - t0
+        found[name] = urls
+        results[name] = {"seconds": round(dt, 3), "mb_per_sec": round(total_mb / dt, 1),
+                         "max_ms_per_payload": round(worst * 1000, 1), "urls": len(urls)}
+        print(f"  {name:12s} {results[name]['mb_per_sec']:8.1f} MB/s  worst {results[name]['max_ms_per_payload']:7.1f} ms"
+              f"  urls {len(urls)}")
+
+    results["speedup"] = round(results["iter_strings"]["seconds"] / results["regex"]["seconds"], 2)
+    results["missed_by_regex"] = sorted(found["iter_strings"] - found["regex"])[:20]
+    print(f"  speedup  x{results['speedup']}  missed by regex: {len(found['iter_strings'] - found['regex'])}")
+    return results
+
+
+# ----------------- Offline site -----------------
+# 本機假網站: HTML (lazy img / srcset / background-image / <a> / <video>) + 無限滾動 JSON feed + 合成媒體檔，
+# 唔使連真網站都可以量 scan / 驗證 / 縮圖 / 下載成條路徑。
+
+SITE_BATCH = 24  # 每頁 HTML / 每個 feed 批次嘅 item 數
+IMAGE_VARIANTS = 8  # 每種格式生成幾多張唔同內容嘅圖 (輪流用)
+LAZY_GIF = "data:image/gif;base64,R0lGODlhAQABAAAAACw="
+
+SITE_JS = """
+const io = new IntersectionObserver(es => es.forEach(e => {
+  if (e.isIntersecting) { e.target.src = e.target.dataset.src; io.unobserve(e.target); }
+}), {rootMargin: "200px"});
+function tile(it) {
+  const d = document.createElement("div");
+  d.className = "tile";
+  if (it.kind === "lazy") {
+    const im = document.createElement("img");
+    im.src = "%(gif)s"; im.dataset.src = it.url; im.loading = "lazy"; d.appendChild(im); io.observe(im);
+  } else if (it.kind === "srcset") {
+    const im = document.createElement("img");
+    im.src = it.url; im.srcset = it.url + " 1x, " + it.url2 + " 2x"; d.appendChild(im);
+  } else if (it.kind === "bg") {
+    d.style.backgroundImage = "url('" + it.url + "')";
+  } else if (it.kind === "link") {
+    const a = document.createElement("a"); a.href = it.url; a.textContent = "open"; d.appendChild(a);
+  } else {
+    const v = document.createElement("video"); v.preload = "none";
+    const s = document.createElement("source"); s.src = it.url; s.type = "video/mp4"; v.appendChild(s); d.appendChild(v);
+  }
+  document.getElementById("grid").appendChild(d);
+}
+document.querySelectorAll("img[data-src]").forEach(im => io.observe(im));
+let next = 1, busy = false;
+async function more() {
+  if (busy || next > %(pages)d) return;
+  busy = true;
+  try {
+    const r = await fetch("/feed/%(run)s/" + next + ".json");
+    (await r.json()).data.items.forEach(tile);
+    next++;
+  } finally { busy = false; }
+}
+window.addEventListener("scroll", () => {
+  if (innerHeight + scrollY >= document.body.scrollHeight - 800) more();
+});
+"""
+
+
+class OfflineSite:
+    """
+    本機 HTTP 假網站 (ThreadingHTTPServer，背景 thread)。
+    /page/<run>.html        第一批 item 直接喺 HTML，之後滾動經 /feed/<run>/<n>.json 載入
+    /m/<run>/<i>.<ext>      合成 JPEG / PNG / WebP / MP4，支援 HEAD、Range、ETag；每個請求延遲 latency_ms (+jitter)
+    每次 run 用唔同嘅 <run> 前綴，避免 metadata 快取 / 縮圖庫命中。
+    """
+
+    def __init__(self, items: int, img_size: Tuple[int, int], video_mb: float, video_every: int,
+                 latency_ms: int, jitter_ms: int):
+        self.items = items
+        self.img_size = img_size
+        self.video_mb = video_mb
+        self.video_every = video_every
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.lock = threading.Lock()
+        self.served = {"requests": 0, "bytes": 0}
+        self._media: Dict[str, List[bytes]] = {}
+        self.httpd: Optional[ThreadingHTTPServer] = None
+
+    # --- 內容 ---
+    def media(self, ext: str) -> List[bytes]:
+        with self.lock:
+            if ext not in self._media:
+                self._media[ext] = self._render(ext)
+            return self._media[ext]
+
+    def _render(self, ext: str) -> List[bytes]:
+        if ext == "mp4":
+            head = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+            n = int(self.video_mb * 1024 * 1024)
+            return [(head + bytes(range(256)) * (n // 256 + 1))[:n]]
+        w, h = self.img_size
+        fmt = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP"}[ext]
+        out = []
+        for _ in range(IMAGE_VARIANTS):
+            base = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+            img = Image.blend(base, Image.effect_noise((w, h), 40).convert("RGB"), 0.35)
+            buf = BytesIO()
+            img.save(buf, format=fmt, quality=90)
+            out.append(buf.getvalue())
+        return out
+
+    def ext_for(self, i: int) -> str:
+        if self.video_every and i % self.video_every == self.video_every - 1:
+            return "mp4"
+        return ("jpg", "png", "webp", "jpg")[i % 4]
+
+    def item(self, base: str, run: str, i: int) -> dict:
+        ext = self.ext_for(i)
+        url = f"{base}/m/{run}/{i}.{ext}"
+        if ext == "mp4":
+            return {"kind": "video", "url": url}
+        kind = ("lazy", "srcset", "bg", "link")[i % 4]
+        it = {"kind": kind, "url": url}
+        if kind == "srcset":
+            it["url2"] = f"{base}/m/{run}/{i}x2.{ext}"
+        return it
+
+    def media_urls(self, base: str, run: str) -> List[str]:
+        """網站上面所有媒體 URL (srcset 嘅 2x 都計)，下載階段用"""
+        out = []
+        for i in range(self.items):
+            it = self.item(base, run, i)
+            out.append(it["url"])
+            if "url2" in it:
+                out.append(it["url2"])
+        return out
+
+    def page_html(self, base: str, run: str) -> str:
+        tiles = []
+        for i in range(min(SITE_BATCH, self.items)):
+            it = self.item(base, run, i)
+            u = it["url"]
+            if it["kind"] == "lazy":
+                tiles.append(f'<div class="tile"><img loading="lazy" src="{LAZY_GIF}" data-src="{u}"></div>')
+            elif it["kind"] == "srcset":
+                tiles.append(f'<div class="tile"><img src="{u}" srcset="{u} 1x, {it["url2"]} 2x"></div>')
+            elif it["kind"] == "bg":
+                tiles.append(f'<div class="tile" style="background-image:url(\'{u}\')"></div>')
+            elif it["kind"] == "link":
+                tiles.append(f'<div class="tile"><a href="{u}">open</a></div>')
+            else:
+                tiles.append(f'<div class="tile"><video preload="none"><source src="{u}" type="video/mp4"></video></div>')
+        pages = -(-max(0, self.items - SITE_BATCH) // SITE_BATCH)
+        js = SITE_JS % {"gif": LAZY_GIF, "pages": pages, "run": run}
+        return ("<!doctype html><html><head><title>offline bench</title><style>"
+                ".tile{height:320px;margin:8px;background-size:cover;border:1px solid #ccc}"
+                "img{max-height:300px}</style></head><body><div id=\"grid\">"
+                + "".join(tiles) + f"</div><script>{js}</script></body></html>")
+
+    def feed_json(self, base: str, run: str, n: int) -> bytes:
+        lo = n * SITE_BATCH
+        items = [self.item(base, run, i) for i in range(lo, min(lo + SITE_BATCH, self.items))]
+        # 好似真網站咁 escape 斜線
+        return json.dumps({"data": {"page": n, "items": items}}).replace("/", "\\/").encode()
+
+    # --- server ---
+    def start(self, port: int = 0) -> str:
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def do_HEAD(self):
+                self._serve(head=True)
+
+            def do_GET(self):
+                self._serve(head=False)
+
+            def _serve(self, head: bool):
+                base = f"http://{self.headers.get('Host') or self.server.server_address[0]}"
+                parts = self.path.split("?")[0].strip("/").split("/")
+                ct, body, etag = "", None, ""
+                if len(parts) == 2 and parts[0] == "page" and parts[1].endswith(".html"):
+                    ct, body = "text/html; charset=utf-8", site.page_html(base, parts[1][:-5]).encode()
+                elif len(parts) == 3 and parts[0] == "feed" and parts[2].endswith(".json"):
+                    site.delay()
+                    ct, body = "application/json", site.feed_json(base, parts[1], int(parts[2][:-5]))
+                elif len(parts) == 3 and parts[0] == "m" and "." in parts[2]:
+                    stem, ext = parts[2].rsplit(".", 1)
+                    if ext in ("jpg", "png", "webp", "mp4"):
+                        site.delay()
+                        blobs = site.media(ext)
+                        idx = int("".join(c for c in stem if c.isdigit()) or 0)
+                        body = blobs[idx % len(blobs)]
+                        ct = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp", "mp4": "video/mp4"}[ext]
+                        etag = f'"{ext}-{idx % len(blobs)}-{len(body)}"'
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                status, lo, hi = 200, 0, len(body) - 1
+                rng = self.headers.get("Range", "")
+                if rng.startswith("bytes=") and ct.startswith(("image/", "video/")):
+                    a, _, b = rng[6:].split(",")[0].partition("-")
+                    try:
+                        lo = int(a) if a else max(0, len(body) - int(b))
+                        hi = min(int(b), len(body) - 1) if (a and b) else len(body) - 1
+                    except ValueError:
+                        lo, hi = 0, len(body) - 1
+                    if lo >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    status = 206
+                self.send_response(status)
+                self.send_header("Content-Type", ct)
+                self.send_header("Content-Length", str(hi - lo + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                if etag:
+                    self.send_header("ETag", etag)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {lo}-{hi}/{len(body)}")
+                self.end_headers()
+                n = 0
+                if not head:
+                    view = memoryview(body)[lo:hi + 1]
+                    try:
+                        for off in range(0, len(view), 256 * 1024):
+                            self.wfile.write(view[off:off + 256 * 1024])
+                            n += min(256 * 1024, len(view) - off)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                with site.lock:
+                    site.served["requests"] += 1
+                    site.served["bytes"] += n
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # client 提早斷線 (fused / 探測尺寸只讀檔頭) 係正常，唔好印 traceback
+                if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+                    super().handle_error(request, client_address)
+
+        self.httpd = Server(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.httpd.serve_forever, name="offline-site", daemon=True).start()
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def delay(self):
+        ms = self.latency_ms + (random.randint(0, self.jitter_ms) if self.jitter_ms else 0)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def reset_counters(self) -> dict:
+        with self.lock:
+            out = dict(self.served)
+            self.served = {"requests": 0, "bytes": 0}
+        return out
+
+
+def peak_rss_mb() -> Optional[float]:
+    """本 process 嘅 RSS 峰值 (唔包 Chromium 子 process)"""
+    try:
+        import resource
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(r / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    if main.psutil is not None:
+        mi = main.psutil.Process().memory_info()
+        return round(getattr(mi, "peak_wset", mi.rss) / 1024 / 1024, 1)
+    return None
+
+
+def _git_rev() -> str:
+    try:
+        import subprocess
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _offline_scan(site: OfflineSite, base: str, run: str, args) -> dict:
+    url = f"{base}/page/{run}.html"
+    site.reset_counters()
+    jid = main.JM.new_job("scan", url=url)
+    t0 = time.perf_counter()
+    main.scan_worker(jid, url, False, False, False, 0, 0, True, True, "",
+                     verify_engine=args.verify_engine, use_meta_cache=False, pipeline=args.pipeline,
+                     thumb_backend=args.thumb_backend, cluster=False, scroll_mode=args.scroll_mode)
+    dt = time.perf_counter() - t0
+    st = main.JM.jobs[jid]
+    served = site.reset_counters()
+    n = len(main.JM.items.get(jid, []))
+    mb = served["bytes"] / 1024 / 1024
+    chromium = main.chromium_rss_mb()
+    return {"status": st.status, "message": st.message, "seconds": round(dt, 2), "items": n,
+            "expected": len(site.media_urls(base, run)), "candidates": st.stats.get("candidates", 0),
+            "items_per_sec": round(n / dt, 2), "served_mb": round(mb, 1), "mb_per_sec": round(mb / dt, 2),
+            "requests": served["requests"], "stage_ms": st.stats.get("stage_ms", {}),
+            "scroll_rounds": st.stats.get("scroll_rounds", 0), "peak_rss_mb": peak_rss_mb(),
+            "chromium_rss_mb": round(chromium, 1) if chromium is not None else None}
+
+
+def _offline_download(site: OfflineSite, base: str, run: str, args) -> dict:
+    urls = site.media_urls(base, run)
+    dest = tempfile.mkdtemp(prefix="rio-bench-")
+    site.reset_counters()
+    t0 = time.perf_counter()
+    try:
+        res = main.download_builtin(urls, dest, dedup="off")
+        dt = time.perf_counter() - t0
+        mb = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(dest) for f in fs) / 1024 / 1024
+    finally:
+        if not args.keep:
+            shutil.rmtree(dest, ignore_errors=True)
+    served = site.reset_counters()
+    return {"files": len(urls), "ok": res["ok"], "fail": res["fail"], "seconds": round(dt, 2),
+            "files_per_sec": round(res["ok"] / dt, 2), "mb": round(mb, 1), "mb_per_sec": round(mb / dt, 2),
+            "requests": served["requests"], "peak_rss_mb": peak_rss_mb(), "dest": dest if args.keep else ""}
+
+
+def _compare(prev: dict, cur: dict):
+    """同上次結果比較主要數字 (新 / 舊)"""
+    print(f"[offline] compare with {prev.get('meta', {}).get('time', '?')} ({prev.get('meta', {}).get('git', '')})")
+    for stage, keys in (("scan", ("seconds", "items_per_sec", "mb_per_sec", "peak_rss_mb")),
+                        ("download", ("seconds", "files_per_sec", "mb_per_sec", "peak_rss_mb"))):
+        a, b = prev.get(stage) or {}, cur.get(stage) or {}
+        for k in keys:
+            if a.get(k) and b.get(k) is not None:
+                print(f"  {stage:8s} {k:14s} {a[k]:>10} -> {b[k]:>10}  x{b[k] / a[k]:.2f}")
+        sa, sb = a.get("stage_ms") or {}, b.get("stage_ms") or {}
+        for k in sb:
+            if sa.get(k):
+                print(f"  {stage:8s} {k + '_ms':14s} {sa[k]:>10} -> {sb[k]:>10}  x{sb[k] / sa[k]:.2f}")
+
+
+def bench_offline(args) -> dict:
+    """本機假網站跑 scan (需要瀏覽器) + 內建下載，量 items/s、MB/s、RSS 峰值同各階段耗時"""
+    w, _, h = args.img_size.partition("x")
+    site = OfflineSite(args.items, (int(w), int(h or w)), args.video_mb, args.video_every,
+                       args.latency_ms, args.jitter_ms)
+    base = site.start(args.port)
+    run = f"r{int(time.time())}"
+    if args.serve:
+        print(f"[offline] serving {base}/page/{run}.html  (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            site.stop()
+            return {}
+
+    for ext in ("jpg", "png", "webp", "mp4"):
+        site.media(ext)  # 預先生成，唔計入量度
+    print(f"[offline] {base} items={args.items} img={args.img_size} video={args.video_mb}MB/every {args.video_every} "
+          f"latency={args.latency_ms}+{args.jitter_ms}ms")
+    results = {"meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "git": _git_rev(),
+                        "python": platform.python_version(), "platform": platform.platform(),
+                        "config": {k: getattr(main, k) for k in ("VERIFY_WORKERS", "THUMB_WORKERS", "DOWNLOAD_WORKERS",
+                                                                 "DOWNLOAD_PER_HOST", "BROWSER_POOL_SIZE")}},
+               "site": {"items": args.items, "img_size": args.img_size, "video_mb": args.video_mb,
+                        "video_every": args.video_every, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms},
+               "options": {"scroll_mode": args.scroll_mode, "pipeline": args.pipeline,
+                           "verify_engine": args.verify_engine, "thumb_backend": args.thumb_backend}}
+    try:
+        if not args.skip_scan:
+            r = results["scan"] = _offline_scan(site, base, run, args)
+            stages = "  ".join(f"{k}={v}ms" for k, v in r["stage_ms"].items())
+            print(f"  scan     {r['status']:6s} {r['items']}/{r['expected']} items  {r['seconds']}s  "
+                  f"{r['items_per_sec']} items/s  {r['mb_per_sec']} MB/s  rss {r['peak_rss_mb']} MB")
+            if r["status"] != "done":
+                print(f"           {r['message']}")
+            if stages:
+                print(f"           {stages}")
+        if not args.skip_download:
+            r = results["download"] = _offline_download(site, base, run, args)
+            print(f"  download {r['ok']}/{r['files']} files  {r['mb']} MB  {r['seconds']}s  "
+                  f"{r['files_per_sec']} files/s  {r['mb_per_sec']} MB/s  rss {r['peak_rss_mb']} MB")
+    finally:
+        site.stop()
+        main.BROWSER_POOL.close_idle(-1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            _compare(json.load(f), results)
+    return results
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="RIOimgDownload benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("thumbs", help="縮圖後端: thread vs process (draft)")
+    p.add_argument("--dir", default="", help="用資料夾入面嘅圖片 (預設用合成 JPEG)")
+    p.add_argument("--count", type=int, default=24)
+    p.add_argument("--width", type=int, default=4000)
+    p.add_argument("--height", type=int, default=6000)
+    p.add_argument("--json", default="", help="結果另存 JSON")
+    p.set_defaults(fn=bench_thumbs)
+
+    p = sub.add_parser("scroll", help="滾動策略: fixed vs adaptive (需要瀏覽器)")
+    p.add_argument("--url", required=True)
+    p.add_argument("--runs", type=int, default=1)
+    p.add_argument("--ultra", action="store_true")
+    p.add_argument("--json", default="", help="結果另存 JSON")
+    p.set_defaults(fn=bench_scroll)
+
+    p = sub.add_parser("netparse", help="network response URL 抽取: iter_strings vs regex")
+    p.add_argument("--dir", default="", help="已擷取嘅 response body (預設用合成 GraphQL payload)")
+    p.add_argument("--capture", default="", help="先用瀏覽器開呢個 URL 擷取 payload 存去 --dir")
+    p.add_argument("--seconds", type=int, default=30, help="擷取時滾動幾耐")
+    p.add_argument("--count", type=int, default=8)
+    p.add_argument("--mb", type=float, default=4.0, help="每個合成 payload 大小")
+    p.add_argument("--json", default="", help="結果另存 JSON")
+    p.set_defaults(fn=bench_netparse)
+
+    p = sub.add_parser("offline", help="本機假網站: scan (需要瀏覽器) + 內建下載 end-to-end")
+    p.add_argument("--items", type=int, default=120, help="網站上嘅媒體 item 數")
+    p.add_argument("--img-size", default="1600x1200", help="合成圖片尺寸 WxH")
+    p.add_argument("--video-mb", type=float, default=4.0, help="合成 MP4 大小")
+    p.add_argument("--video-every", type=int, default=10, help="每幾個 item 一條片 (0 = 冇片)")
+    p.add_argument("--latency-ms", type=int, default=30, help="每個媒體 / feed 請求嘅延遲")
+    p.add_argument("--jitter-ms", type=int, default=20, help="延遲隨機加 0..jitter")
+    p.add_argument("--scroll-mode", default=main.SCROLL_MODE_DEFAULT, choices=["adaptive", "fixed"])
+    p.add_argument("--pipeline", default=main.PIPELINE_DEFAULT, choices=["staged", "fused"])
+    p.add_argument("--verify-engine", default=main.VERIFY_ENGINE_DEFAULT, choices=["thread", "async"])
+    p.add_argument("--thumb-backend", default=main.THUMB_BACKEND_DEFAULT, choices=["thread", "process"])
+    p.add_argument("--skip-scan", action="store_true")
+    p.add_argument("--skip-download", action="store_true")
+    p.add_argument("--keep", action="store_true", help="保留下載落嚟嘅檔案")
+    p.add_argument("--port", type=int, default=0)
+    p.add_argument("--serve", action="store_true", help="只開假網站 (俾 UI / 瀏覽器手動測試)")
+    p.add_argument("--compare", default="", help="同之前嘅結果 JSON 比較")
+    p.add_argument("--json", default="", help="結果另存 JSON")
+    p.set_defaults(fn=bench_offline)
+
+    args = ap.parse_args()
+    res = args.fn(args)
+    if getattr(args, "json", ""):
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
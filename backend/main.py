@@ -4,27 +4,49 @@ import json
 import time
 import shutil
 import threading
+import contextlib
+import weakref
 import subprocess
 import tempfile
 import hashlib
+import base64
+import sqlite3
 import sys
 import platform
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from io import BytesIO
-from urllib.parse import urlparse, urljoin
-from typing import Dict, List, Optional, Tuple, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, urljoin, parse_qsl, urlencode
+from typing import Dict, List, Optional, Tuple, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from PIL import Image, ImageDraw
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from platformdirs import user_data_dir
 from playwright.sync_api import sync_playwright
 
+try:
+    import aiohttp  # 可選: async 驗證引擎
+except ImportError:
+    aiohttp = None
+
+try:
+    import psutil  # 可選: browser pool 量度 Chromium 記憶體
+except ImportError:
+    psutil = None
+
+try:
+    import numpy as np  # 可選: 相似圖分組時向量化計 Hamming 距離
+except ImportError:
+    np = None
+
 APP_NAME = "RIOimgDownload"
 
 # ----------------- Tuning -----------------
@@ -38,13 +60,72 @@ DOWNLOAD_TIMEOUT = 90
 MAX_THUMB_BYTES = 25 * 1024 * 1024
 SNIFF_BYTES = 65536
 SNIFF_GET_TIMEOUT = 18
+BROWSER_POOL_ENABLED = True   # 掃描共用常駐 Chromium (登入 profile / debug 模式除外)
+BROWSER_POOL_SIZE = 2         # 常駐 browser 數 (= 同時可以跑幾多個掃描)
+BROWSER_MAX_USES = 50         # 每個 browser 用咗幾多次就重啟
+BROWSER_POOL_MAX_RSS_MB = 2048  # 所有 Chromium process 記憶體超過就重啟用完嗰個 (需要 psutil)
+BROWSER_IDLE_CLOSE_SEC = 1800   # 閒置超過呢個時間嘅 browser 由 maintenance 關閉
+BATCH_MAX_PAGES = BROWSER_POOL_SIZE  # 批次掃描同時載入嘅頁面數 (可用 max_concurrent 覆寫)
+BATCH_MAX_URLS = 500
+# 全域 admission control: 每類工作同時執行上限，超出就排隊 (status="queued")；config.json 嘅 scheduler_slots 可覆寫
+SCHED_BROWSER_SLOTS = BROWSER_POOL_SIZE  # 載入頁面 (Chromium)
+SCHED_HTTP_SLOTS = 2                     # 掃描嘅驗證 / 縮圖階段
+SCHED_DOWNLOAD_SLOTS = 2                 # 內建下載 job (獨立一類，長時間下載唔會塞住掃描驗證)
+SCHED_TOOL_SLOTS = 2                     # gallery-dl / yt-dlp 直接下載
+BLOCK_MEDIA_DEFAULT = False  # 掃描時攔截圖片/影片/字型下載 (只記 URL，慳頻寬)
+PHASH_MAX_DISTANCE = 6  # dHash (64 bit) Hamming 距離 <= 呢個值當係同一張圖嘅唔同尺寸
+CLUSTER_DEFAULT = True  # 掃描完將相似圖分組，只顯示最大嗰張
+PROBE_BYTES = 32768  # 讀圖檔 header 取尺寸 (JPEG SOF / PNG IHDR / GIF / WebP / AVIF ispe)
 SCROLL_WAIT_MS_DEFAULT = 1500
 MAX_SCROLL_ROUNDS_DEFAULT = 50
+SCROLL_MODE_DEFAULT = "adaptive"  # fixed = 每輪固定等 scroll_wait_ms；adaptive = 等到網絡 / DOM 靜落嚟
+SCROLL_MIN_WAIT_MS = 250          # adaptive: 每輪最少等
+SCROLL_QUIET_MS = 300             # adaptive: 冇 request / 冇新 DOM node 持續呢個時間就當靜咗
+SCROLL_STALE_REQUEST_MS = 1200    # adaptive: in-flight 超過呢個時間嘅 request (long-poll / stream / beacon) 唔再等
+SCROLL_POLL_MS = 100
+SCROLL_VIEWPORT_FRACTION = 0.9    # adaptive: 每輪滾動 = viewport 高度 x 呢個比例 (唔會跳過 lazy load 元素)
 STABLE_ROUNDS_TO_STOP_DEFAULT = 3
 # ↓↓↓ B1: 增加並發數量 ↓↓↓
 VERIFY_WORKERS = 20  # 12 → 20 (+67% 速度)
 THUMB_WORKERS = 12   # 8 → 12 (+50% 速度)
 # ↑↑↑ B1 完 ↑↑↑
+# 驗證引擎: "thread" = ThreadPoolExecutor + requests, "async" = asyncio + aiohttp (需安裝 aiohttp)
+VERIFY_ENGINE_DEFAULT = "thread"
+ASYNC_VERIFY_MAX_INFLIGHT = 200  # async 引擎全域同時連線上限
+ASYNC_VERIFY_PER_HOST = 32       # async 引擎每個 host 同時連線上限
+# 縮圖後端: "thread" = 現行 Pillow (THUMB_WORKERS threads), "process" = ProcessPool + JPEG draft 縮小 decode
+THUMB_BACKEND_DEFAULT = "thread"
+THUMB_PROCESS_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# 掃描時 network response 嘅 URL 抽取 (regex 掃原始 bytes，喺 worker thread 做，唔阻 Playwright callback)
+NET_PARSE_MAX_BYTES = 8 * 1024 * 1024  # 宣告 Content-Length 超過就唔攞 body；冇宣告嘅只掃頭呢個大小
+NET_PARSE_WORKERS = 2
+# 掃描流水線: "staged" = HEAD 驗證 → GET 縮圖, "fused" = 每個 URL 一次 streamed GET 完成驗證+尺寸+縮圖
+PIPELINE_DEFAULT = "staged"
+# 掃描 span tracing (Chrome trace-event JSON，/api/trace/{job_id} 下載)；/api/scan 可用 "trace": true 逐次開
+TRACE_DEFAULT = False
+TRACE_MAX_EVENTS = 200000  # 每個 job 最多記幾多個 span，之後只計 dropped
+# 跨掃描 URL metadata 快取 (SQLite)
+META_CACHE_TTL_SEC = 3 * 24 * 3600   # 超過即視為過期，重新驗證
+META_CACHE_MAX_ENTRIES = 200000      # 超過時按最近使用時間淘汰
+# 全域縮圖庫 (所有 job 共用)，可用 config.json 嘅 thumb_store_max_mb 覆寫
+THUMB_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+THUMB_STORE_LOW_WATERMARK = 0.9      # 淘汰至預算嘅 90%
+JOB_DIR_GC_AGE_SEC = 3600            # 無 job 引用且超過呢個時間嘅 jobs/<id> 目錄會被清走
+# 完成咗嘅 job 存落 SQLite，記憶體只留最近用過嘅 (其餘要用時由 SQLite lazy load 返)
+JOB_MEMORY_TTL_SEC = 600             # 完成咗而且冇人存取超過呢個時間就由記憶體移走
+JOB_MEMORY_MAX_FINISHED = 50         # 記憶體最多留幾多個完成咗嘅 job
+JOB_STORE_TTL_SEC = 30 * 24 * 3600   # SQLite 入面保留幾耐
+MAINTENANCE_INTERVAL_SEC = 1800
+SSE_KEEPALIVE_SEC = 15  # /api/events 無事件時嘅 keep-alive 間隔
+# 內建下載器
+DOWNLOAD_WORKERS = 8    # 同時下載檔案數
+DOWNLOAD_PER_HOST = 4   # 每個 host 同時下載上限
+DOWNLOAD_CHUNK = 1024 * 256
+DOWNLOAD_RESUME_RETRIES = 5  # 串流中斷後用 Range 續傳嘅次數
+DOWNLOAD_SEGMENT_MIN_BYTES = 32 * 1024 * 1024  # 大過呢個 size 而 server 支援 Range 就分段多連線下載
+DOWNLOAD_SEGMENTS = 4        # 每個大檔案嘅並行連線數
+DOWNLOAD_SEGMENT_SAVE_BYTES = 8 * 1024 * 1024  # 分段下載每收到咁多就將各段進度寫入 .part.json
+DOWNLOAD_DEDUP_DEFAULT = "report"  # 內容重複: off / skip (唔儲存) / hardlink / report (照存但標記)
 DEFAULT_BLACKLIST = [
     "avatar", "noavatar", "logo", "sprite", "icon", "favicon", "emoji", "emoticon",
     "blank", "spacer", "loading", "placeholder", "banner", "tracking", "pixel"
@@ -57,6 +138,10 @@ APP_DATA = user_data_dir(APP_NAME, appauthor=False)
 PROFILE_DIR = os.path.join(APP_DATA, "browser_profile")
 JOBS_DIR = os.path.join(APP_DATA, "jobs")
 CONFIG_PATH = os.path.join(APP_DATA, "config.json")
+META_CACHE_PATH = os.path.join(APP_DATA, "meta_cache.sqlite3")
+JOB_STORE_PATH = os.path.join(APP_DATA, "jobs.sqlite3")
+DEDUP_INDEX_PATH = os.path.join(APP_DATA, "dedup.sqlite3")  # 各下載資料夾嘅 sha256 索引 (以絕對路徑區分)
+THUMB_STORE_DIR = os.path.join(APP_DATA, "thumbs")
 DEFAULT_DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "Downloads")
 
 # 工具執行檔路徑 (放在 run 資料夾層)
@@ -84,6 +169,9 @@ def safe_name(s: str) -> str:
     s = re.sub(r'[\\/:*?"<>|]+', "_", s)
     return s.strip(" ._")[:160] or "file"
 
+# 1x1 透明 GIF (block_media 模式代替真圖片)
+BLANK_GIF = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
 def hash8(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8", "ignore")).hexdigest()[:8]
 
@@ -148,6 +236,319 @@ def iter_strings(obj: Any):
     elif isinstance(obj, str):
         yield obj
 
+# JSON / JS 入面嘅 URL: 容許 \/ 同 \uXXXX escape，遇到引號 / 空白 / < > 即止
+_RAW_URL_RE = re.compile(rb'https?:(?:\\?/){2}[^\s"\'<>\\]*(?:\\(?:/|u[0-9a-fA-F]{4})[^\s"\'<>\\]*)*')
+_RAW_U_ESCAPE_RE = re.compile(rb'\\u([0-9a-fA-F]{4})')
+_RAW_MEDIA_EXT_RE = re.compile(rb'\.(?:jpe?g|png|gif|webp|bmp|tiff?|avif|mp4|webm|mov|m4v)(?:[?#&.,;)\]}]|\\|$)', re.I)
+
+def extract_media_urls(body: bytes, want_image: bool = True, want_video: bool = True,
+                       max_bytes: int = NET_PARSE_MAX_BYTES) -> List[str]:
+    """
+    由 response 原始 bytes 直接 regex 抽圖片 / 影片 URL (唔使 json 解析成個 object 再 iter_strings)，
+    處理 \\/、\\u0026 同 &amp;；只掃頭 max_bytes。
+    """
+    if max_bytes and len(body) > max_bytes:
+        body = body[:max_bytes]
+    if b"http" not in body:
+        return []
+    out: List[str] = []
+    for raw in set(_RAW_URL_RE.findall(body)):
+        # 大部分 URL (profile / status 連結) 冇媒體副檔名，decode 之前先篩走
+        if not _RAW_MEDIA_EXT_RE.search(raw):
+            continue
+        if b"\\" in raw:
+            raw = _RAW_U_ESCAPE_RE.sub(lambda x: chr(int(x.group(1), 16)).encode("utf-8"), raw.replace(b"\\/", b"/"))
+        if b"&amp;" in raw:
+            raw = raw.replace(b"&amp;", b"&")
+        u = raw.rstrip(b".,;)]}").decode("utf-8", "replace")
+        if (want_image and looks_like_image_url(u)) or (want_video and looks_like_video_url(u)):
+            out.append(u)
+    return out
+
+# 所有掃描共用；Playwright 嘅 response callback 只負責攞 body，抽 URL 交畀呢度
+NET_PARSE_POOL = ThreadPoolExecutor(max_workers=NET_PARSE_WORKERS, thread_name_prefix="net-parse")
+
+# ----------------- Metrics -----------------
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+METRICS_MAX_HOSTS = 200  # host label 上限，之後嘅 host 歸入 "other" (唔好令 /metrics 無限變大)
+
+class Metrics:
+    """
+    進程內 counter / histogram / gauge，/metrics 以 Prometheus text format 輸出 (唔使裝 prometheus_client)。
+    gauge 係 callback，輸出時先計 (例如 job 數、pool queue 深度)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        self._values: Dict[str, Dict[Tuple[Tuple[str, str], ...], Any]] = {}
+        self._gauges: Dict[str, Callable[[], List[Tuple[dict, float]]]] = {}
+        self._hosts: set = set()
+        self._pools = weakref.WeakSet()
+
+    def counter(self, name: str, help_: str):
+        self._meta[name] = ("counter", help_, ())
+        self._values[name] = {}
+
+    def histogram(self, name: str, help_: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self._meta[name] = ("histogram", help_, tuple(buckets))
+        self._values[name] = {}
+
+    def gauge(self, name: str, help_: str, fn: Callable[[], List[Tuple[dict, float]]]):
+        """fn() -> [(labels, value)]"""
+        self._meta[name] = ("gauge", help_, ())
+        self._gauges[name] = fn
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            vals = self._values[name]
+            vals[key] = vals.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._meta[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            h = self._values[name].get(key)
+            if h is None:
+                h = self._values[name][key] = [[0] * len(buckets), 0.0, 0]
+            for i, b in enumerate(buckets):
+                if value <= b:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def host(self, u: str) -> str:
+        h = (urlparse(u).hostname or "") if u else ""
+        with self._lock:
+            if h in self._hosts:
+                return h
+            if len(self._hosts) < METRICS_MAX_HOSTS:
+                self._hosts.add(h)
+                return h
+        return "other"
+
+    def http_error(self, u: str, code: Any):
+        """code: HTTP status 或者 exception 類名 (Timeout / ConnectionError ...)"""
+        self.inc("rio_http_errors_total", host=self.host(u), code=str(code))
+
+    def track_pool(self, ex):
+        """登記 executor (thread_name_prefix 做 pool 名)，gauge 輸出佢嘅 queue 深度"""
+        self._pools.add(ex)
+        return ex
+
+    def pool_depths(self) -> List[Tuple[dict, float]]:
+        depth: Dict[str, int] = {}
+        for ex in list(self._pools):
+            if getattr(ex, "_shutdown", False) or getattr(ex, "_shutdown_thread", False):
+                continue
+            name = getattr(ex, "_thread_name_prefix", "") or "pool"
+            try:
+                n = ex._work_queue.qsize()
+            except Exception:
+                n = len(getattr(ex, "_pending_work_items", {}) or {})
+            depth[name] = depth.get(name, 0) + n
+        return [({"pool": k}, v) for k, v in sorted(depth.items())]
+
+    @staticmethod
+    def _labels(pairs) -> str:
+        if not pairs:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        out: List[str] = []
+        for name, (typ, help_, buckets) in self._meta.items():
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {typ}")
+            if typ == "gauge":
+                try:
+                    rows = self._gauges[name]()
+                except Exception:
+                    rows = []
+                for labels, v in rows:
+                    out.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {v}")
+                continue
+            with self._lock:
+                items = [(k, (list(v[0]), v[1], v[2]) if typ == "histogram" else v) for k, v in self._values[name].items()]
+            for key, v in items:
+                if typ == "counter":
+                    out.append(f"{name}{self._labels(key)} {v}")
+                    continue
+                counts, total, n = v
+                for b, c in zip(buckets, counts):
+                    out.append(f"{name}_bucket{self._labels(key + (('le', repr(float(b))),))} {c}")
+                out.append(f"{name}_bucket{self._labels(key + (('le', '+Inf'),))} {n}")
+                out.append(f"{name}_sum{self._labels(key)} {total}")
+                out.append(f"{name}_count{self._labels(key)} {n}")
+        return "\n".join(out) + "\n"
+
+METRICS = Metrics()
+METRICS.histogram("rio_scan_stage_seconds", "Time spent per scan stage (page, scroll, verify, thumb, cluster, total)", STAGE_BUCKETS)
+METRICS.histogram("rio_scan_scroll_rounds", "Scroll rounds per scan", (1, 2, 3, 5, 10, 20, 50, 100, 200))
+METRICS.histogram("rio_scan_scroll_wait_seconds", "Wait per scroll round by stop reason")
+METRICS.counter("rio_scan_candidates_total", "Scan candidates by source (net, dom, unique)")
+METRICS.counter("rio_verify_total", "Verification outcomes (image, video, cached, too_small, not_media, unwanted, error)")
+METRICS.counter("rio_canon_fallback_total", "Canonicalized URLs that failed and fell back to the seen URL")
+METRICS.histogram("rio_http_request_seconds", "Latency of HEAD / sniff / GET requests")
+METRICS.counter("rio_http_errors_total", "HTTP errors by host and status code or exception")
+METRICS.counter("rio_fetch_bytes_total", "Bytes fetched by stage (sniff, thumb, fused, download)")
+METRICS.histogram("rio_thumb_seconds", "Thumbnail time by step (decode = decode + resize, store = encode + write, process = process pool)")
+METRICS.counter("rio_download_files_total", "Builtin downloader file results")
+METRICS.counter("rio_jobs_finished_total", "Finished jobs by type and status")
+METRICS.gauge("rio_pool_queue_depth", "Tasks waiting in worker pool queues", METRICS.pool_depths)
+METRICS.track_pool(NET_PARSE_POOL)
+
+# ----------------- Tracing -----------------
+def _trace_result(r: Any) -> str:
+    if r is None:
+        return "none"
+    if isinstance(r, MediaItem):
+        return r.fmt or r.kind
+    return "ok"
+
+class Tracer:
+    """
+    單一 job 嘅 span 記錄 (complete event, ph="X")，輸出 Chrome trace-event JSON，
+    可以直接喺 chrome://tracing 或者 ui.perfetto.dev 打開；每個 thread 一條 track。
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.t0 = time.perf_counter()
+        self.started_at = time.time()
+        self.pid = os.getpid()
+        self.events: List[dict] = []
+        self.dropped = 0
+        self._tids: set = set()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return True
+
+    def _us(self, t: float) -> float:
+        return round((t - self.t0) * 1e6, 1)
+
+    def _append(self, *evs: dict):
+        tid = evs[0]["tid"]
+        with self._lock:
+            if tid not in self._tids:
+                self._tids.add(tid)
+                self.events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                                    "args": {"name": threading.current_thread().name}})
+            if len(self.events) + len(evs) > TRACE_MAX_EVENTS:
+                self.dropped += 1
+                return
+            self.events.extend(evs)
+
+    def complete(self, name: str, cat: str, t_start: float, t_end: float, args: Optional[dict] = None):
+        """記錄一個 span (t_start / t_end 係 time.perf_counter())"""
+        ev = {"name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": threading.get_native_id(),
+              "ts": self._us(t_start), "dur": round((t_end - t_start) * 1e6, 1)}
+        if args:
+            ev["args"] = args
+        self._append(ev)
+
+    def complete_async(self, name: str, cat: str, t_start: float, t_end: float, args: Optional[dict] = None):
+        """同一 thread 上會重疊嘅 span (asyncio coroutine)：用 async event (ph b/e)，唔會砌錯層次"""
+        with self._lock:
+            self._next_id += 1
+            aid = self._next_id
+        base = {"name": name, "cat": cat, "pid": self.pid, "tid": threading.get_native_id(), "id": aid}
+        self._append({**base, "ph": "b", "ts": self._us(t_start), "args": args or {}},
+                     {**base, "ph": "e", "ts": self._us(t_end)})
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = "scan", url: str = "", **args):
+        """with tracer.span("decode", "thumb", url=u): ...  (yield 嘅 args dict 可以補資料)"""
+        t = time.perf_counter()
+        try:
+            yield args
+        finally:
+            if url:
+                args["host"] = urlparse(url).hostname or ""
+                args["url"] = url[:300]
+            self.complete(name, cat, t, time.perf_counter(), args)
+
+    def wrap(self, fn: Callable, name: str, cat: str) -> Callable:
+        """包住 worker 函數 (參數係 url 或者 (url, ...) tuple)，每次 call 記一個 span 連 host / 結果"""
+        def traced(arg):
+            u = arg if isinstance(arg, str) else (arg[0] if isinstance(arg, tuple) and arg else "")
+            t = time.perf_counter()
+            r = None
+            try:
+                r = fn(arg)
+                return r
+            finally:
+                self.complete(name, cat, t, time.perf_counter(),
+                              {"host": urlparse(u).hostname or "", "url": u[:300], "result": _trace_result(r)})
+        return traced
+
+    def to_json(self) -> dict:
+        with self._lock:
+            events = list(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"job_id": self.job_id, "started_at": self.started_at, "dropped": self.dropped}}
+
+class _NullTracer:
+    """tracing 關閉時用: wrap 直接回傳原函數，span 係共用嘅 nullcontext，唔會有額外開銷"""
+
+    def __bool__(self):
+        return False
+
+    def complete(self, *a, **kw):
+        pass
+
+    def complete_async(self, *a, **kw):
+        pass
+
+    def span(self, *a, **kw):
+        return _NULL_SPAN
+
+    def wrap(self, fn: Callable, name: str, cat: str) -> Callable:
+        return fn
+
+_NULL_SPAN = contextlib.nullcontext({})
+NULL_TRACER = _NullTracer()
+TRACES: Dict[str, Tracer] = {}  # 進行中嘅 trace (完成後寫落 JOBS_DIR/<id>/trace.json)
+_traces_lock = threading.Lock()
+
+def trace_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id, "trace.json")
+
+def start_trace(job_id: str) -> Tracer:
+    tr = Tracer(job_id)
+    with _traces_lock:
+        TRACES[job_id] = tr
+    return tr
+
+def finish_trace(job_id: str):
+    """寫出 trace.json (暫存檔再 rename)；job 目錄跟 job 一齊由 gc_job_dirs 清理"""
+    with _traces_lock:
+        tr = TRACES.pop(job_id, None)
+    if tr is None:
+        return
+    p = trace_path(job_id)
+    try:
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(tr.to_json(), f, separators=(",", ":"))
+        os.replace(tmp, p)
+    except Exception as e:
+        print(f"[trace] {job_id}: {e}")
+
 _session_local = threading.local()
 
 def new_session() -> requests.Session:
@@ -163,36 +564,91 @@ def get_session() -> requests.Session:
         _session_local.s = new_session()
     return _session_local.s
 
-def head_info(session: requests.Session, url: str) -> Tuple[str, Optional[int]]:
+def head_info_full(session: requests.Session, url: str) -> Tuple[str, Optional[int], str, str]:
+    """Returns (content_type, size, etag, last_modified)"""
     try:
-        r = session.head(url, timeout=HEAD_TIMEOUT, allow_redirects=True)
+        with METRICS.time("rio_http_request_seconds", kind="head"):
+            r = session.head(url, timeout=HEAD_TIMEOUT, allow_redirects=True)
+        if r.status_code >= 400:
+            METRICS.http_error(url, r.status_code)
         ct = r.headers.get("Content-Type", "")
         cl = r.headers.get("Content-Length", "")
         size = int(cl) if cl and cl.isdigit() else None
-        return ct, size
+        return ct, size, r.headers.get("ETag", ""), r.headers.get("Last-Modified", "")
     except Exception as e:
         # D1: 記錄錯誤（但唔影響執行）
         # print(f"[head_info] {url}: {e}")
-        return "", None
+        METRICS.http_error(url, type(e).__name__)
+        return "", None, "", ""
+
+def head_info(session: requests.Session, url: str) -> Tuple[str, Optional[int]]:
+    ct, size, _, _ = head_info_full(session, url)
+    return ct, size
 
 def get_bytes(session: requests.Session, url: str, timeout=GET_TIMEOUT) -> Tuple[bytes, dict]:
-    r = session.get(url, timeout=timeout, allow_redirects=True)
+    try:
+        with METRICS.time("rio_http_request_seconds", kind="get"):
+            r = session.get(url, timeout=timeout, allow_redirects=True)
+    except Exception as e:
+        METRICS.http_error(url, type(e).__name__)
+        raise
+    if r.status_code >= 400:
+        METRICS.http_error(url, r.status_code)
     r.raise_for_status()
+    METRICS.inc("rio_fetch_bytes_total", len(r.content), stage="thumb")
     return r.content, dict(r.headers)
 
-def get_head_bytes(session: requests.Session, url: str, max_bytes=SNIFF_BYTES, timeout=SNIFF_GET_TIMEOUT) -> Tuple[bytes, dict]:
-    with session.get(url, stream=True, timeout=timeout, allow_redirects=True) as r:
-        r.raise_for_status()
-        chunks = []
-        got = 0
-        for chunk in r.iter_content(chunk_size=8192):
-            if not chunk:
-                continue
-            chunks.append(chunk)
-            got += len(chunk)
-            if got >= max_bytes:
-                break
-        return b"".join(chunks), dict(r.headers)
+def read_prefix(chunk_iter, n: int) -> bytes:
+    """由 chunk iterator 讀取至少 n bytes (或者讀完)"""
+    chunks = []
+    got = 0
+    for chunk in chunk_iter:
+        if not chunk:
+            continue
+        chunks.append(chunk)
+        got += len(chunk)
+        if got >= n:
+            break
+    return b"".join(chunks)
+
+def read_body_capped(chunk_iter, max_bytes: int, prefix: bytes = b"") -> Optional[bytes]:
+    """讀取 streamed response 剩餘內容 (prefix 為已讀部分)；超過 max_bytes 回傳 None"""
+    chunks = [prefix]
+    got = len(prefix)
+    for chunk in chunk_iter:
+        if not chunk:
+            continue
+        chunks.append(chunk)
+        got += len(chunk)
+        if got > max_bytes:
+            return None
+    return b"".join(chunks)
+
+def get_head_bytes(session: requests.Session, url: str, max_bytes=SNIFF_BYTES, timeout=SNIFF_GET_TIMEOUT,
+                   headers: Optional[dict] = None) -> Tuple[bytes, dict]:
+    t0 = time.perf_counter()
+    try:
+        with session.get(url, stream=True, timeout=timeout, allow_redirects=True, headers=headers) as r:
+            if r.status_code >= 400:
+                METRICS.http_error(url, r.status_code)
+            r.raise_for_status()
+            chunks = []
+            got = 0
+            for chunk in r.iter_content(chunk_size=8192):
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                got += len(chunk)
+                if got >= max_bytes:
+                    break
+    except requests.HTTPError:
+        raise
+    except Exception as e:
+        METRICS.http_error(url, type(e).__name__)
+        raise
+    METRICS.observe("rio_http_request_seconds", time.perf_counter() - t0, kind="sniff")
+    METRICS.inc("rio_fetch_bytes_total", got, stage="sniff")
+    return b"".join(chunks), dict(r.headers)
 
 def make_placeholder_thumb(kind: str, size_px=THUMB_SIZE) -> Image.Image:
     img = Image.new("RGB", (size_px, size_px), (30, 30, 30))
@@ -203,20 +659,211 @@ def make_placeholder_thumb(kind: str, size_px=THUMB_SIZE) -> Image.Image:
     draw.text((size_px // 2 - tw // 2, size_px // 2 - 8), text, fill=(220, 220, 220))
     return img
 
-def make_image_thumb_from_bytes(b: bytes, size_px=THUMB_SIZE) -> Image.Image:
+def make_image_thumb_with_info(b: bytes, size_px=THUMB_SIZE) -> Tuple[Image.Image, int, int, str]:
+    """單次 decode: 回傳 (縮圖, 原圖 w, 原圖 h, format)"""
     img = Image.open(BytesIO(b))
+    w, h = img.size
+    fmt = (img.format or "").upper()
+    return _to_thumb(img, size_px), w, h, fmt
+
+def make_image_thumb_from_bytes(b: bytes, size_px=THUMB_SIZE) -> Image.Image:
+    return make_image_thumb_with_info(b, size_px)[0]
+
+def _to_thumb(img: Image.Image, size_px=THUMB_SIZE, reducing_gap: Optional[float] = 2.0) -> Image.Image:
     if img.mode not in ("RGB", "RGBA"):
         img = img.convert("RGB")
-    img.thumbnail((size_px, size_px))
+    img.thumbnail((size_px, size_px), reducing_gap=reducing_gap)
     if img.mode == "RGBA":
         bg = Image.new("RGB", img.size, (30, 30, 30))
         bg.paste(img, mask=img.split()[-1])
         img = bg
     return img
 
+def render_thumb_bytes(b: bytes, size_px: int = THUMB_SIZE) -> Tuple[bytes, int, int, str]:
+    """
+    Process pool 用 (需要可 pickle，所以放 module level)：decode → 縮圖 → JPEG encode。
+    JPEG 喺轉色彩模式之前先 draft()，直接以 1/2 ~ 1/8 比例 decode；唔用 optimize=True。
+    回傳 (jpeg bytes, 原圖 w, 原圖 h, format)。
+    """
+    img = Image.open(BytesIO(b))
+    w, h = img.size
+    fmt = (img.format or "").upper()
+    if fmt == "JPEG":
+        img.draft("RGB", (size_px, size_px))
+    img = _to_thumb(img, size_px)
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue(), w, h, fmt
+
+_thumb_pool: Optional[ProcessPoolExecutor] = None
+_thumb_pool_lock = threading.Lock()
+
+def get_thumb_process_pool() -> ProcessPoolExecutor:
+    """全域共用嘅縮圖 process pool (spawn，避免 fork 帶住 uvicorn / playwright threads)"""
+    global _thumb_pool
+    with _thumb_pool_lock:
+        if _thumb_pool is None:
+            _thumb_pool = ProcessPoolExecutor(max_workers=THUMB_PROCESS_WORKERS,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _thumb_pool
+
+def reset_thumb_process_pool():
+    global _thumb_pool
+    with _thumb_pool_lock:
+        if _thumb_pool is not None:
+            _thumb_pool.shutdown(wait=False)
+        _thumb_pool = None
+
+def render_thumb_in_process(b: bytes, size_px: int = THUMB_SIZE) -> Tuple[bytes, int, int, str]:
+    try:
+        return get_thumb_process_pool().submit(render_thumb_bytes, b, size_px).result()
+    except BrokenProcessPool:
+        # worker 死咗 (例如 OOM)：重建 pool，今次喺本 thread 做
+        reset_thumb_process_pool()
+        return render_thumb_bytes(b, size_px)
+
 def save_thumb(img: Image.Image, path: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    img.save(path, format="JPEG", quality=85, optimize=True)
+    # 先寫暫存檔再 rename，避免並行 job 讀到半個檔
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    img.save(tmp, format="JPEG", quality=85, optimize=True)
+    os.replace(tmp, path)
+
+# ----------------- Image Header Probe -----------------
+def _be16(b: bytes, i: int) -> int:
+    return (b[i] << 8) | b[i + 1]
+
+def _be32(b: bytes, i: int) -> int:
+    return int.from_bytes(b[i:i + 4], "big")
+
+def _le16(b: bytes, i: int) -> int:
+    return b[i] | (b[i + 1] << 8)
+
+def _le24(b: bytes, i: int) -> int:
+    return b[i] | (b[i + 1] << 8) | (b[i + 2] << 16)
+
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _probe_jpeg(b: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    n = len(b)
+    while i + 4 <= n:
+        if b[i] != 0xFF:
+            i += 1
+            continue
+        marker = b[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        if marker == 0xDA:  # SOS: 之後係影像資料
+            return None
+        seglen = _be16(b, i + 2)
+        if marker in _JPEG_SOF:
+            if i + 9 > n:
+                return None
+            return _be16(b, i + 7), _be16(b, i + 5)
+        i += 2 + seglen
+    return None
+
+def _probe_webp(b: bytes) -> Optional[Tuple[int, int]]:
+    chunk = b[12:16]
+    if chunk == b"VP8 " and len(b) >= 30 and b[23:26] == b"\x9d\x01\x2a":
+        return _le16(b, 26) & 0x3FFF, _le16(b, 28) & 0x3FFF
+    if chunk == b"VP8L" and len(b) >= 25 and b[20] == 0x2F:
+        bits = int.from_bytes(b[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(b) >= 30:
+        return _le24(b, 24) + 1, _le24(b, 27) + 1
+    return None
+
+def _probe_isobmff(b: bytes) -> Optional[Tuple[int, int]]:
+    # AVIF / HEIF: 取最大嘅 ispe (primary item；grid tile / thumbnail 會較細)
+    best = None
+    i = b.find(b"ispe")
+    while i != -1 and i + 16 <= len(b):
+        w, h = _be32(b, i + 8), _be32(b, i + 12)
+        if w and h and (best is None or w * h > best[0] * best[1]):
+            best = (w, h)
+        i = b.find(b"ispe", i + 4)
+    return best
+
+def probe_image_size(b: bytes) -> Optional[Tuple[int, int, str]]:
+    """
+    只用檔頭 (通常幾 KB) 讀出 (w, h, format)，唔做完整 decode。
+    讀唔到 (header 唔完整 / 未知格式) 回傳 None。
+    """
+    if not b or len(b) < 16:
+        return None
+    try:
+        if b[:2] == b"\xff\xd8":
+            wh = _probe_jpeg(b)
+            fmt = "JPEG"
+        elif b[:8] == b"\x89PNG\r\n\x1a\n":
+            wh = (_be32(b, 16), _be32(b, 20)) if len(b) >= 24 and b[12:16] == b"IHDR" else None
+            fmt = "PNG"
+        elif b[:6] in (b"GIF87a", b"GIF89a"):
+            wh = (_le16(b, 6), _le16(b, 8))
+            fmt = "GIF"
+        elif b[:4] == b"RIFF" and b[8:12] == b"WEBP":
+            wh = _probe_webp(b)
+            fmt = "WEBP"
+        elif b[4:8] == b"ftyp":
+            wh = _probe_isobmff(b)
+            fmt = "AVIF" if b[8:12] in (b"avif", b"avis") else "HEIF"
+        else:
+            im = Image.open(BytesIO(b))  # 其他格式: Pillow 只 parse header
+            wh = im.size
+            fmt = (im.format or "").upper()
+    except Exception:
+        return None
+    if not wh or not wh[0] or not wh[1]:
+        return None
+    return wh[0], wh[1], fmt
+
+class ProbeStats:
+    """尺寸探測統計: bytes_saved = 被提早淘汰嘅圖 (Content-Length - 已讀 bytes)，未知長度唔計"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.probed = 0
+        self.parsed = 0
+        self.rejected = 0
+        self.bytes_read = 0
+        self.bytes_saved = 0
+
+    def record(self, n_read: int, parsed: bool, rejected: bool, size: Optional[int]):
+        with self._lock:
+            self.probed += 1
+            self.parsed += int(parsed)
+            self.bytes_read += n_read
+            if rejected:
+                self.rejected += 1
+                if size:
+                    self.bytes_saved += max(size - n_read, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"probed": self.probed, "parsed": self.parsed, "rejected": self.rejected,
+                    "bytes_read": self.bytes_read, "bytes_saved": self.bytes_saved}
+
+PROBE_STATS = ProbeStats()
+
+def probe_rejects(u: str, headb: bytes, size: Optional[int], min_w: int, min_h: int,
+                  dim_sink: Optional[list] = None) -> bool:
+    """由檔頭判斷圖片是否細過 min_w/min_h；讀到尺寸會放入 dim_sink (url, w, h, fmt)"""
+    dims = probe_image_size(headb)
+    too_small = bool(dims) and (dims[0] < min_w or dims[1] < min_h)
+    PROBE_STATS.record(len(headb), bool(dims), too_small, size)
+    if dims and dim_sink is not None:
+        dim_sink.append((u, *dims))
+    if too_small:
+        METRICS.inc("rio_verify_total", result="too_small")
+    return too_small
+
+def probe_range_headers() -> dict:
+    return {"Range": f"bytes=0-{PROBE_BYTES - 1}"}
 
 def load_config() -> dict:
     if not os.path.exists(CONFIG_PATH):
@@ -402,6 +1049,7 @@ def detect_site_preset(start_url: str) -> dict:
         "stable_rounds_to_stop": STABLE_ROUNDS_TO_STOP_DEFAULT,
         "parse_network_json": True,
         "network_url_keywords": [],
+        "canonicalizers": ["twimg", "fbcdn", "wordpress"],  # 見 URL Canonicalization
     }
     if "instagram.com" in host:
         preset.update({
@@ -410,6 +1058,7 @@ def detect_site_preset(start_url: str) -> dict:
             "max_scroll_rounds": 80,
             "stable_rounds_to_stop": 4,
             "network_url_keywords": ["graphql", "api", "query", "feed", "reels", "media"],
+            "canonicalizers": ["fbcdn"],
         })
     elif "x.com" in host or "twitter.com" in host:
         preset.update({
@@ -418,6 +1067,7 @@ def detect_site_preset(start_url: str) -> dict:
             "max_scroll_rounds": 90,
             "stable_rounds_to_stop": 4,
             "network_url_keywords": ["graphql", "api", "timeline", "Tweet", "Search", "User", "HomeTimeline"],
+            "canonicalizers": ["twimg"],
         })
     elif "facebook.com" in host or "fb.com" in host:
         preset.update({
@@ -426,6 +1076,7 @@ def detect_site_preset(start_url: str) -> dict:
             "max_scroll_rounds": 80,
             "stable_rounds_to_stop": 4,
             "network_url_keywords": ["graphql", "api", "photo", "video", "stories"],
+            "canonicalizers": ["fbcdn"],
         })
     return preset
 
@@ -445,6 +1096,127 @@ def should_parse_network_response(resp_url: str, content_type: str, preset: dict
         return True
     return False
 
+# ----------------- URL Canonicalization -----------------
+# 每條規則: url -> (group_key, quality, url_out, sure) 或 None (唔適用)。
+# 同一 group_key 嘅候選只保留 quality 最高嗰個；url_out 可以係改寫後嘅原圖 URL。
+# sure=True 代表 url_out 一定存在 (例如 twimg name=orig)，直接改寫；
+# sure=False 代表 url_out 只係估計，同一 group 真係見到 >= 2 個變體先會用，得一個就保留原本見到嘅 URL
+# (例如原圖本身就叫 wallpaper-1920x1080.jpg，唔可以改寫成唔存在嘅 wallpaper.jpg)。
+# 改寫咗嘅 URL 會記低已見到嘅最佳 URL 做後備，驗證 / 縮圖失敗時改用後備。
+# 有簽名嘅 CDN (Instagram / Facebook) 唔可以改 query，只會喺已見到嘅變體入面揀最大。
+CanonResult = Tuple[str, int, str, bool]
+CANONICALIZERS: Dict[str, Callable[[str], Optional[CanonResult]]] = {}
+CANON_ORIGINAL = 10 ** 9  # 已確定係原圖嘅 quality
+TWIMG_NAME_QUALITY = {"thumb": 1, "tiny": 1, "small": 2, "medium": 3, "900x900": 3, "large": 4, "4096x4096": 5}
+
+def canonicalizer(name: str):
+    def deco(fn):
+        CANONICALIZERS[name] = fn
+        return fn
+    return deco
+
+@canonicalizer("twimg")
+def canon_twimg(u: str) -> Optional[CanonResult]:
+    """pbs.twimg.com ?name=small|medium|large → name=orig (所有 /media/ 圖都有)；video.twimg.com /vid/WxH/ 揀最大"""
+    pu = urlparse(u)
+    host = pu.netloc.lower()
+    if host == "pbs.twimg.com":
+        if not pu.path.startswith("/media/"):
+            return None
+        path = pu.path
+        m = re.match(r"^(.*\.(?:jpe?g|png|webp|gif)):(\w+)$", path)
+        if m:
+            path = m.group(1)  # 舊格式 xxx.jpg:large
+        q = dict(parse_qsl(pu.query))
+        name = q.get("name") or (m.group(2) if m else "medium")  # 冇 name 參數即係 medium
+        quality = CANON_ORIGINAL if name == "orig" else TWIMG_NAME_QUALITY.get(name, 3)
+        q["name"] = "orig"
+        out = pu._replace(path=path, query=urlencode(q)).geturl()
+        key = f"twimg:{os.path.splitext(path)[0]}"
+        return key, quality, out, True
+    if host == "video.twimg.com":
+        m = re.search(r"/vid/(?:avc1/|hevc/)?(\d+)x(\d+)/", pu.path)
+        if not m:
+            return None
+        key = "twvid:" + re.sub(r"/vid/(?:avc1/|hevc/)?\d+x\d+/", "/vid/", pu.path)
+        return key, int(m.group(1)) * int(m.group(2)), u, True
+
+@canonicalizer("fbcdn")
+def canon_fbcdn(u: str) -> Optional[CanonResult]:
+    """Instagram / Facebook CDN: stp=...s640x640... 縮圖參數同 _s/_t/_n/_o 後綴；以檔名 id 分組"""
+    pu = urlparse(u)
+    host = pu.netloc.lower()
+    if not (host.endswith("cdninstagram.com") or host.endswith("fbcdn.net")):
+        return None
+    fname = os.path.basename(pu.path)
+    if not fname:
+        return None
+    m = re.match(r"^(.+?)_([a-z])(\.\w+)$", fname)
+    stem = m.group(1) if m else os.path.splitext(fname)[0]
+    suffix_rank = {"o": 4, "n": 3, "b": 2, "s": 1, "t": 0}.get(m.group(2), 3) if m else 3
+    stp = dict(parse_qsl(pu.query)).get("stp", "")
+    sm = re.search(r"(?:^|_)[sp](\d+)x(\d+)(?:_|$)", stp)
+    quality = int(sm.group(1)) * int(sm.group(2)) if sm else CANON_ORIGINAL
+    return f"fbcdn:{stem}", quality * 10 + suffix_rank, u, True
+
+@canonicalizer("wordpress")
+def canon_wordpress(u: str) -> Optional[CanonResult]:
+    """/wp-content/uploads/x-300x200.jpg + x-1024x768.jpg (見到多個尺寸時) → x.jpg"""
+    pu = urlparse(u)
+    if "/wp-content/uploads/" not in pu.path:
+        return None
+    m = re.search(r"-(\d+)x(\d+)(\.\w+)$", pu.path)
+    if not m:
+        return f"wp:{pu.netloc.lower()}{pu.path}", CANON_ORIGINAL, u, True
+    path = pu.path[:m.start()] + m.group(3)
+    out = pu._replace(path=path).geturl()
+    return f"wp:{pu.netloc.lower()}{path}", int(m.group(1)) * int(m.group(2)), out, False
+
+def canonicalize_candidates(urls: List[str], preset: dict) -> Tuple[List[str], int, Dict[str, str]]:
+    """
+    按 preset["canonicalizers"] 將同一媒體嘅尺寸變體合併 (驗證之前)。
+    每組保留 quality 最高嘅已見 URL；規則 sure=True 就改寫成 url_out，
+    sure=False 要組內見到 >= 2 個唔同 URL 先改用估計嘅原圖 URL。
+    回傳 (唯一 URL 列表，保持首次出現次序, 合併咗幾多個, {改寫後 URL: 已見最佳 URL} 後備)。
+    """
+    rules = [CANONICALIZERS[n] for n in preset.get("canonicalizers") or [] if n in CANONICALIZERS]
+    best: Dict[str, Tuple[int, str, str, bool]] = {}  # key -> (quality, 已見 URL, url_out, sure)
+    members: Dict[str, set] = {}
+    order: List[str] = []
+    n_in = 0
+    for u in urls:
+        if not u:
+            continue
+        n_in += 1
+        key, quality, out, sure = u, 0, u, True
+        for rule in rules:
+            try:
+                r = rule(u)
+            except:
+                r = None
+            if r:
+                key, quality, out, sure = r
+                break
+        members.setdefault(key, set()).add(u)
+        if key not in best:
+            order.append(key)
+            best[key] = (quality, u, out, sure)
+        elif quality > best[key][0]:
+            best[key] = (quality, u, out, sure)
+
+    fallbacks: Dict[str, str] = {}
+
+    def pick(k: str) -> str:
+        quality, seen, out, sure = best[k]
+        if quality >= CANON_ORIGINAL or (not sure and len(members[k]) < 2):
+            return seen
+        if out != seen:
+            fallbacks.setdefault(out, seen)
+        return out
+
+    out_urls = list(dict.fromkeys(pick(k) for k in order))
+    return out_urls, n_in - len(out_urls), fallbacks
+
 # ----------------- Models -----------------
 @dataclass
 class MediaItem:
@@ -457,6 +1229,10 @@ class MediaItem:
     fmt: str = ""
     size: Optional[int] = None
     thumb_path: str = ""
+    seq: int = 0  # job 內遞增序號，/api/items?since= 用
+    phash: str = ""    # 縮圖嘅 dHash (16 位 hex)
+    dup_of: str = ""   # 相似圖分組: 代表 item 嘅 id (自己係代表就留空)
+    variants: List[str] = field(default_factory=list)  # 代表 item: 同組其他 item 嘅 id
 
 @dataclass
 class JobState:
@@ -468,30 +1244,170 @@ class JobState:
     created_at: float = 0.0
     finished_at: float = 0.0
     job_type: str = "scan"
+    url: str = ""
+    # 批次掃描: 子 job 記住 parent，parent 記住所有子 job
+    parent_id: str = ""
+    children: List[str] = field(default_factory=list)
+    # 下載 job 用: 已下載 bytes / 即時速度 / 每個檔案狀態
+    bytes_done: int = 0
+    bytes_per_sec: float = 0.0
+    files: List[Dict[str, Any]] = field(default_factory=list)
+    # 掃描統計 (滾動模式 / 每輪時間 / 候選數)
+    stats: Dict[str, Any] = field(default_factory=dict)
+    # 排程: 優先度 (大先) / 排隊位置 (status="queued" 時由 1 起)
+    priority: int = 0
+    queue_pos: int = 0
+
+JOB_FINISHED = ("done", "error", "cancelled")
+
+def dataclass_from_dict(cls, d: dict):
+    """由 JSON 還原 dataclass；忽略舊版 / 新版多出嚟嘅欄位"""
+    return cls(**{k: v for k, v in d.items() if k in cls.__dataclass_fields__})
+
+# ----------------- Job Store -----------------
+class JobStore:
+    """
+    完成咗嘅 job (JobState + items) 存落 SQLite，重啟之後照樣睇到；
+    JobManager 將佢哋由記憶體移走之後，/api/status、/api/items 等要用先 lazy load 返。
+    """
+
+    def __init__(self, path: str, ttl_sec: int = JOB_STORE_TTL_SEC):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            n_items INTEGER NOT NULL DEFAULT 0,
+            finished_at REAL NOT NULL
+        )""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS items (
+            job_id TEXT NOT NULL,
+            pos INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (job_id, pos)
+        )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished_at)")
+        self._db.commit()
+
+    def save(self, state: dict, items: Optional[List[dict]] = None):
+        """state / items 係 asdict 之後嘅 dict；items=None 即只更新 JobState"""
+        with self._lock:
+            if items is None:
+                row = self._db.execute("SELECT n_items FROM jobs WHERE id=?", (state["id"],)).fetchone()
+                n_items = row[0] if row else 0
+            else:
+                n_items = len(items)
+                self._db.execute("DELETE FROM items WHERE job_id=?", (state["id"],))
+                self._db.executemany("INSERT INTO items (job_id, pos, data) VALUES (?, ?, ?)",
+                                     [(state["id"], i, json.dumps(it, ensure_ascii=False)) for i, it in enumerate(items)])
+            self._db.execute("INSERT OR REPLACE INTO jobs (id, state, n_items, finished_at) VALUES (?, ?, ?, ?)",
+                             (state["id"], json.dumps(state, ensure_ascii=False), n_items,
+                              state.get("finished_at") or time.time()))
+            self._db.commit()
+
+    def load_state(self, jid: str) -> Optional[Tuple[JobState, int]]:
+        """只讀 JobState + item 數 (唔載入 items)"""
+        with self._lock:
+            row = self._db.execute("SELECT state, n_items FROM jobs WHERE id=?", (jid,)).fetchone()
+        if not row:
+            return None
+        return dataclass_from_dict(JobState, json.loads(row[0])), row[1]
+
+    def load(self, jid: str) -> Optional[Tuple[JobState, List[MediaItem]]]:
+        head = self.load_state(jid)
+        if not head:
+            return None
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM items WHERE job_id=? ORDER BY pos", (jid,)).fetchall()
+        return head[0], [dataclass_from_dict(MediaItem, json.loads(r[0])) for r in rows]
+
+    def prune(self) -> int:
+        """刪除超過 ttl 嘅 job 同佢哋嘅 items"""
+        with self._lock:
+            n = self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - self.ttl_sec,)).rowcount
+            if n:
+                self._db.execute("DELETE FROM items WHERE job_id NOT IN (SELECT id FROM jobs)")
+            self._db.commit()
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs, items = self._db.execute("SELECT COUNT(*), COALESCE(SUM(n_items), 0) FROM jobs").fetchone()
+        try:
+            db_bytes = os.path.getsize(self.path)
+        except OSError:
+            db_bytes = 0
+        return {"path": self.path, "jobs": jobs, "items": items, "db_bytes": db_bytes}
 
 # ----------------- Job Manager -----------------
 class JobManager:
-    def __init__(self):
+    def __init__(self, store: Optional[JobStore] = None):
         self._lock = threading.Lock()
         self.jobs: Dict[str, JobState] = {}
         self.items: Dict[str, List[MediaItem]] = {}
+        self.item_index: Dict[str, Dict[str, MediaItem]] = {}
+        self.item_seq: Dict[str, int] = {}
         self.cancel: Dict[str, threading.Event] = {}
+        # /api/events 訂閱者: jid -> [(event loop, asyncio.Event)]
+        self._watchers: Dict[str, List[Tuple[Any, Any]]] = {}
+        # 完成咗嘅 job 會寫落 store，之後可以由記憶體移走
+        self.store = store
+        self._persisted: set[str] = set()
+        self._accessed: Dict[str, float] = {}
+        self.evicted = 0
+        self.reloaded = 0
+
+    def watch(self, jid: str, loop, ev):
+        with self._lock:
+            self._watchers.setdefault(jid, []).append((loop, ev))
+
+    def unwatch(self, jid: str, loop, ev):
+        with self._lock:
+            ws = self._watchers.get(jid, [])
+            if (loop, ev) in ws:
+                ws.remove((loop, ev))
+            if not ws:
+                self._watchers.pop(jid, None)
+
+    def _notify(self, jid: str):
+        """喺 worker thread 通知所有 SSE 連線 (call_soon_threadsafe 喚醒 asyncio.Event)"""
+        with self._lock:
+            ws = list(self._watchers.get(jid, []))
+        for loop, ev in ws:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:
+                pass  # loop 已關閉
 
-    def new_job(self, job_type: str = "scan") -> str:
-        jid = hash8(str(time.time()) + str(os.getpid()) + str(threading.get_ident()))
+    def new_job(self, job_type: str = "scan", url: str = "", parent_id: str = "", priority: int = 0) -> str:
         with self._lock:
-            self.jobs[jid] = JobState(id=jid, status="idle", created_at=time.time(), job_type=job_type)
+            jid = hash8(str(time.time()) + str(os.getpid()) + str(threading.get_ident()) + str(len(self.jobs)))
+            self.jobs[jid] = JobState(id=jid, status="idle", created_at=time.time(), job_type=job_type,
+                                      url=url, parent_id=parent_id, priority=priority)
             self.items[jid] = []
+            self.item_index[jid] = {}
+            self.item_seq[jid] = 0
             self.cancel[jid] = threading.Event()
+        self.evict()
         return jid
 
     def set_status(self, jid: str, status: str, message: str = ""):
         with self._lock:
             js = self.jobs[jid]
+            first_finish = status in JOB_FINISHED and js.status not in JOB_FINISHED
             js.status = status
             js.message = message
-            if status in ("done", "error", "cancelled"):
+            if status in JOB_FINISHED:
                 js.finished_at = time.time()
+        self._notify(jid)
+        if first_finish:
+            METRICS.inc("rio_jobs_finished_total", type=js.job_type, status=status)
+        if status in JOB_FINISHED:
+            self._persist(jid)
 
     def set_progress(self, jid: str, i: int, total: int, message: str = ""):
         with self._lock:
@@ -500,153 +1416,1506 @@ class JobManager:
             js.progress_total = max(total, 1)
             if message:
                 js.message = message
+        self._notify(jid)
+
+    def update(self, jid: str, **fields):
+        """直接更新 JobState 欄位 (例如下載 job 嘅 bytes_done / files)"""
+        with self._lock:
+            js = self.jobs[jid]
+            for k, v in fields.items():
+                setattr(js, k, v)
+            finished = js.status in JOB_FINISHED
+        self._notify(jid)
+        if finished:
+            self._persist(jid, with_items=False)
 
     def add_items(self, jid: str, new_items: List[MediaItem]):
+        """逐批加入結果，每個 item 分配遞增 seq (client 用 since= 只攞新嘅)"""
         with self._lock:
+            idx = self.item_index[jid]
+            for it in new_items:
+                self.item_seq[jid] += 1
+                it.seq = self.item_seq[jid]
+                idx[it.id] = it
             self.items[jid].extend(new_items)
+        self._notify(jid)
 
-JM = JobManager()
-
-# ----------------- Scan Logic -----------------
-def _is_blacklisted(url: str, blacklist: List[str]) -> bool:
-    lu = url.lower()
-    return any(k in lu for k in blacklist)
-
-def scan_worker(job_id: str, url: str, ultra: bool, use_login_profile: bool, debug_browser: bool,
-                min_w: int, min_h: int, want_image: bool, want_video: bool,
-                blacklist_csv: str):
-    cancel_ev = JM.cancel[job_id]
-    preset = detect_site_preset(url)
-    browser_channel = "msedge" if platform.system() == "Windows" else "chrome"
-    blacklist = [x.strip().lower() for x in (blacklist_csv or "").split(",") if x.strip()] or DEFAULT_BLACKLIST
+    def get_items(self, jid: str, since: int = 0) -> Tuple[List[MediaItem], int]:
+        """Returns (seq > since 嘅 items, 目前最大 seq)"""
+        with self._lock:
+            items = [it for it in self.items.get(jid, []) if it.seq > since]
+            return items, self.item_seq.get(jid, 0)
 
-    job_dir = os.path.join(JOBS_DIR, job_id)
-    thumbs_dir = os.path.join(job_dir, "thumbs")
-    os.makedirs(thumbs_dir, exist_ok=True)
+    def sort_items(self, jid: str, key, reverse: bool = False):
+        """只改變列表次序，seq 不變 (since= 游標照樣有效)"""
+        with self._lock:
+            self.items[jid].sort(key=key, reverse=reverse)
 
-    JM.set_status(job_id, "running", f"Scanning... ({preset['name']})")
+    def get_item(self, jid: str, item_id: str) -> Optional[MediaItem]:
+        with self._lock:
+            return self.item_index.get(jid, {}).get(item_id)
 
-    dom_candidates: List[str] = []
-    net_candidates: set[str] = set()
+    def snapshot(self, jid: str) -> dict:
+        with self._lock:
+            return asdict(self.jobs[jid])
 
-    def add_dom(u: str):
-        if not u or u.lower().startswith("data:") or _is_blacklisted(u, blacklist):
+    def _persist(self, jid: str, with_items: bool = True):
+        """完成咗嘅 job 寫落 store (寫成功先可以由記憶體移走)"""
+        if not self.store:
             return
-        dom_candidates.append(u)
-
-    def add_net(u: str):
-        if not u or u.lower().startswith("data:") or _is_blacklisted(u, blacklist):
+        with self._lock:
+            js = self.jobs.get(jid)
+            if not js:
+                return
+            state = asdict(js)
+            items = [asdict(it) for it in self.items.get(jid, [])] if with_items or jid not in self._persisted else None
+        try:
+            self.store.save(state, items)
+        except Exception as e:
+            print(f"[jobs] persist {jid} failed: {e}")
             return
-        net_candidates.add(u)
+        with self._lock:
+            self._persisted.add(jid)
 
-    try:
-        with sync_playwright() as p:
-            headless = (not debug_browser)
-            
-            if use_login_profile:
-                os.makedirs(PROFILE_DIR, exist_ok=True)
-                try:
-                    context = p.chromium.launch_persistent_context(
-                        user_data_dir=PROFILE_DIR,
-                        channel=browser_channel,
-                        headless=headless,
-                        user_agent=USER_AGENT,
-                        viewport={"width": 1280, "height": 800},
-                        ignore_default_args=["--enable-automation"],
-                        args=["--no-first-run", "--no-default-browser-check"],
-                    )
-                except Exception as e:
-                    JM.set_status(job_id, "error", f"Cannot open {browser_channel}: {e}")
-                    return
-            else:
-                try:
-                    browser = p.chromium.launch(channel=browser_channel, headless=headless)
-                    context = browser.new_context(user_agent=USER_AGENT, viewport={"width": 1280, "height": 800})
-                except Exception as e:
-                    JM.set_status(job_id, "error", f"Cannot open {browser_channel}: {e}")
-                    return
+    def ensure(self, jid: str) -> bool:
+        """job 喺記憶體就記低存取時間；已經被移走就由 store lazy load 返。搵唔到回傳 False"""
+        with self._lock:
+            if jid in self.jobs:
+                self._accessed[jid] = time.time()
+                return True
+        loaded = self.store.load(jid) if self.store else None
+        if not loaded:
+            return False
+        js, items = loaded
+        with self._lock:
+            if jid not in self.jobs:
+                self.jobs[jid] = js
+                self.items[jid] = items
+                self.item_index[jid] = {it.id: it for it in items}
+                self.item_seq[jid] = max((it.seq for it in items), default=0)
+                self.cancel[jid] = threading.Event()
+                self._persisted.add(jid)
+                self.reloaded += 1
+            self._accessed[jid] = time.time()
+        return True
 
-            page = context.pages[0] if context.pages else context.new_page()
+    def get(self, jid: str) -> Optional[JobState]:
+        return self.jobs.get(jid) if self.ensure(jid) else None
 
-            def on_response(resp):
-                if cancel_ev.is_set():
-                    return
-                try:
-                    ru = resp.url
-                    headers = resp.headers or {}
-                    ct = headers.get("content-type", "") or headers.get("Content-Type", "")
-                    
-                    if should_parse_network_response(ru, ct, preset, ultra):
-                        if want_image and looks_like_image_url(ru):
-                            add_net(ru)
-                            return
-                        if want_video and looks_like_video_url(ru):
-                            add_net(ru)
-                            return
-                        
-                        try:
-                            data = resp.json()
-                        except:
-                            return
-                        
-                        for s in iter_strings(data):
-                            if not isinstance(s, str) or not s.startswith("http"):
-                                continue
-                            s2 = s.replace("\\u0026", "&")
-                            if want_image and looks_like_image_url(s2):
-                                add_net(s2)
-                            elif want_video and looks_like_video_url(s2):
-                                add_net(s2)
-                except:
-                    pass
+    def peek(self, jid: str) -> Optional[Tuple[JobState, int]]:
+        """(JobState, item 數)；已移走嘅 job 只讀 store，唔會載返入記憶體 (批次彙總用)"""
+        with self._lock:
+            js = self.jobs.get(jid)
+            if js:
+                return js, len(self.items.get(jid, []))
+        return self.store.load_state(jid) if self.store else None
+
+    def evict(self, ttl_sec: int = JOB_MEMORY_TTL_SEC, max_finished: int = JOB_MEMORY_MAX_FINISHED) -> int:
+        """
+        完成咗 (而且已寫落 store) 嘅 job，超過 ttl_sec 冇人存取、或者數量超過 max_finished，就由記憶體移走。
+        有 SSE 連線緊、或者 parent 批次仲未完嘅唔郁；最近 60 秒存取過嘅都唔郁。
+        """
+        if not self.store:
+            return 0
+        now = time.time()
+        with self._lock:
+            active = {jid for jid, js in self.jobs.items() if js.status not in JOB_FINISHED}
+            cands = []
+            for jid, js in self.jobs.items():
+                if jid in active or jid not in self._persisted or jid in self._watchers or js.parent_id in active:
+                    continue
+                cands.append((self._accessed.get(jid, js.finished_at), jid))
+            cands.sort()
+            over = len(cands) - max_finished
+            victims = [jid for i, (t, jid) in enumerate(cands)
+                       if (i < over or now - t > ttl_sec) and now - t > 60]
+            for jid in victims:
+                for d in (self.jobs, self.items, self.item_index, self.item_seq, self.cancel, self._accessed):
+                    d.pop(jid, None)
+                self._persisted.discard(jid)
+            self.evicted += len(victims)
+        return len(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {"in_memory": len(self.jobs),
+                   "running": sum(1 for js in self.jobs.values() if js.status not in JOB_FINISHED),
+                   "items_in_memory": sum(len(v) for v in self.items.values()),
+                   "evicted": self.evicted, "reloaded": self.reloaded}
+        if self.store:
+            out["store"] = self.store.stats()
+        return out
+
+JM = JobManager(JobStore(JOB_STORE_PATH))
+
+# ----------------- Scheduler -----------------
+class JobScheduler:
+    """
+    全域 admission control: 每類工作 (browser / http / download / tool) 有固定 slot 數，
+    攞唔到就按 (priority 大先, 先到先得) 排隊，job 狀態變 "queued" 並顯示排隊位置；
+    輪到就變返 "running"。排隊期間 /api/stop 會直接取消。
+    """
 
-            page.on("response", on_response)
+    def __init__(self, slots: Dict[str, int]):
+        self.capacity = {k: max(1, int(v)) for k, v in slots.items()}
+        self.used = {k: 0 for k in slots}
+        self.queues: Dict[str, List[Tuple[int, int, str]]] = {k: [] for k in slots}
+        self.admitted = {k: 0 for k in slots}
+        self.waited = {k: 0 for k in slots}
+        self._seq = 0
+        self._cv = threading.Condition()
+
+    def _publish(self, cls: str):
+        """更新排隊中 job 嘅位置 (位置有變先 update，唔好洗 SSE)"""
+        for pos, (_, _, jid) in enumerate(self.queues[cls], 1):
+            js = JM.jobs.get(jid)
+            if js and (js.status != "queued" or js.queue_pos != pos):
+                JM.update(jid, status="queued", queue_pos=pos,
+                          message=f"Queued #{pos} ({cls}, {self.used[cls]}/{self.capacity[cls]} busy)")
+
+    def acquire(self, cls: str, jid: str) -> bool:
+        """攞 slot；排隊期間 job 被取消就回傳 False"""
+        js = JM.jobs.get(jid)
+        cancel_ev = JM.cancel.get(jid)
+        with self._cv:
+            self._seq += 1
+            entry = (-(js.priority if js else 0), self._seq, jid)
+            q = self.queues[cls]
+            q.append(entry)
+            q.sort()
+            queued = False
+            while True:
+                if cancel_ev is not None and cancel_ev.is_set():
+                    q.remove(entry)
+                    self._publish(cls)
+                    return False
+                if q[0] is entry and self.used[cls] < self.capacity[cls]:
+                    q.pop(0)
+                    self.used[cls] += 1
+                    self.admitted[cls] += 1
+                    self._publish(cls)
+                    break
+                if not queued:
+                    queued = True
+                    self.waited[cls] += 1
+                    self._publish(cls)
+                self._cv.wait(0.5)
+        if queued:
+            JM.update(jid, status="running", queue_pos=0, message="Starting...")
+        return True
+
+    def release(self, cls: str):
+        with self._cv:
+            self.used[cls] -= 1
+            self._cv.notify_all()
 
+    @contextlib.contextmanager
+    def slot(self, cls: str, jid: str):
+        """with SCHED.slot("browser", jid) as ok: ... (ok=False 即排隊期間被取消)"""
+        ok = self.acquire(cls, jid)
+        try:
+            yield ok
+        finally:
+            if ok:
+                self.release(cls)
+
+    def stats(self) -> dict:
+        with self._cv:
+            return {k: {"capacity": self.capacity[k], "running": self.used[k], "queued": len(self.queues[k]),
+                        "admitted": self.admitted[k], "waited": self.waited[k]} for k in self.capacity}
+
+def _scheduler_slots() -> Dict[str, int]:
+    slots = {"browser": SCHED_BROWSER_SLOTS, "http": SCHED_HTTP_SLOTS, "download": SCHED_DOWNLOAD_SLOTS,
+             "tool": SCHED_TOOL_SLOTS}
+    over = load_config().get("scheduler_slots")
+    if isinstance(over, dict):
+        for k, v in over.items():
             try:
-                page.goto(url, wait_until=PAGE_GOTO_WAIT_UNTIL, timeout=GOTO_TIMEOUT_MS)
-            except:
+                if k in slots:
+                    slots[k] = int(v)
+            except (TypeError, ValueError):
                 pass
+    return slots
 
-            page.wait_for_timeout(1500)
+SCHED = JobScheduler(_scheduler_slots())
 
-            last_h = 0
-            stable = 0
+def run_scheduled(cls: str, job_id: str, fn: Callable, *args, **kwargs):
+    """(thread target) 攞到 cls slot 先執行 fn(job_id, ...)；排隊期間取消就標記 cancelled"""
+    with SCHED.slot(cls, job_id) as ok:
+        if not ok:
+            JM.set_status(job_id, "cancelled", "Cancelled.")
+            return
+        fn(job_id, *args, **kwargs)
+
+def _jobs_gauge() -> List[Tuple[dict, float]]:
+    with JM._lock:
+        keys = [(js.job_type, js.status) for js in JM.jobs.values() if js.status not in JOB_FINISHED]
+    counts: Dict[Tuple[str, str], int] = {}
+    for k in keys:
+        counts[k] = counts.get(k, 0) + 1
+    return [({"type": t, "status": st}, n) for (t, st), n in sorted(counts.items())]
+
+def _sched_gauge() -> List[Tuple[dict, float]]:
+    rows = []
+    for cls, d in SCHED.stats().items():
+        for state in ("capacity", "running", "queued"):
+            rows.append(({"class": cls, "state": state}, d[state]))
+    return rows
+
+METRICS.gauge("rio_jobs", "Unfinished jobs by type and status", _jobs_gauge)
+METRICS.gauge("rio_sched_slots", "Scheduler slots by class (capacity / running / queued)", _sched_gauge)
+
+# ----------------- Metadata Cache -----------------
+class MetaCache:
+    """
+    跨掃描嘅 URL metadata 快取 (SQLite, 存喺 APP_DATA)。
+    kind: "image" | "video" | "none" (已確認唔係媒體)；w/h/fmt 由縮圖階段補上。
+    """
+    _COLS = ("url", "kind", "ct", "size", "etag", "last_modified", "w", "h", "fmt", "verified_at", "accessed_at")
+
+    def __init__(self, path: str, ttl_sec: int = META_CACHE_TTL_SEC, max_entries: int = META_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS meta (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL DEFAULT '',
+            ct TEXT NOT NULL DEFAULT '',
+            size INTEGER,
+            etag TEXT NOT NULL DEFAULT '',
+            last_modified TEXT NOT NULL DEFAULT '',
+            w INTEGER NOT NULL DEFAULT 0,
+            h INTEGER NOT NULL DEFAULT 0,
+            fmt TEXT NOT NULL DEFAULT '',
+            verified_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS meta_accessed ON meta(accessed_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS meta_verified ON meta(verified_at)")
+        self._db.commit()
+
+    def get_many(self, urls: List[str]) -> Dict[str, dict]:
+        """回傳未過期嘅 entries，並更新 accessed_at (LRU)"""
+        out: Dict[str, dict] = {}
+        now = time.time()
+        fresh_after = now - self.ttl_sec
+        with self._lock:
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                q = f"SELECT {','.join(self._COLS)} FROM meta WHERE url IN ({','.join('?' * len(chunk))}) AND verified_at >= ?"
+                for row in self._db.execute(q, (*chunk, fresh_after)):
+                    out[row[0]] = dict(zip(self._COLS, row))
+            if out:
+                self._db.executemany("UPDATE meta SET accessed_at=? WHERE url=?", [(now, u) for u in out])
+                self._db.commit()
+            self.hits += len(out)
+            self.misses += len(set(urls)) - len(out)
+        return out
+
+    def get(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {','.join(self._COLS)} FROM meta WHERE url=?", (url,)).fetchone()
+        return dict(zip(self._COLS, row)) if row else None
 
-            # A3: Ultra Mode 增加掃描時間
-            if ultra:
-                scroll_wait_ms = int(preset.get("scroll_wait_ms", SCROLL_WAIT_MS_DEFAULT)) + 500
-                max_scroll_rounds = int(preset.get("max_scroll_rounds", MAX_SCROLL_ROUNDS_DEFAULT)) * 2
-                stable_rounds_to_stop = int(preset.get("stable_rounds_to_stop", STABLE_ROUNDS_TO_STOP_DEFAULT)) + 2
+    def put_verified(self, records: List[dict]):
+        """records: dict(url, kind, ct, size, etag, last_modified)"""
+        if not records:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                """INSERT INTO meta (url, kind, ct, size, etag, last_modified, verified_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET kind=excluded.kind, ct=excluded.ct, size=excluded.size,
+                       etag=excluded.etag, last_modified=excluded.last_modified,
+                       verified_at=excluded.verified_at, accessed_at=excluded.accessed_at""",
+                [(r["url"], r["kind"], r.get("ct") or "", r.get("size"), r.get("etag") or "",
+                  r.get("last_modified") or "", now, now) for r in records]
+            )
+            self._db.commit()
+        self.prune()
+
+    def put_dims(self, records: List[Tuple[str, int, int, str]]):
+        """records: (url, w, h, fmt)；只更新已存在嘅 entry"""
+        if not records:
+            return
+        with self._lock:
+            self._db.executemany("UPDATE meta SET w=?, h=?, fmt=? WHERE url=?",
+                                 [(w, h, fmt, u) for u, w, h, fmt in records])
+            self._db.commit()
+
+    def prune(self) -> int:
+        """刪除過期 entries，再按 LRU 淘汰至 max_entries 以內"""
+        with self._lock:
+            n = self._db.execute("DELETE FROM meta WHERE verified_at < ?", (time.time() - self.ttl_sec,)).rowcount
+            total = self._db.execute("SELECT COUNT(*) FROM meta").fetchone()[0]
+            if total > self.max_entries:
+                n += self._db.execute(
+                    "DELETE FROM meta WHERE url IN (SELECT url FROM meta ORDER BY accessed_at ASC LIMIT ?)",
+                    (total - self.max_entries,)
+                ).rowcount
+            self._db.commit()
+        return n
+
+    def clear(self, url_prefix: str = "", expired_only: bool = False) -> int:
+        if expired_only:
+            return self.prune()
+        with self._lock:
+            if url_prefix:
+                n = self._db.execute("DELETE FROM meta WHERE substr(url, 1, ?) = ?", (len(url_prefix), url_prefix)).rowcount
             else:
-                scroll_wait_ms = int(preset.get("scroll_wait_ms", SCROLL_WAIT_MS_DEFAULT))
-                max_scroll_rounds = int(preset.get("max_scroll_rounds", MAX_SCROLL_ROUNDS_DEFAULT))
-                stable_rounds_to_stop = int(preset.get("stable_rounds_to_stop", STABLE_ROUNDS_TO_STOP_DEFAULT))
+                n = self._db.execute("DELETE FROM meta").rowcount
+            self._db.commit()
+        return n
 
-            # B2: 智能滾動停止
-            last_net_count = 0
-            no_new_images_count = 0
+    def stats(self) -> dict:
+        with self._lock:
+            total, oldest, newest = self._db.execute(
+                "SELECT COUNT(*), MIN(verified_at), MAX(verified_at) FROM meta").fetchone()
+            by_kind = dict(self._db.execute("SELECT kind, COUNT(*) FROM meta GROUP BY kind").fetchall())
+        try:
+            db_bytes = os.path.getsize(self.path)
+        except OSError:
+            db_bytes = 0
+        return {
+            "path": self.path,
+            "entries": total,
+            "by_kind": by_kind,
+            "db_bytes": db_bytes,
+            "oldest_verified_at": oldest or 0.0,
+            "newest_verified_at": newest or 0.0,
+            "ttl_sec": self.ttl_sec,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
 
-            for round_num in range(max_scroll_rounds):
-                if cancel_ev.is_set():
-                    JM.set_status(job_id, "cancelled", "Cancelled.")
+META_CACHE = MetaCache(META_CACHE_PATH)
+
+# ----------------- Thumbnail Store -----------------
+class ThumbStore:
+    """
+    全域縮圖庫: <THUMB_STORE_DIR>/<key[:2]>/<key>.jpg，key = URL 嘅 sha256。
+    所有 job 共用同一份縮圖；用 mtime 做 LRU，超過磁碟預算時由最舊開始刪。
+    """
+    def __init__(self, root: str, max_bytes: int = THUMB_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._ph_dir = os.path.join(root, "_placeholders")
+        os.makedirs(self._ph_dir, exist_ok=True)
+        self._bytes: Optional[int] = None  # 第一次用到先掃描 (spawn 出嚟嘅 worker process 唔使掃)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(sz for _, _, sz in self._walk())
+            return self._bytes
+
+    def over_budget(self) -> bool:
+        return self.total_bytes() > self.max_bytes
+
+    @staticmethod
+    def key_for_url(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8", "ignore")).hexdigest()[:32]
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.jpg")
+
+    def _walk(self):
+        """yield (path, mtime, size)，唔包 placeholders"""
+        for sub in os.listdir(self.root):
+            d = os.path.join(self.root, sub)
+            if d == self._ph_dir or not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if not name.endswith(".jpg"):
+                    continue
+                p = os.path.join(d, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                yield p, st.st_mtime, st.st_size
+
+    def get(self, key: str) -> Optional[str]:
+        """命中時更新 mtime (LRU) 並回傳路徑"""
+        p = self.path_for(key)
+        try:
+            os.utime(p, None)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return p
+
+    def put(self, key: str, img: Image.Image) -> str:
+        p = self.path_for(key)
+        save_thumb(img, p)
+        self._added(p)
+        return p
+
+    def put_bytes(self, key: str, data: bytes) -> str:
+        """已 encode 好嘅 JPEG (process 後端)"""
+        p = self.path_for(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+        self._added(p)
+        return p
+
+    def _added(self, p: str):
+        try:
+            sz = os.path.getsize(p)
+        except OSError:
+            sz = 0
+        self.total_bytes()
+        with self._lock:
+            self._bytes += sz
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def placeholder(self, kind: str) -> str:
+        """VIDEO / ERR 佔位圖每種只存一份，唔參與淘汰"""
+        p = os.path.join(self._ph_dir, f"{kind}_{THUMB_SIZE}.jpg")
+        if not os.path.exists(p):
+            save_thumb(make_placeholder_thumb(kind), p)
+        return p
+
+    def evict(self, target_bytes: Optional[int] = None) -> int:
+        """按 mtime 由舊到新刪除，直至低於 target_bytes (預設為預算 x 低水位)"""
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * THUMB_STORE_LOW_WATERMARK)
+        with self._lock:
+            files = sorted(self._walk(), key=lambda x: x[1])
+            total = sum(sz for _, _, sz in files)
+            removed = 0
+            for p, _, sz in files:
+                if total <= target_bytes:
+                    break
+                try:
+                    os.remove(p)
+                except OSError:
+                    continue
+                total -= sz
+                removed += 1
+            self._bytes = total
+            self.evicted += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "path": self.root,
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+def _thumb_store_budget() -> int:
+    mb = load_config().get("thumb_store_max_mb")
+    try:
+        return int(mb) * 1024 * 1024 if mb else THUMB_STORE_MAX_BYTES
+    except (TypeError, ValueError):
+        return THUMB_STORE_MAX_BYTES
+
+THUMB_STORE = ThumbStore(THUMB_STORE_DIR, _thumb_store_budget())
+
+def gc_job_dirs(max_age_sec: int = JOB_DIR_GC_AGE_SEC) -> int:
+    """刪除無任何 job 引用嘅 JOBS_DIR/<id> 目錄 (舊版縮圖目錄 / 重啟前嘅 job)"""
+    removed = 0
+    now = time.time()
+    for name in os.listdir(JOBS_DIR):
+        d = os.path.join(JOBS_DIR, name)
+        if not os.path.isdir(d) or name in JM.jobs or JM.peek(name):
+            continue
+        try:
+            if now - os.path.getmtime(d) < max_age_sec:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(d, ignore_errors=True)
+        removed += 1
+    return removed
+
+def run_maintenance() -> dict:
+    return {
+        "job_dirs_removed": gc_job_dirs(),
+        "thumbs_evicted": THUMB_STORE.evict() if THUMB_STORE.over_budget() else 0,
+        "meta_pruned": META_CACHE.prune(),
+        "browsers_closed": BROWSER_POOL.close_idle(BROWSER_IDLE_CLOSE_SEC),
+        "jobs_evicted": JM.evict(),
+        "jobs_pruned": JM.store.prune() if JM.store else 0,
+    }
+
+def start_maintenance_thread():
+    """Background thread: 定期清理孤立 job 目錄 / 縮圖庫超額 / 過期 metadata"""
+    def _worker():
+        while True:
+            try:
+                res = run_maintenance()
+                if any(res.values()):
+                    print(f"[maintenance] {res}")
+            except Exception as e:
+                print(f"[maintenance] Error: {e}")
+            time.sleep(MAINTENANCE_INTERVAL_SEC)
+
+    threading.Thread(target=_worker, daemon=True).start()
+
+def meta_record(u: str, kind: str, ct: str, size: Optional[int], etag: str = "", last_modified: str = "") -> dict:
+    return {"url": u, "kind": kind, "ct": ct, "size": size, "etag": etag, "last_modified": last_modified}
+
+def verified_from_meta(row: Optional[dict], want_image: bool, want_video: bool) -> Tuple[bool, Optional[Tuple[str, str, Optional[int]]]]:
+    """
+    Returns (hit, result)。hit=False 代表快取無法判斷，需要走網絡驗證。
+    """
+    if not row:
+        return False, None
+    kind = row.get("kind")
+    if kind == "none":
+        return True, None
+    if (kind == "image" and want_image) or (kind == "video" and want_video):
+        return True, (row["url"], row.get("ct") or "", row.get("size"))
+    return False, None
+
+# ----------------- Near-duplicate Clustering -----------------
+def dhash_image(img: Image.Image) -> Optional[int]:
+    """64 bit difference hash: 9x8 灰階，每行相鄰像素比較；近乎單色嘅圖冇意義 (全部 hash 相同)，回傳 None"""
+    g = img.convert("L").resize((9, 8), Image.BILINEAR)
+    px = list(g.getdata())
+    if max(px) - min(px) < 8:
+        return None
+    v = 0
+    for row in range(8):
+        for col in range(8):
+            v = (v << 1) | (1 if px[row * 9 + col + 1] > px[row * 9 + col] else 0)
+    return v
+
+def dhash_file(path: str) -> Optional[int]:
+    try:
+        with Image.open(path) as img:
+            img.draft("L", (64, 64))  # JPEG 縮圖直接縮細 decode
+            return dhash_image(img)
+    except:
+        return None
+
+_POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8) if np is not None else None
+
+def near_pairs(hashes: List[int], max_dist: int) -> List[Tuple[int, int]]:
+    """回傳 Hamming 距離 <= max_dist 嘅 (i, j)；有 numpy 就每行一次過向量化計"""
+    n = len(hashes)
+    pairs: List[Tuple[int, int]] = []
+    if np is not None:
+        arr = np.array(hashes, dtype=np.uint64)
+        for i in range(n - 1):
+            x = np.bitwise_xor(arr[i + 1:], arr[i])
+            d = _POP8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            for j in np.nonzero(d <= max_dist)[0]:
+                pairs.append((i, i + 1 + int(j)))
+        return pairs
+    for i in range(n - 1):
+        hi = hashes[i]
+        for j in range(i + 1, n):
+            if bin(hi ^ hashes[j]).count("1") <= max_dist:
+                pairs.append((i, j))
+    return pairs
+
+def _same_aspect(a: MediaItem, b: MediaItem) -> bool:
+    """唔同尺寸版本嘅長寬比應該一樣 (容許 5%)，避免裁切圖被併埋"""
+    if not (a.w and a.h and b.w and b.h):
+        return True
+    ra, rb = a.w / a.h, b.w / b.h
+    return abs(ra - rb) <= 0.05 * max(ra, rb)
+
+def cluster_near_duplicates(items: List[MediaItem], max_dist: int = PHASH_MAX_DISTANCE) -> int:
+    """
+    用縮圖嘅 dHash 將同一張圖嘅唔同尺寸 (srcset / name=small / 預覽圖) 分組。
+    每組保留 w*h 最大嘅做代表 (variants = 其他成員)，其他成員設 dup_of；回傳被收起嘅 item 數。
+    """
+    cand = [it for it in items if it.kind == "image" and it.fmt not in ("ERR", "BIG", "")
+            and it.thumb_path and os.path.exists(it.thumb_path)]
+    with ThreadPoolExecutor(max_workers=THUMB_WORKERS) as ex:
+        hs = list(ex.map(lambda it: dhash_file(it.thumb_path), cand))
+    cand_h = [(it, h) for it, h in zip(cand, hs) if h is not None]
+    for it, h in cand_h:
+        it.phash = f"{h:016x}"
+        it.dup_of = ""
+        it.variants = []
+
+    parent = list(range(len(cand_h)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in near_pairs([h for _, h in cand_h], max_dist):
+        if _same_aspect(cand_h[i][0], cand_h[j][0]):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[rj] = ri
+
+    groups: Dict[int, List[MediaItem]] = {}
+    for i, (it, _) in enumerate(cand_h):
+        groups.setdefault(find(i), []).append(it)
+
+    collapsed = 0
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members.sort(key=lambda x: (x.w * x.h, x.size or 0), reverse=True)
+        rep_it = members[0]
+        rep_it.variants = [m.id for m in members[1:]]
+        for m in members[1:]:
+            m.dup_of = rep_it.id
+        collapsed += len(members) - 1
+    return collapsed
+
+# ----------------- Async Verify Engine -----------------
+ASYNC_RETRIES = 3
+ASYNC_RETRY_STATUS = (500, 502, 503, 504)
+
+async def _async_backoff(attempt: int):
+    await asyncio.sleep(0.5 * (2 ** attempt))
+
+async def async_head_info_full(session, url: str) -> Tuple[str, Optional[int], str, str]:
+    """head_info_full 的 aiohttp 版本 (同樣 retry 5xx / 連線錯誤)"""
+    for attempt in range(ASYNC_RETRIES + 1):
+        t0 = time.perf_counter()
+        try:
+            async with session.head(url, timeout=aiohttp.ClientTimeout(total=HEAD_TIMEOUT), allow_redirects=True) as r:
+                METRICS.observe("rio_http_request_seconds", time.perf_counter() - t0, kind="head")
+                if r.status >= 400:
+                    METRICS.http_error(url, r.status)
+                if r.status in ASYNC_RETRY_STATUS and attempt < ASYNC_RETRIES:
+                    await _async_backoff(attempt)
+                    continue
+                ct = r.headers.get("Content-Type", "")
+                cl = r.headers.get("Content-Length", "")
+                size = int(cl) if cl and cl.isdigit() else None
+                return ct, size, r.headers.get("ETag", ""), r.headers.get("Last-Modified", "")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            METRICS.http_error(url, type(e).__name__)
+            if attempt < ASYNC_RETRIES:
+                await _async_backoff(attempt)
+                continue
+    return "", None, "", ""
+
+async def async_get_head_bytes(session, url: str, max_bytes=SNIFF_BYTES, timeout=SNIFF_GET_TIMEOUT,
+                               headers: Optional[dict] = None) -> Tuple[bytes, Any]:
+    """get_head_bytes 的 aiohttp 版本；headers 保持 case-insensitive"""
+    t0 = time.perf_counter()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=True, headers=headers) as r:
+        if r.status >= 400:
+            METRICS.http_error(url, r.status)
+        r.raise_for_status()
+        chunks = []
+        got = 0
+        async for chunk in r.content.iter_chunked(8192):
+            if not chunk:
+                continue
+            chunks.append(chunk)
+            got += len(chunk)
+            if got >= max_bytes:
+                break
+        METRICS.observe("rio_http_request_seconds", time.perf_counter() - t0, kind="sniff")
+        METRICS.inc("rio_fetch_bytes_total", got, stage="sniff")
+        return b"".join(chunks), r.headers.copy()
+
+async def async_probe_rejects(session, u: str, size: Optional[int], min_w: int, min_h: int,
+                              dim_sink: Optional[list]) -> bool:
+    if not (min_w or min_h):
+        return False
+    try:
+        headb, _ = await async_get_head_bytes(session, u, max_bytes=PROBE_BYTES, headers=probe_range_headers())
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        return False
+    return probe_rejects(u, headb, size, min_w, min_h, dim_sink)
+
+async def async_verify_one(session, u: str, want_image: bool, want_video: bool, meta_sink: Optional[list] = None,
+                           min_w: int = 0, min_h: int = 0, dim_sink: Optional[list] = None):
+    ct, size, etag, lm = await async_head_info_full(session, u)
+    sink = meta_sink if meta_sink is not None else []
+    if want_image and (is_image_content_type(ct) or looks_like_image_url(u)):
+        sink.append(meta_record(u, "image", ct, size, etag, lm))
+        if await async_probe_rejects(session, u, size, min_w, min_h, dim_sink):
+            return None
+        METRICS.inc("rio_verify_total", result="image")
+        return (u, ct, size)
+    if want_video and (is_video_content_type(ct) or looks_like_video_url(u)):
+        sink.append(meta_record(u, "video", ct, size, etag, lm))
+        METRICS.inc("rio_verify_total", result="video")
+        return (u, ct, size)
+    try:
+        headb, headers = await async_get_head_bytes(session, u)
+        ct2 = headers.get("Content-Type", ct)
+        if want_image and (is_image_content_type(ct2) or looks_like_image_url(u)):
+            Image.open(BytesIO(headb))
+            sink.append(meta_record(u, "image", ct2, size, etag, lm))
+            if (min_w or min_h) and probe_rejects(u, headb, size, min_w, min_h, dim_sink):
+                return None
+            METRICS.inc("rio_verify_total", result="image")
+            return (u, ct2, size)
+        if want_video and (is_video_content_type(ct2) or looks_like_video_url(u)):
+            sink.append(meta_record(u, "video", ct2, size, etag, lm))
+            METRICS.inc("rio_verify_total", result="video")
+            return (u, ct2, size)
+        if not (is_image_content_type(ct2) or is_video_content_type(ct2)):
+            sink.append(meta_record(u, "none", ct2, size, etag, lm))
+            METRICS.inc("rio_verify_total", result="not_media")
+        else:
+            METRICS.inc("rio_verify_total", result="unwanted")
+        return None
+    except asyncio.CancelledError:
+        raise
+    except:
+        METRICS.inc("rio_verify_total", result="error")
+        return None
+
+def verify_urls_async(urls: List[str], want_image: bool, want_video: bool, cancel_ev: threading.Event,
+                      on_progress=None, meta_sink: Optional[list] = None,
+                      min_w: int = 0, min_h: int = 0, dim_sink: Optional[list] = None,
+                      tracer: Any = NULL_TRACER) -> Optional[List[Tuple[str, str, Optional[int]]]]:
+    """
+    asyncio 驗證引擎: 一個 event loop + 共用 aiohttp 連線池,
+    受 ASYNC_VERIFY_MAX_INFLIGHT (全域) 及 ASYNC_VERIFY_PER_HOST (每 host) 限制。
+    有 min_w/min_h 時會讀圖檔 header 探測尺寸，太細嘅圖喺呢度已經淘汰。
+    回傳同 verify_one 一樣嘅 (url, ct, size) tuples；被取消時回傳 None。
+    """
+    async def _traced_one(session, u: str):
+        t = time.perf_counter()
+        r = None
+        try:
+            r = await async_verify_one(session, u, want_image, want_video, meta_sink, min_w, min_h, dim_sink)
+            return r
+        finally:
+            tracer.complete_async("verify_one", "verify", t, time.perf_counter(),
+                                  {"host": urlparse(u).hostname or "", "url": u[:300], "result": _trace_result(r)})
+
+    async def _run():
+        connector = aiohttp.TCPConnector(limit=ASYNC_VERIFY_MAX_INFLIGHT,
+                                         limit_per_host=ASYNC_VERIFY_PER_HOST, ttl_dns_cache=300)
+        out: List[Tuple[str, str, Optional[int]]] = []
+        async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}) as session:
+            if tracer:
+                tasks = [asyncio.ensure_future(_traced_one(session, u)) for u in urls]
+            else:
+                tasks = [asyncio.ensure_future(async_verify_one(session, u, want_image, want_video, meta_sink,
+                                                                min_w, min_h, dim_sink)) for u in urls]
+            done = 0
+            try:
+                for fut in asyncio.as_completed(tasks):
+                    if cancel_ev.is_set():
+                        return None
                     try:
-                        context.close()
-                    except:
-                        pass
+                        r = await fut
+                    except Exception:
+                        r = None
+                    if r:
+                        out.append(r)
+                    done += 1
+                    if on_progress:
+                        on_progress(done, len(urls))
+            finally:
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        return out
+
+    return asyncio.run(_run())
+
+# ----------------- Browser Pool -----------------
+class BrowserLaunchError(Exception):
+    pass
+
+def chromium_rss_mb() -> Optional[float]:
+    """所有 Chromium 子 process 嘅 RSS 總和 (MB)；冇 psutil 回傳 None"""
+    if psutil is None:
+        return None
+    total = 0
+    try:
+        for c in psutil.Process(os.getpid()).children(recursive=True):
+            try:
+                name = c.name().lower()
+                if "chrom" in name or "msedge" in name or "headless_shell" in name:
+                    total += c.memory_info().rss
+            except:
+                pass
+    except:
+        return None
+    return total / 1024 / 1024
+
+class _BrowserSlot:
+    """
+    一個常駐 browser + 一條專屬 thread。
+    Playwright sync API 嘅物件只可以喺建立佢嘅 thread 用，所以所有 _ 方法都經 self.ex 執行。
+    """
+    def __init__(self, idx: int):
+        self.idx = idx
+        self.ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"browser-{idx}")
+        self.pw = None
+        self.browser = None
+        self.channel = ""
+        self.uses = 0
+        self.launched_at = 0.0
+        self.last_used = 0.0
+        self.busy = False
+
+    def _close(self):
+        for obj, fn in ((self.browser, "close"), (self.pw, "stop")):
+            if obj is not None:
+                try:
+                    getattr(obj, fn)()
+                except:
+                    pass
+        self.browser = None
+        self.pw = None
+        self.uses = 0
+
+    def _ensure(self, channel: str) -> bool:
+        """確保 browser 已開 (channel 唔同或者已斷線就重開)；回傳 True = 今次係冷啟動"""
+        if self.browser is not None and (self.channel != channel or not self.browser.is_connected()):
+            self._close()
+        if self.browser is not None:
+            return False
+        try:
+            self.pw = sync_playwright().start()
+            self.browser = self.pw.chromium.launch(channel=channel, headless=True)
+        except Exception as e:
+            self._close()
+            raise BrowserLaunchError(str(e))
+        self.channel = channel
+        self.launched_at = time.time()
+        return True
+
+    def _run(self, fn, channel: str):
+        cold = self._ensure(channel)
+        context = self.browser.new_context(user_agent=USER_AGENT, viewport={"width": 1280, "height": 800})
+        try:
+            return fn(context), cold
+        finally:
+            try:
+                context.close()
+            except:
+                pass
+            self.uses += 1
+            self.last_used = time.time()
+
+class BrowserPool:
+    """
+    Server 擁有嘅常駐 Chromium pool: 每次掃描只開一個獨立 context (cookies / storage 唔共用)，
+    用咗 BROWSER_MAX_USES 次或者記憶體超標就重啟該 browser。
+    """
+    def __init__(self, size: int):
+        self.slots = [_BrowserSlot(i) for i in range(max(1, size))]
+        self._free = list(self.slots)
+        self._cond = threading.Condition()
+        self.runs = 0
+        self.cold_starts = 0
+        self.recycles = 0
+        self.launch_errors = 0
+        self.wait_ms_total = 0.0
+
+    def _acquire(self) -> _BrowserSlot:
+        with self._cond:
+            while not self._free:
+                self._cond.wait()
+            warm = [sl for sl in self._free if sl.browser is not None]
+            slot = warm[0] if warm else self._free[0]
+            self._free.remove(slot)
+            slot.busy = True
+            return slot
+
+    def _release(self, slot: _BrowserSlot):
+        with self._cond:
+            slot.busy = False
+            self._free.append(slot)
+            self._cond.notify()
+
+    def run(self, fn, channel: str):
+        """喺 pool 嘅 browser thread 執行 fn(context)，回傳 fn 嘅結果"""
+        t0 = time.time()
+        slot = self._acquire()
+        waited_ms = (time.time() - t0) * 1000
+        try:
+            try:
+                result, cold = slot.ex.submit(slot._run, fn, channel).result()
+            except BrowserLaunchError:
+                self.launch_errors += 1
+                raise
+            rss = chromium_rss_mb()
+            if slot.uses >= BROWSER_MAX_USES or (rss is not None and rss > BROWSER_POOL_MAX_RSS_MB):
+                slot.ex.submit(slot._close).result()
+                self.recycles += 1
+        finally:
+            self._release(slot)
+        self.runs += 1
+        self.cold_starts += 1 if cold else 0
+        self.wait_ms_total += waited_ms
+        return result
+
+    def warm(self, channel: str):
+        """Server 啟動時預先開一個 browser，第一次掃描都唔使等冷啟動"""
+        slot = self._acquire()
+        try:
+            slot.ex.submit(slot._ensure, channel).result()
+            self.cold_starts += 1
+        except BrowserLaunchError as e:
+            print(f"[browser_pool] warm-up failed: {e}")
+        finally:
+            self._release(slot)
+
+    def close_idle(self, max_idle_sec: float) -> int:
+        with self._cond:
+            now = time.time()
+            idle = [sl for sl in self._free if sl.browser is not None and now - sl.last_used > max_idle_sec
+                    and now - sl.launched_at > max_idle_sec]
+            for sl in idle:
+                self._free.remove(sl)
+                sl.busy = True
+        for sl in idle:
+            try:
+                sl.ex.submit(sl._close).result()
+            finally:
+                self._release(sl)
+        return len(idle)
+
+    def stats(self) -> dict:
+        now = time.time()
+        rss = chromium_rss_mb()
+        return {
+            "enabled": BROWSER_POOL_ENABLED,
+            "size": len(self.slots),
+            "runs": self.runs,
+            "cold_starts": self.cold_starts,
+            "recycles": self.recycles,
+            "launch_errors": self.launch_errors,
+            "avg_wait_ms": round(self.wait_ms_total / self.runs, 1) if self.runs else 0.0,
+            "chromium_rss_mb": round(rss, 1) if rss is not None else None,
+            "slots": [{
+                "idx": sl.idx,
+                "busy": sl.busy,
+                "running": sl.browser is not None,
+                "channel": sl.channel,
+                "uses": sl.uses,
+                "age_sec": round(now - sl.launched_at, 1) if sl.browser is not None else 0,
+                "idle_sec": round(now - sl.last_used, 1) if sl.browser is not None and sl.last_used else 0,
+            } for sl in self.slots],
+        }
+
+BROWSER_POOL = BrowserPool(BROWSER_POOL_SIZE)
+
+def default_browser_channel() -> str:
+    return "msedge" if platform.system() == "Windows" else "chrome"
+
+# ----------------- Scan Logic -----------------
+# 安裝 MutationObserver (每次 navigation 之後自動重裝) 並回傳
+# [新增 node 總數, 距離上次 DOM 變化 ms, scrollHeight, 可視區底部位置, viewport 高度]
+SCROLL_PROBE_JS = """() => {
+    if (!window.__rioMut) {
+        const st = {n: 0, t: performance.now()};
+        window.__rioMut = st;
+        new MutationObserver(ms => {
+            for (const m of ms) st.n += m.addedNodes.length;
+            st.t = performance.now();
+        }).observe(document.documentElement, {childList: true, subtree: true});
+    }
+    const st = window.__rioMut;
+    const h = document.body ? document.body.scrollHeight : 0;
+    return [st.n, performance.now() - st.t, h, window.scrollY + window.innerHeight, window.innerHeight];
+}"""
+
+# 頁面一開始就注入: MutationObserver 喺 node 出現 / 屬性改變嗰刻記低 img / source / video / a / 背景圖，
+# X / Instagram 呢類 virtualized feed 會移除舊 node，滾完先一次過 eval 會漏晒。
+# 每條記錄 = [kind, data]，data 格式同舊嘅 eval_on_selector_all 結果一樣；同一記錄只會入 queue 一次。
+DOM_HARVEST_JS = """(() => {
+    if (window.__rioHarvest) return;
+    const H = window.__rioHarvest = {q: [], seen: new Set()};
+    const ga = (e, a) => e.getAttribute(a) || '';
+    // 只按 URL 去重 (唔係成個記錄)，style 動畫 / currentSrc 切換唔會令 seen / q 無限增長
+    const fresh = (k, u) => {
+        if (!u || u.slice(0, 5).toLowerCase() === 'data:') return false;
+        const key = k + '\\u0001' + u;
+        if (H.seen.has(key)) return false;
+        H.seen.add(key);
+        return true;
+    };
+    const push = (k, v) => {
+        if (typeof v === 'object') {
+            let any = false;
+            for (const a in v) {
+                if (!v[a]) delete v[a];  // 空欄位唔使傳
+                else if (a !== 'type' && fresh(k, v[a])) any = true;
+            }
+            if (any) H.q.push([k, v]);
+        } else if (fresh(k, v)) H.q.push([k, v]);
+    };
+    const URL_RE = /url\\(\\s*(['"]?)(.*?)\\1\\s*\\)/gi;
+    const bg = st => {
+        for (const m of st.matchAll(URL_RE)) {
+            const u = m[2].trim();
+            if (fresh('bg', u)) H.q.push(['bg', 'url("' + u + '")']);
+        }
+    };
+    const img = e => push('img', {
+        src: ga(e, 'src'), currentSrc: e.currentSrc || '', srcset: ga(e, 'srcset'),
+        dataSrc: ga(e, 'data-src'), dataOriginal: ga(e, 'data-original'), dataLazy: ga(e, 'data-lazy'),
+        dataLazySrc: ga(e, 'data-lazy-src'), dataSrcset: ga(e, 'data-srcset'),
+        dataLazySrcset: ga(e, 'data-lazy-srcset'), dataZoom: ga(e, 'data-zoom-image'),
+        dataLarge: ga(e, 'data-large'), dataFullSrc: ga(e, 'data-full-src'), dataHires: ga(e, 'data-hires'),
+        dataOriginalSrc: ga(e, 'data-original-src'), dataHighRes: ga(e, 'data-high-res'),
+        dataLightbox: ga(e, 'data-lightbox')
+    });
+    const one = e => {
+        const t = e.tagName;
+        if (t === 'IMG') img(e);
+        else if (t === 'VIDEO') push('video', {src: ga(e, 'src'), srcset: ga(e, 'srcset'), type: ga(e, 'type')});
+        else if (t === 'SOURCE') {
+            const v = {src: ga(e, 'src'), srcset: ga(e, 'srcset'), type: ga(e, 'type')};
+            if ((e.parentElement && e.parentElement.tagName === 'VIDEO') || v.type.startsWith('video')) push('video', v);
+            if (v.src || v.srcset) push('source', {src: v.src, srcset: v.srcset});
+        } else if (t === 'A' && e.hasAttribute('href')) push('a', ga(e, 'href'));
+        const st = e.getAttribute && e.getAttribute('style');
+        if (st && st.indexOf('url(') >= 0) bg(st);
+    };
+    const tree = n => {
+        if (!n || n.nodeType !== 1) return;
+        one(n);
+        for (const e of n.querySelectorAll('img, video, source, a[href], [style]')) one(e);
+    };
+    const start = () => {
+        tree(document.documentElement);
+        new MutationObserver(ms => {
+            for (const m of ms) {
+                if (m.type === 'attributes') one(m.target);
+                else for (const n of m.addedNodes) tree(n);
+            }
+        }).observe(document, {childList: true, subtree: true, attributes: true, attributeFilter: [
+            'src', 'srcset', 'href', 'style', 'data-src', 'data-srcset', 'data-original', 'data-lazy',
+            'data-lazy-src', 'data-lazy-srcset', 'data-zoom-image', 'data-large', 'data-full-src',
+            'data-hires', 'data-original-src', 'data-high-res', 'data-lightbox']});
+        // lazy load 完先有 currentSrc
+        document.addEventListener('load', ev => { if (ev.target.tagName === 'IMG') img(ev.target); }, true);
+    };
+    if (document.documentElement) start();
+    else document.addEventListener('readystatechange', start, {once: true});
+})()"""
+
+# 取走 queue 入面累積嘅記錄；harvester 冇裝到 (例如 CSP / 舊頁面) 回傳 null
+DOM_DRAIN_JS = """() => {
+    const h = window.__rioHarvest;
+    if (!h) return null;
+    const q = h.q;
+    h.q = [];
+    return q;
+}"""
+
+class ScrollSettler:
+    """
+    adaptive 滾動: 追蹤 in-flight requests 同 DOM 新增 node，判斷每輪滾動後頁面幾時靜落嚟。
+    media (影片 / 音訊串流)、websocket / eventsource / ping (beacon) 唔計；
+    in-flight 超過 SCROLL_STALE_REQUEST_MS 嘅 request (long-poll 等) 都當佢唔存在，唔會令每輪都等到上限。
+    """
+    _IGNORE_TYPES = ("websocket", "eventsource", "media", "ping")
+
+    def __init__(self, page):
+        self.page = page
+        self.inflight: Dict[Any, float] = {}
+        self.last_net = time.perf_counter()
+        self.last_n = None
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def _on_request(self, req):
+        try:
+            if req.resource_type in self._IGNORE_TYPES:
+                return
+        except:
+            pass
+        self.last_net = time.perf_counter()
+        self.inflight[req] = self.last_net
+
+    def _on_done(self, req):
+        if self.inflight.pop(req, None) is not None:
+            self.last_net = time.perf_counter()
+
+    def pending(self, now: float) -> int:
+        """仲喺等緊嘅 request 數 (唔計 stale)"""
+        stale = SCROLL_STALE_REQUEST_MS / 1000
+        return sum(1 for t in list(self.inflight.values()) if now - t < stale)
+
+    def probe(self) -> List[float]:
+        try:
+            r = self.page.evaluate(SCROLL_PROBE_JS)
+            if isinstance(r, list) and len(r) == 5:
+                return r
+        except:
+            pass
+        return [0, 1e9, 0, 0, 0]
+
+    def wait(self, max_ms: int) -> dict:
+        """等到 網絡冇 in-flight + DOM 冇變化 持續 SCROLL_QUIET_MS (最少 SCROLL_MIN_WAIT_MS，最多 max_ms)"""
+        t0 = time.perf_counter()
+        # 新增 node 由上一輪結束計起 (滾動觸發嘅 lazy load 可能喺 wait 之前已經開始)
+        n0 = self.last_n if self.last_n is not None else self.probe()[0]
+        reason = "timeout"
+        while True:
+            self.page.wait_for_timeout(SCROLL_POLL_MS)
+            n, since_mut, h, bottom, vh = self.probe()
+            now = time.perf_counter()
+            el = (now - t0) * 1000
+            net_quiet = not self.pending(now) and (now - self.last_net) * 1000 >= SCROLL_QUIET_MS
+            if el >= SCROLL_MIN_WAIT_MS and net_quiet and since_mut >= SCROLL_QUIET_MS:
+                reason = "settled"
+                break
+            if el >= max_ms:
+                break
+        self.last_n = n
+        return {"wait_ms": int(el), "reason": reason, "new_nodes": int(n - n0), "height": int(h),
+                "bottom": int(bottom), "viewport": int(vh), "inflight": self.pending(time.perf_counter())}
+
+class ScanPools:
+    """
+    批次掃描共用嘅資源: 所有頁面嘅驗證 / 縮圖都經同一組 worker threads，
+    同時載入嘅頁面數由 pages semaphore 限制。
+    """
+    def __init__(self, max_pages: int):
+        self.pages = threading.BoundedSemaphore(max(1, max_pages))
+        self.verify = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="scan-verify")
+        self.thumb = ThreadPoolExecutor(max_workers=THUMB_WORKERS, thread_name_prefix="scan-thumb")
+        METRICS.track_pool(self.verify)
+        METRICS.track_pool(self.thumb)
+
+    def shutdown(self):
+        self.verify.shutdown(wait=False)
+        self.thumb.shutdown(wait=False)
+
+@contextlib.contextmanager
+def scan_executor(shared: Optional[ThreadPoolExecutor], workers: int, name: str = "scan"):
+    """有共用 pool 就用共用 (唔會 shutdown)，否則開一個只屬於今次掃描嘅"""
+    if shared is not None:
+        yield shared
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name) as ex:
+            METRICS.track_pool(ex)
+            yield ex
+
+def _is_blacklisted(url: str, blacklist: List[str]) -> bool:
+    lu = url.lower()
+    return any(k in lu for k in blacklist)
+
+def scan_worker(job_id: str, url: str, ultra: bool, use_login_profile: bool, debug_browser: bool,
+                min_w: int, min_h: int, want_image: bool, want_video: bool,
+                blacklist_csv: str, verify_engine: str = VERIFY_ENGINE_DEFAULT, use_meta_cache: bool = True,
+                pipeline: str = PIPELINE_DEFAULT, thumb_backend: str = THUMB_BACKEND_DEFAULT,
+                cluster: bool = CLUSTER_DEFAULT, pools: Optional[ScanPools] = None,
+                block_media: bool = BLOCK_MEDIA_DEFAULT, scroll_mode: str = SCROLL_MODE_DEFAULT,
+                trace: bool = TRACE_DEFAULT):
+    cancel_ev = JM.cancel[job_id]
+    tracer = start_trace(job_id) if trace else NULL_TRACER
+    preset = detect_site_preset(url)
+    browser_channel = default_browser_channel()
+    blacklist = [x.strip().lower() for x in (blacklist_csv or "").split(",") if x.strip()] or DEFAULT_BLACKLIST
+
+    if pools:
+        JM.set_status(job_id, "running", "Waiting for a page slot...")
+    else:
+        JM.set_status(job_id, "running", f"Scanning... ({preset['name']})")
+
+    dom_candidates: List[str] = []
+    net_candidates: set[str] = set()
+
+    def add_dom(u: str):
+        if not u or u.lower().startswith("data:") or _is_blacklisted(u, blacklist):
+            return
+        dom_candidates.append(u)
+
+    def add_net(u: str):
+        if not u or u.lower().startswith("data:") or _is_blacklisted(u, blacklist):
+            return
+        net_candidates.add(u)
+
+    def ingest_dom(base_url: str, raw_img: list, raw_bg_styles: list, raw_a: list, raw_video: list,
+                   raw_source: list):
+        """處理 DOM 提取嘅資料 (harvester 每輪一批 / 冇 harvester 時滾完一次過)"""
+        for obj in raw_img:
+            cand_list = []
+            ss_best = parse_srcset_pick_largest(obj.get("srcset") or "")
+            if ss_best:
+                cand_list.append(ss_best)
+            cand_list.extend([
+                obj.get("currentSrc"), obj.get("src"), obj.get("dataSrc"), obj.get("dataOriginal"),
+                obj.get("dataLazy"), obj.get("dataLazySrc"), obj.get("dataSrcset"),
+                obj.get("dataLazySrcset"), obj.get("dataZoom"), obj.get("dataLarge"),
+                obj.get("dataFullSrc"), obj.get("dataHires"), obj.get("dataOriginalSrc"),
+                obj.get("dataHighRes"), obj.get("dataLightbox")
+            ])
+            best = ""
+            for c in cand_list:
+                if c and not c.lower().startswith("data:"):
+                    best = c
+                    break
+            if best:
+                add_dom(urljoin(base_url, best))
+
+        for st in raw_bg_styles:
+            for u2 in extract_background_urls(st):
+                add_dom(urljoin(base_url, u2))
+
+        for href in raw_a:
+            absu = urljoin(base_url, href)
+            if absu.lower().startswith(("javascript:", "data:")):
+                continue
+            if ultra:
+                add_dom(absu)
+            else:
+                lu = absu.lower()
+                if looks_like_image_url(lu) or looks_like_video_url(lu) or "/attachment" in lu or "/attachments" in lu:
+                    add_dom(absu)
+
+        if ultra:
+            for obj in raw_source:
+                ss_best = parse_srcset_pick_largest(obj.get("srcset") or "")
+                if ss_best:
+                    add_dom(urljoin(base_url, ss_best))
+                s = obj.get("src") or ""
+                if s and not s.lower().startswith("data:"):
+                    add_dom(urljoin(base_url, s))
+
+        for obj in raw_video:
+            s = obj.get("src") or ""
+            if s:
+                add_dom(urljoin(base_url, s))
+            ss_best = parse_srcset_pick_largest(obj.get("srcset") or "")
+            if ss_best:
+                add_dom(urljoin(base_url, ss_best))
+
+    def ingest_batch(base_url: str, batch: list) -> int:
+        """harvester 一批記錄 [kind, data] 按類型分組再交畀 ingest_dom"""
+        groups = {"img": [], "bg": [], "a": [], "video": [], "source": []}
+        for rec in batch:
+            try:
+                groups[rec[0]].append(rec[1])
+            except:
+                pass
+        ingest_dom(base_url, groups["img"], groups["bg"], groups["a"], groups["video"], groups["source"])
+        return len(batch)
+
+    net_stats = {"responses": 0, "bytes": 0, "urls": 0, "oversize": 0, "ms": 0.0}
+    net_lock = threading.Lock()
+    net_futs: List[Any] = []
+
+    def parse_net_body(body: bytes):
+        """(NET_PARSE_POOL) 由 JSON / JS response 原始 bytes 抽媒體 URL"""
+        if cancel_ev.is_set():
+            return
+        t0 = time.perf_counter()
+        with tracer.span("net_parse", "net", bytes=len(body)):
+            urls = extract_media_urls(body, want_image, want_video)
+        for u in urls:
+            add_net(u)
+        with net_lock:
+            net_stats["responses"] += 1
+            net_stats["bytes"] += len(body)
+            net_stats["urls"] += len(urls)
+            net_stats["ms"] += (time.perf_counter() - t0) * 1000
+
+    blocked = {"image": 0, "media": 0, "font": 0}
+
+    def on_route(route):
+        """
+        block_media 模式: 圖片回 1x1 透明 GIF (onload 照常觸發，lazy load 唔會卡住)，
+        影片 / 字型直接 abort；URL 照樣記錄做候選，其他請求原封不動放行。
+        """
+        try:
+            req = route.request
+            rt = req.resource_type
+            if rt not in blocked:
+                route.continue_()
+                return
+            u = req.url
+            if rt == "image" and want_image and looks_like_image_url(u):
+                add_net(u)
+            elif rt == "media" and want_video:
+                add_net(u)
+            blocked[rt] += 1
+            if rt == "image":
+                route.fulfill(status=200, content_type="image/gif", body=BLANK_GIF)
+            else:
+                route.abort()
+        except:
+            try:
+                route.continue_()
+            except:
+                pass
+
+    stage = contextlib.ExitStack()  # 掃描後段攞住嘅 SCHED slot，完咗 (或者出錯) 先放
+    t_scan = time.perf_counter()
+    stage_ms: Dict[str, int] = {}
+
+    def stage_done(name: str, t0: float):
+        """記錄一個掃描階段嘅耗時 (job stats["stage_ms"] 同 /metrics)"""
+        dt = time.perf_counter() - t0
+        stage_ms[name] = stage_ms.get(name, 0) + int(dt * 1000)
+        METRICS.observe("rio_scan_stage_seconds", dt, stage=name)
+        tracer.complete(name, "stage", t0, t0 + dt)
+
+    try:
+        def browse(context):
+            """喺 browser context 入面載入頁面、滾動、收集 DOM 資料；取消時回傳 None"""
+            page = context.pages[0] if context.pages else context.new_page()
+
+            def on_response(resp):
+                if cancel_ev.is_set():
                     return
+                try:
+                    ru = resp.url
+                    headers = resp.headers or {}
+                    ct = headers.get("content-type", "") or headers.get("Content-Type", "")
+                    
+                    if should_parse_network_response(ru, ct, preset, ultra):
+                        if want_image and looks_like_image_url(ru):
+                            add_net(ru)
+                            return
+                        if want_video and looks_like_video_url(ru):
+                            add_net(ru)
+                            return
+                        if looks_like_image_url(ru) or looks_like_video_url(ru):
+                            return
 
-                JM.set_progress(job_id, round_num, max_scroll_rounds, 
-                              f"Scrolling... ({round_num}/{max_scroll_rounds}) net={len(net_candidates)}")
+                        try:
+                            clen = int(headers.get("content-length") or 0)
+                        except:
+                            clen = 0
+                        if clen > NET_PARSE_MAX_BYTES:
+                            with net_lock:
+                                net_stats["oversize"] += 1
+                            return
+                        # body 一定要喺 Playwright thread 攞；regex 抽 URL 交畀 worker，callback 即刻返回
+                        body = resp.body()
+                        net_futs.append(NET_PARSE_POOL.submit(parse_net_body, body))
+                except:
+                    pass
 
-                page.mouse.wheel(0, 1800)
-                page.wait_for_timeout(scroll_wait_ms)
+            page.on("response", on_response)
+            if block_media:
+                page.route("**/*", on_route)
+            try:
+                page.add_init_script(DOM_HARVEST_JS)
+            except:
+                pass
+            dom_stats = {"batches": 0, "records": 0, "active": False}
 
+            def drain_dom():
+                """每輪滾動後攞走 harvester 累積嘅記錄，分批處理 (唔使等滾完先一次過 eval 成個 DOM)"""
                 try:
-                    h = page.evaluate("() => document.body.scrollHeight")
+                    batch = page.evaluate(DOM_DRAIN_JS)
                 except:
-                    h = last_h
+                    return
+                if batch is None:
+                    return
+                dom_stats["active"] = True
+                if batch:
+                    dom_stats["batches"] += 1
+                    dom_stats["records"] += ingest_batch(page.url, batch)
 
-                if h == last_h:
+            t_page = time.perf_counter()
+            try:
+                page.goto(url, wait_until=PAGE_GOTO_WAIT_UNTIL, timeout=GOTO_TIMEOUT_MS)
+            except:
+                pass
+            stage_done("page", t_page)
+
+            adaptive = scroll_mode == "adaptive"
+            settler = ScrollSettler(page) if adaptive else None
+            t_scroll = time.perf_counter()
+            if adaptive:
+                first = settler.wait(1500)
+            else:
+                page.wait_for_timeout(1500)
+            drain_dom()
+
+            last_h = 0
+            stable = 0
+
+            # A3: Ultra Mode 增加掃描時間
+            if ultra:
+                scroll_wait_ms = int(preset.get("scroll_wait_ms", SCROLL_WAIT_MS_DEFAULT)) + 500
+                max_scroll_rounds = int(preset.get("max_scroll_rounds", MAX_SCROLL_ROUNDS_DEFAULT)) * 2
+                stable_rounds_to_stop = int(preset.get("stable_rounds_to_stop", STABLE_ROUNDS_TO_STOP_DEFAULT)) + 2
+            else:
+                scroll_wait_ms = int(preset.get("scroll_wait_ms", SCROLL_WAIT_MS_DEFAULT))
+                max_scroll_rounds = int(preset.get("max_scroll_rounds", MAX_SCROLL_ROUNDS_DEFAULT))
+                stable_rounds_to_stop = int(preset.get("stable_rounds_to_stop", STABLE_ROUNDS_TO_STOP_DEFAULT))
+
+            scroll_px = 1800
+            # 總滾動時間唔可以超過 fixed 模式嘅預算 (首次等待 + 每輪 scroll_wait_ms)
+            scroll_deadline = t_scroll + (1500 + max_scroll_rounds * scroll_wait_ms) / 1000
+            if adaptive:
+                # 每輪滾一個 viewport 左右；總滾動距離上限同 fixed 模式一樣
+                scroll_px = max(200, int((first["viewport"] or 800) * SCROLL_VIEWPORT_FRACTION))
+                max_scroll_rounds = max_scroll_rounds * max(1, -(-1800 // scroll_px))
+                last_h = first["height"]
+
+            # B2: 智能滾動停止
+            last_net_count = 0
+            no_new_images_count = 0
+            rounds_log: List[dict] = []
+
+            for round_num in range(max_scroll_rounds):
+                if cancel_ev.is_set():
+                    return None
+                t_r = time.perf_counter()
+                if adaptive and t_r >= scroll_deadline:
+                    break
+
+                JM.set_progress(job_id, round_num, max_scroll_rounds, 
+                              f"Scrolling... ({round_num}/{max_scroll_rounds}) net={len(net_candidates)} dom={len(dom_candidates)}")
+
+                page.mouse.wheel(0, scroll_px)
+                if adaptive:
+                    # 等到網絡同 DOM 靜落嚟 (上限係 scroll_wait_ms，亦唔超過剩餘預算)
+                    r = settler.wait(max(SCROLL_MIN_WAIT_MS, min(scroll_wait_ms, int((scroll_deadline - t_r) * 1000))))
+                    h = r["height"] or last_h
+                    at_bottom = r["bottom"] >= h - 2
+                    r["round"] = round_num
+                    r["net"] = len(net_candidates)
+                    rounds_log.append(r)
+                else:
+                    t_round = time.perf_counter()
+                    page.wait_for_timeout(scroll_wait_ms)
+                    try:
+                        h = page.evaluate("() => document.body.scrollHeight")
+                    except:
+                        h = last_h
+                    at_bottom = True
+                    rounds_log.append({"round": round_num, "wait_ms": int((time.perf_counter() - t_round) * 1000),
+                                       "reason": "fixed", "height": h, "net": len(net_candidates)})
+                drain_dom()
+                tracer.complete("scroll_round", "scroll", t_r, time.perf_counter(),
+                                {"round": round_num, "reason": rounds_log[-1]["reason"], "height": h})
+
+                # adaptive 每輪只滾一個 viewport，要到咗底而且冇再長先算穩定
+                if h == last_h and at_bottom and (not adaptive or r["new_nodes"] == 0):
                     stable += 1
                     if stable >= stable_rounds_to_stop:
                         break
@@ -654,9 +2923,9 @@ def scan_worker(job_id: str, url: str, ultra: bool, use_login_profile: bool, deb
                     stable = 0
                 last_h = h
 
-                # 智能停止
-                current_net_count = len(net_candidates)
-                if current_net_count == last_net_count:
+                # 智能停止 (network + harvester 都冇新候選)
+                current_net_count = len(net_candidates) + len(dom_candidates)
+                if current_net_count == last_net_count and at_bottom:
                     no_new_images_count += 1
                     if no_new_images_count >= 2 and round_num > 10:
                         break
@@ -664,58 +2933,76 @@ def scan_worker(job_id: str, url: str, ultra: bool, use_login_profile: bool, deb
                     no_new_images_count = 0
                 last_net_count = current_net_count
 
+            scroll_ms = int((time.perf_counter() - t_scroll) * 1000)
+            stage_done("scroll", t_scroll)
+            METRICS.observe("rio_scan_scroll_rounds", len(rounds_log), mode=scroll_mode)
+            for x in rounds_log:
+                METRICS.observe("rio_scan_scroll_wait_seconds", x["wait_ms"] / 1000, mode=scroll_mode, reason=x["reason"])
+            JM.update(job_id, stats={
+                "scroll_mode": scroll_mode,
+                "scroll_px": scroll_px,
+                "scroll_rounds": len(rounds_log),
+                "scroll_ms": scroll_ms,
+                "scroll_wait_ms_total": sum(x["wait_ms"] for x in rounds_log),
+                "rounds": rounds_log[-300:],
+            })
+
             base_url = page.url
+            drain_dom()
+
+            if not dom_stats["active"]:
+                # harvester 冇裝到: 退返滾完一次過 eval 成個 DOM
+                # A1: 加入更多 data-* 屬性
+                raw_img = page.eval_on_selector_all(
+                    "img",
+                    """els => els.map(e => ({
+                    src: e.getAttribute('src') || '',
+                    currentSrc: e.currentSrc || '',
+                    srcset: e.getAttribute('srcset') || '',
+                    dataSrc: e.getAttribute('data-src') || '',
+                    dataOriginal: e.getAttribute('data-original') || '',
+                    dataLazy: e.getAttribute('data-lazy') || '',
+                    dataLazySrc: e.getAttribute('data-lazy-src') || '',
+                    dataSrcset: e.getAttribute('data-srcset') || '',
+                    dataLazySrcset: e.getAttribute('data-lazy-srcset') || '',
+                    dataZoom: e.getAttribute('data-zoom-image') || '',
+                    dataLarge: e.getAttribute('data-large') || '',
+                    dataFullSrc: e.getAttribute('data-full-src') || '',
+                    dataHires: e.getAttribute('data-hires') || '',
+                    dataOriginalSrc: e.getAttribute('data-original-src') || '',
+                    dataHighRes: e.getAttribute('data-high-res') || '',
+                    dataLightbox: e.getAttribute('data-lightbox') || ''
+                }))"""
+                )
 
-            # A1: 加入更多 data-* 屬性
-            raw_img = page.eval_on_selector_all(
-                "img",
-                """els => els.map(e => ({
-                src: e.getAttribute('src') || '',
-                currentSrc: e.currentSrc || '',
-                srcset: e.getAttribute('srcset') || '',
-                dataSrc: e.getAttribute('data-src') || '',
-                dataOriginal: e.getAttribute('data-original') || '',
-                dataLazy: e.getAttribute('data-lazy') || '',
-                dataLazySrc: e.getAttribute('data-lazy-src') || '',
-                dataSrcset: e.getAttribute('data-srcset') || '',
-                dataLazySrcset: e.getAttribute('data-lazy-srcset') || '',
-                dataZoom: e.getAttribute('data-zoom-image') || '',
-                dataLarge: e.getAttribute('data-large') || '',
-                dataFullSrc: e.getAttribute('data-full-src') || '',
-                dataHires: e.getAttribute('data-hires') || '',
-                dataOriginalSrc: e.getAttribute('data-original-src') || '',
-                dataHighRes: e.getAttribute('data-high-res') || '',
-                dataLightbox: e.getAttribute('data-lightbox') || ''
-            }))"""
-            )
+                raw_bg_styles = page.eval_on_selector_all(
+                    "[style]", "els => els.map(e => e.getAttribute('style') || '').filter(Boolean)"
+                )
 
-            raw_bg_styles = page.eval_on_selector_all(
-                "[style]", "els => els.map(e => e.getAttribute('style') || '').filter(Boolean)"
-            )
+                raw_a = page.eval_on_selector_all(
+                    "a[href]", "els => els.map(a => a.getAttribute('href') || '').filter(Boolean)"
+                )
 
-            raw_a = page.eval_on_selector_all(
-                "a[href]", "els => els.map(a => a.getAttribute('href') || '').filter(Boolean)"
-            )
+                raw_video = page.eval_on_selector_all(
+                    "video, video source, source[type^='video']",
+                    """els => els.map(e => ({
+                    src: e.getAttribute('src') || '',
+                    srcset: e.getAttribute('srcset') || '',
+                    type: e.getAttribute('type') || ''
+                }))"""
+                )
 
-            raw_video = page.eval_on_selector_all(
-                "video, video source, source[type^='video']",
-                """els => els.map(e => ({
-                src: e.getAttribute('src') || '',
-                srcset: e.getAttribute('srcset') || '',
-                type: e.getAttribute('type') || ''
-            }))"""
-            )
+                raw_source = []
+                if ultra:
+                    raw_source = page.eval_on_selector_all(
+                        "source[srcset], source[src]",
+                        "els => els.map(e => ({src: e.getAttribute('src') || '', srcset: e.getAttribute('srcset') || ''}))"
+                    )
+                ingest_dom(base_url, raw_img, raw_bg_styles, raw_a, raw_video, raw_source)
 
-            raw_source = []
             raw_link_preload = []
             js_urls = []
-            
             if ultra:
-                raw_source = page.eval_on_selector_all(
-                    "source[srcset], source[src]",
-                    "els => els.map(e => ({src: e.getAttribute('src') || '', srcset: e.getAttribute('srcset') || ''}))"
-                )
-                
                 raw_link_preload = page.eval_on_selector_all(
                     "link[rel='preload'][href]",
                     "els => els.map(l => l.getAttribute('href') || '').filter(Boolean)"
@@ -752,247 +3039,1033 @@ def scan_worker(job_id: str, url: str, ultra: bool, use_login_profile: bool, deb
                 except:
                     js_urls = []
 
-            try:
-                context.close()
-            except:
-                pass
+            for href in raw_link_preload:
+                add_dom(urljoin(base_url, href))
 
-            # 處理提取的資料
-            for obj in raw_img:
-                cand_list = []
-                ss_best = parse_srcset_pick_largest(obj.get("srcset") or "")
-                if ss_best:
-                    cand_list.append(ss_best)
-                cand_list.extend([
-                    obj.get("currentSrc"), obj.get("src"), obj.get("dataSrc"), obj.get("dataOriginal"),
-                    obj.get("dataLazy"), obj.get("dataLazySrc"), obj.get("dataSrcset"),
-                    obj.get("dataLazySrcset"), obj.get("dataZoom"), obj.get("dataLarge"),
-                    obj.get("dataFullSrc"), obj.get("dataHires"), obj.get("dataOriginalSrc"),
-                    obj.get("dataHighRes"), obj.get("dataLightbox")
-                ])
-                best = ""
-                for c in cand_list:
-                    if c and not c.lower().startswith("data:"):
-                        best = c
-                        break
-                if best:
-                    add_dom(urljoin(base_url, best))
+            # A2: 處理 JS 變數提取的 URLs
+            for js_url in js_urls:
+                add_dom(js_url)
 
-            for st in raw_bg_styles:
-                for u2 in extract_background_urls(st):
-                    add_dom(urljoin(base_url, u2))
+            JM.update(job_id, stats={**JM.jobs[job_id].stats, "dom_harvest": dict(dom_stats)})
+            return True
 
-            for href in raw_a:
-                absu = urljoin(base_url, href)
-                if absu.lower().startswith(("javascript:", "data:")):
-                    continue
-                if ultra:
-                    add_dom(absu)
-                else:
-                    lu = absu.lower()
-                    if looks_like_image_url(lu) or looks_like_video_url(lu) or "/attachment" in lu or "/attachments" in lu:
-                        add_dom(absu)
+        def load_page() -> Any:
+            """開 browser (pool 或者獨立) 執行 browse；開唔到回傳 "error" (已設定 job 狀態)"""
+            if use_login_profile or debug_browser or not BROWSER_POOL_ENABLED:
+                # 登入 profile (persistent context 會鎖住 profile 目錄) / debug 可見視窗: 每次獨立開 browser
+                with sync_playwright() as p:
+                    headless = (not debug_browser)
+            
+                    if use_login_profile:
+                        os.makedirs(PROFILE_DIR, exist_ok=True)
+                        try:
+                            context = p.chromium.launch_persistent_context(
+                                user_data_dir=PROFILE_DIR,
+                                channel=browser_channel,
+                                headless=headless,
+                                user_agent=USER_AGENT,
+                                viewport={"width": 1280, "height": 800},
+                                ignore_default_args=["--enable-automation"],
+                                args=["--no-first-run", "--no-default-browser-check"],
+                            )
+                        except Exception as e:
+                            JM.set_status(job_id, "error", f"Cannot open {browser_channel}: {e}")
+                            return "error"
+                    else:
+                        try:
+                            browser = p.chromium.launch(channel=browser_channel, headless=headless)
+                            context = browser.new_context(user_agent=USER_AGENT, viewport={"width": 1280, "height": 800})
+                        except Exception as e:
+                            JM.set_status(job_id, "error", f"Cannot open {browser_channel}: {e}")
+                            return "error"
 
-            if ultra:
-                for obj in raw_source:
-                    ss_best = parse_srcset_pick_largest(obj.get("srcset") or "")
-                    if ss_best:
-                        add_dom(urljoin(base_url, ss_best))
-                    s = obj.get("src") or ""
-                    if s and not s.lower().startswith("data:"):
-                        add_dom(urljoin(base_url, s))
-
-                for href in raw_link_preload:
-                    add_dom(urljoin(base_url, href))
-                
-                # A2: 處理 JS 變數提取的 URLs
-                for js_url in js_urls:
-                    add_dom(js_url)
+                    try:
+                        return browse(context)
+                    finally:
+                        try:
+                            context.close()
+                        except:
+                            pass
+            else:
+                # 共用 warm browser pool: 只開新 context，唔使每次冷啟動 Chromium
+                try:
+                    return BROWSER_POOL.run(browse, channel=browser_channel)
+                except BrowserLaunchError as e:
+                    JM.set_status(job_id, "error", f"Cannot open {browser_channel}: {e}")
+                    return "error"
+
+        # 批次掃描: 同時載入嘅頁面數受 pools.pages 限制；全域再受 SCHED browser slot 限制
+        t_q = time.perf_counter()
+        with (pools.pages if pools else contextlib.nullcontext()), SCHED.slot("browser", job_id) as admitted:
+            tracer.complete("wait_browser_slot", "sched", t_q, time.perf_counter())
+            if cancel_ev.is_set() or not admitted:
+                JM.set_status(job_id, "cancelled", "Cancelled.")
+                return
+            JM.set_status(job_id, "running", f"Scanning... ({preset['name']})")
+            harvest = load_page()
+        if harvest == "error":
+            return
 
-            for obj in raw_video:
-                s = obj.get("src") or ""
-                if s:
-                    add_dom(urljoin(base_url, s))
-                ss_best = parse_srcset_pick_largest(obj.get("srcset") or "")
-                if ss_best:
-                    add_dom(urljoin(base_url, ss_best))
+        if harvest is None:
+            JM.set_status(job_id, "cancelled", "Cancelled.")
+            return
 
-            merged = list(net_candidates) + dom_candidates
-            uniq = list(dict.fromkeys([u for u in merged if u]))
+        # 等埋未抽完嘅 network response
+        with tracer.span("net_parse_wait", "net", pending=len(net_futs)):
+            wait(list(net_futs))
+        merged = list(net_candidates) + dom_candidates
+        # 合併 CDN 尺寸變體 (name=small / stp= / -300x200 ...)，改寫成最高畫質 URL 先驗證
+        uniq, n_merged, canon_fallbacks = canonicalize_candidates(merged, preset)
+        net_stats["ms"] = round(net_stats["ms"], 1)
+        METRICS.inc("rio_scan_candidates_total", len(net_candidates), source="net")
+        METRICS.inc("rio_scan_candidates_total", len(dom_candidates), source="dom")
+        METRICS.inc("rio_scan_candidates_total", len(uniq), source="unique")
+        JM.update(job_id, stats={**JM.jobs[job_id].stats, "candidates": len(uniq),
+                                 "net": len(net_candidates), "dom": len(dom_candidates),
+                                 "net_parse": dict(net_stats)})
+
+        if not uniq:
+            JM.set_status(job_id, "done", "No candidates found (try Ultra).")
+            return
 
-            if not uniq:
-                JM.set_status(job_id, "done", "No candidates found (try Ultra).")
-                return
+        # 驗證 / 縮圖階段: 單獨掃描要攞全域 http slot (批次嘅 workers 已經由 ScanPools 共用限住)
+        t_q = time.perf_counter()
+        if not pools and not stage.enter_context(SCHED.slot("http", job_id)):
+            JM.set_status(job_id, "cancelled", "Cancelled.")
+            return
+        tracer.complete("wait_http_slot", "sched", t_q, time.perf_counter())
 
-            JM.set_progress(job_id, 0, len(uniq), f"Verifying links... (net={len(net_candidates)} dom={len(dom_candidates)})")
+        JM.set_progress(job_id, 0, len(uniq), f"Verifying links... (net={len(net_candidates)} dom={len(dom_candidates)} merged={n_merged})")
 
         verified: List[Tuple[str, str, Optional[int]]] = []
+        t_verify = time.perf_counter()
+
+        meta_updates: List[dict] = []
+        dim_updates: List[Tuple[str, int, int, str]] = []
+        cached_meta = META_CACHE.get_many(uniq) if use_meta_cache else {}
+
+        def probe_too_small(s: requests.Session, u: str, size: Optional[int], headb: Optional[bytes] = None) -> bool:
+            """有 min_w/min_h 時讀檔頭探測尺寸，太細就喺驗證階段淘汰 (唔使完整下載)"""
+            if not (min_w or min_h):
+                return False
+            if headb is None:
+                try:
+                    headb, _ = get_head_bytes(s, u, max_bytes=PROBE_BYTES, headers=probe_range_headers())
+                except:
+                    return False
+            return probe_rejects(u, headb, size, min_w, min_h, dim_updates)
 
         def verify_one(u: str):
             s = get_session()
-            ct, size = head_info(s, u)
+            ct, size, etag, lm = head_info_full(s, u)
             if want_image and (is_image_content_type(ct) or looks_like_image_url(u)):
+                meta_updates.append(meta_record(u, "image", ct, size, etag, lm))
+                if probe_too_small(s, u, size):
+                    return None
+                METRICS.inc("rio_verify_total", result="image")
                 return (u, ct, size)
             if want_video and (is_video_content_type(ct) or looks_like_video_url(u)):
+                meta_updates.append(meta_record(u, "video", ct, size, etag, lm))
+                METRICS.inc("rio_verify_total", result="video")
                 return (u, ct, size)
             try:
                 headb, headers = get_head_bytes(s, u)
                 ct2 = headers.get("Content-Type", ct)
                 if want_image and (is_image_content_type(ct2) or looks_like_image_url(u)):
                     Image.open(BytesIO(headb))
+                    meta_updates.append(meta_record(u, "image", ct2, size, etag, lm))
+                    if probe_too_small(s, u, size, headb):
+                        return None
+                    METRICS.inc("rio_verify_total", result="image")
                     return (u, ct2, size)
                 if want_video and (is_video_content_type(ct2) or looks_like_video_url(u)):
+                    meta_updates.append(meta_record(u, "video", ct2, size, etag, lm))
+                    METRICS.inc("rio_verify_total", result="video")
                     return (u, ct2, size)
+                if not (is_image_content_type(ct2) or is_video_content_type(ct2)):
+                    meta_updates.append(meta_record(u, "none", ct2, size, etag, lm))
+                    METRICS.inc("rio_verify_total", result="not_media")
+                else:
+                    METRICS.inc("rio_verify_total", result="unwanted")
                 return None
             except:
+                METRICS.inc("rio_verify_total", result="error")
                 return None
 
-        done = 0
-
-        # B3: 優化進度更新
-        with ThreadPoolExecutor(max_workers=VERIFY_WORKERS) as ex:
-            futs = [ex.submit(verify_one, u) for u in uniq]
-            for fut in as_completed(futs):
-                if cancel_ev.is_set():
-                    JM.set_status(job_id, "cancelled", "Cancelled.")
-                    return
-
-                r = fut.result()
-                if r:
-                    verified.append(r)
-                done += 1
-
-                if done % 5 == 0 or done == len(uniq):
-                    JM.set_progress(job_id, done, len(uniq), f"Verifying... ({done}/{len(uniq)})")
-
-        if not verified:
-            JM.set_status(job_id, "done", "No media verified (try Ultra).")
-            return
-
-        JM.set_progress(job_id, 0, len(verified), "Building thumbnails...")
-
-        out_items: List[MediaItem] = []
+        # 先查 metadata 快取，只有 miss 先需要走網絡
+        to_verify: List[str] = []
+        for u in uniq:
+            hit, r = verified_from_meta(cached_meta.get(u), want_image, want_video)
+            if not hit:
+                to_verify.append(u)
+            elif r:
+                verified.append(r)
+        METRICS.inc("rio_verify_total", len(uniq) - len(to_verify), result="cached")
+
+        done = len(uniq) - len(to_verify)
+        if done and pipeline != "fused":
+            JM.set_progress(job_id, done, len(uniq), f"Verifying... ({done}/{len(uniq)}, cached={done})")
+
+        if verify_engine == "async" and aiohttp is None:
+            print("[scan_worker] aiohttp not installed, falling back to thread verify engine")
+            verify_engine = "thread"
+
+        if pipeline == "fused":
+            # fused: 快取 miss 嘅驗證併入縮圖階段 (fused_one)
+            pass
+        elif verify_engine == "async":
+            cached_n = done
+
+            def on_verify_progress(n: int, total: int):
+                n += cached_n
+                if n % 5 == 0 or n == len(uniq):
+                    JM.set_progress(job_id, n, len(uniq), f"Verifying... ({n}/{len(uniq)})")
+
+            res = verify_urls_async(to_verify, want_image, want_video, cancel_ev,
+                                    on_progress=on_verify_progress, meta_sink=meta_updates,
+                                    min_w=min_w, min_h=min_h, dim_sink=dim_updates, tracer=tracer)
+            if res is None:
+                JM.set_status(job_id, "cancelled", "Cancelled.")
+                return
+            verified.extend(res)
+        else:
+            # B3: 優化進度更新
+            with scan_executor(pools.verify if pools else None, VERIFY_WORKERS, "scan-verify") as ex:
+                traced_verify = tracer.wrap(verify_one, "verify_one", "verify")
+                futs = [ex.submit(traced_verify, u) for u in to_verify]
+                for fut in as_completed(futs):
+                    if cancel_ev.is_set():
+                        for f in futs:
+                            f.cancel()
+                        JM.set_status(job_id, "cancelled", "Cancelled.")
+                        return
+
+                    r = fut.result()
+                    if r:
+                        verified.append(r)
+                    done += 1
+
+                    if done % 5 == 0 or done == len(uniq):
+                        JM.set_progress(job_id, done, len(uniq), f"Verifying... ({done}/{len(uniq)})")
+
+        if use_meta_cache:
+            META_CACHE.put_verified(meta_updates)
+            META_CACHE.put_dims(dim_updates)
+            meta_updates.clear()
+            dim_updates.clear()
+        stage_done("verify", t_verify)
+
+        n_items = 0
         done2 = 0
 
         def thumb_one(tup: Tuple[str, str, Optional[int]]) -> Optional[MediaItem]:
             u, ct, size = tup
             kind = "video" if (is_video_content_type(ct) or looks_like_video_url(u)) else "image"
             item_id = hash8(u)
-            thumb_path = os.path.join(thumbs_dir, f"{item_id}.jpg")
 
             if kind == "video":
-                img = make_placeholder_thumb("video")
-                save_thumb(img, thumb_path)
-                return MediaItem(id=item_id, url=u, kind="video", ct=ct, fmt="VIDEO", size=size, thumb_path=thumb_path)
+                return MediaItem(id=item_id, url=u, kind="video", ct=ct, fmt="VIDEO", size=size,
+                                 thumb_path=THUMB_STORE.placeholder("video"))
+
+            # 快取已知尺寸太細 → 唔使下載
+            row = cached_meta.get(u)
+            has_dims = bool(row and row.get("w") and row.get("h"))
+            if has_dims and (row["w"] < min_w or row["h"] < min_h):
+                return None
 
-            s = get_session()
             if size and size > MAX_THUMB_BYTES:
-                img = make_placeholder_thumb("err")
-                save_thumb(img, thumb_path)
-                return MediaItem(id=item_id, url=u, kind="image", ct=ct, fmt="BIG", size=size, thumb_path=thumb_path)
+                return MediaItem(id=item_id, url=u, kind="image", ct=ct, fmt="BIG", size=size,
+                                 thumb_path=THUMB_STORE.placeholder("err"))
+
+            # 縮圖庫已有 + 快取有尺寸 → 完全唔使走網絡
+            key = THUMB_STORE.key_for_url(u)
+            if has_dims:
+                cached_thumb = THUMB_STORE.get(key)
+                if cached_thumb:
+                    return MediaItem(id=item_id, url=u, kind="image", ct=ct, w=row["w"], h=row["h"],
+                                     fmt=row.get("fmt") or "", size=size, thumb_path=cached_thumb)
 
+            s = get_session()
             try:
                 b, headers = get_bytes(s, u, timeout=GET_TIMEOUT)
-                img = make_image_thumb_from_bytes(b)
-                save_thumb(img, thumb_path)
-
-                try:
-                    im = Image.open(BytesIO(b))
-                    w, h = im.size
-                    fmt = (im.format or "").upper()
-                except:
-                    w, h, fmt = 0, 0, ""
+                return thumb_from_bytes(u, ct, size, b)
+            except:
+                return MediaItem(id=item_id, url=u, kind="image", ct=ct, fmt="ERR", size=size,
+                                 thumb_path=THUMB_STORE.placeholder("err"))
 
+        def thumb_from_bytes(u: str, ct: str, size: Optional[int], b: bytes) -> MediaItem:
+            item_id = hash8(u)
+            try:
+                key = THUMB_STORE.key_for_url(u)
+                if thumb_backend == "process":
+                    with METRICS.time("rio_thumb_seconds", step="process"), tracer.span("process", "thumb", bytes=len(b)):
+                        data, w, h, fmt = render_thumb_in_process(b)
+                    with METRICS.time("rio_thumb_seconds", step="store"), tracer.span("store", "thumb"):
+                        thumb_path = THUMB_STORE.put_bytes(key, data)
+                else:
+                    with METRICS.time("rio_thumb_seconds", step="decode"), tracer.span("decode", "thumb", bytes=len(b)):
+                        img, w, h, fmt = make_image_thumb_with_info(b)
+                    with METRICS.time("rio_thumb_seconds", step="store"), tracer.span("store", "thumb"):
+                        thumb_path = THUMB_STORE.put(key, img)
+                dim_updates.append((u, w, h, fmt))
                 return MediaItem(id=item_id, url=u, kind="image", ct=ct, w=w, h=h, fmt=fmt, size=size, thumb_path=thumb_path)
             except:
-                img = make_placeholder_thumb("err")
-                save_thumb(img, thumb_path)
-                return MediaItem(id=item_id, url=u, kind="image", ct=ct, fmt="ERR", size=size, thumb_path=thumb_path)
+                return MediaItem(id=item_id, url=u, kind="image", ct=ct, fmt="ERR", size=size,
+                                 thumb_path=THUMB_STORE.placeholder("err"))
+
+        def fused_one(u: str) -> Optional[MediaItem]:
+            """fused 模式: 一次 streamed GET 完成驗證、尺寸讀取同縮圖 (每張圖只 decode 一次)"""
+            item_id = hash8(u)
+            s = get_session()
+            try:
+                with s.get(u, stream=True, timeout=GET_TIMEOUT, allow_redirects=True) as r:
+                    if r.status_code >= 400:
+                        METRICS.http_error(u, r.status_code)
+                    r.raise_for_status()
+                    ct = r.headers.get("Content-Type", "")
+                    cl = r.headers.get("Content-Length", "")
+                    size = int(cl) if cl and cl.isdigit() else None
+                    etag, lm = r.headers.get("ETag", ""), r.headers.get("Last-Modified", "")
+
+                    if not (want_image and (is_image_content_type(ct) or looks_like_image_url(u))):
+                        if want_video and (is_video_content_type(ct) or looks_like_video_url(u)):
+                            meta_updates.append(meta_record(u, "video", ct, size, etag, lm))
+                            METRICS.inc("rio_verify_total", result="video")
+                            return MediaItem(id=item_id, url=u, kind="video", ct=ct, fmt="VIDEO", size=size,
+                                             thumb_path=THUMB_STORE.placeholder("video"))
+                        if not (is_image_content_type(ct) or is_video_content_type(ct)):
+                            meta_updates.append(meta_record(u, "none", ct, size, etag, lm))
+                            METRICS.inc("rio_verify_total", result="not_media")
+                        else:
+                            METRICS.inc("rio_verify_total", result="unwanted")
+                        return None
+
+                    meta_updates.append(meta_record(u, "image", ct, size, etag, lm))
+                    chunk_iter = r.iter_content(chunk_size=65536)
+                    head = b""
+                    if min_w or min_h:
+                        # 先讀檔頭探測尺寸，太細就唔再下載餘下內容
+                        head = read_prefix(chunk_iter, PROBE_BYTES)
+                        if probe_rejects(u, head, size, min_w, min_h, dim_updates):
+                            return None
+                    b = None if (size and size > MAX_THUMB_BYTES) else read_body_capped(chunk_iter, MAX_THUMB_BYTES, prefix=head)
+                    METRICS.inc("rio_verify_total", result="image")
+                    if b is not None:
+                        METRICS.inc("rio_fetch_bytes_total", len(b), stage="fused")
+                    if b is None:
+                        return MediaItem(id=item_id, url=u, kind="image", ct=ct, fmt="BIG", size=size,
+                                         thumb_path=THUMB_STORE.placeholder("err"))
+            except Exception as e:
+                if not isinstance(e, requests.HTTPError):
+                    METRICS.http_error(u, type(e).__name__)
+                METRICS.inc("rio_verify_total", result="error")
+                return None
+            return thumb_from_bytes(u, ct, size if size is not None else len(b), b)
+
+        def thumb_or_fallback(tup: Tuple[str, str, Optional[int]]) -> Optional[MediaItem]:
+            """改寫後嘅 URL 攞唔到圖 (例如估錯 WordPress 原圖檔名 → 404) 就改用已見到嘅最佳 URL"""
+            it = thumb_one(tup)
+            fb = canon_fallbacks.get(tup[0])
+            if fb and it is not None and it.fmt == "ERR":
+                METRICS.inc("rio_canon_fallback_total")
+                return thumb_one((fb, tup[1], None))
+            return it
+
+        def fused_or_fallback(u: str) -> Optional[MediaItem]:
+            it = fused_one(u)
+            fb = canon_fallbacks.get(u)
+            if fb and (it is None or it.fmt == "ERR"):
+                METRICS.inc("rio_canon_fallback_total")
+                return fused_one(fb)
+            return it
+
+        traced_thumb = tracer.wrap(thumb_or_fallback, "thumb_one", "thumb")
+        if pipeline == "fused":
+            work = [(traced_thumb, v) for v in verified] + [(tracer.wrap(fused_or_fallback, "fused_one", "thumb"), u) for u in to_verify]
+            workers = VERIFY_WORKERS
+        else:
+            work = [(traced_thumb, v) for v in verified]
+            workers = THUMB_WORKERS
+
+        if not work:
+            JM.set_status(job_id, "done", "No media verified (try Ultra).")
+            return
+
+        JM.set_progress(job_id, 0, len(work), "Building thumbnails...")
+        t_thumb = time.perf_counter()
 
         # B3: 優化縮圖進度更新
-        with ThreadPoolExecutor(max_workers=THUMB_WORKERS) as ex:
-            futs = [ex.submit(thumb_one, v) for v in verified]
+        shared = (pools.verify if pipeline == "fused" else pools.thumb) if pools else None
+        with scan_executor(shared, workers, "scan-verify" if pipeline == "fused" else "scan-thumb") as ex:
+            futs = [ex.submit(fn, arg) for fn, arg in work]
             for fut in as_completed(futs):
                 if cancel_ev.is_set():
+                    for f in futs:
+                        f.cancel()
                     JM.set_status(job_id, "cancelled", "Cancelled.")
                     return
 
                 it = fut.result()
                 done2 += 1
 
-                if done2 % 3 == 0 or done2 == len(verified):
-                    JM.set_progress(job_id, done2, len(verified), f"Thumb... ({done2}/{len(verified)})")
+                if done2 % 3 == 0 or done2 == len(work):
+                    JM.set_progress(job_id, done2, len(work), f"Thumb... ({done2}/{len(work)})")
 
                 if not it:
                     continue
                 if it.kind == "image" and it.w and it.h:
                     if it.w < min_w or it.h < min_h:
                         continue
-                out_items.append(it)
-
-        out_items.sort(key=lambda x: (0 if x.kind == "image" else 1, (x.w * x.h) if x.w and x.h else 0), reverse=True)
-
-        JM.add_items(job_id, out_items)
-        JM.set_status(job_id, "done", f"Done. {len(out_items)} items. (net={len(net_candidates)})")
+                # 每完成一個就即時發佈，UI 唔使等成個掃描完成
+                JM.add_items(job_id, [it])
+                n_items += 1
+
+        if use_meta_cache:
+            META_CACHE.put_verified(meta_updates)
+            META_CACHE.put_dims(dim_updates)
+        stage_done("thumb", t_thumb)
+
+        n_collapsed = 0
+        if cluster:
+            JM.set_progress(job_id, done2, len(work), "Grouping similar images...")
+            t_cluster = time.perf_counter()
+            n_collapsed = cluster_near_duplicates(JM.get_items(job_id)[0])
+            stage_done("cluster", t_cluster)
+
+        JM.sort_items(job_id, key=lambda x: (0 if x.kind == "image" else 1, (x.w * x.h) if x.w and x.h else 0), reverse=True)
+        extra = f", {n_collapsed} similar hidden" if n_collapsed else ""
+        if block_media:
+            extra += f", blocked img={blocked['image']} media={blocked['media']} font={blocked['font']}"
+        stage_done("total", t_scan)
+        JM.update(job_id, stats={**JM.jobs[job_id].stats, "stage_ms": dict(stage_ms)})
+        JM.set_status(job_id, "done", f"Done. {n_items} items{extra}. (net={len(net_candidates)})")
 
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
         print(f"[scan_worker] Error: {error_detail}")
         JM.set_status(job_id, "error", f"Error: {str(e)[:200]}")
+    finally:
+        stage.close()
+        if tracer:
+            finish_trace(job_id)
     # ↑↑↑ D3 完 ↑↑↑
 
+def batch_summary(batch_id: str) -> dict:
+    """彙總批次入面每個子掃描嘅狀態"""
+    js = JM.jobs[batch_id]
+    counts: Dict[str, int] = {}
+    items = 0
+    for cid in js.children:
+        head = JM.peek(cid)
+        if not head:
+            continue
+        counts[head[0].status] = counts.get(head[0].status, 0) + 1
+        items += head[1]
+    finished = sum(counts.get(k, 0) for k in JOB_FINISHED)
+    return {"total": len(js.children), "finished": finished, "running": counts.get("running", 0),
+            "errors": counts.get("error", 0), "items": items}
+
+def batch_scan_worker(batch_id: str, scan_opts: dict, max_pages: int):
+    """
+    批次掃描: 每個 URL 一個子 job (共用 ScanPools)，同時最多 max_pages 個頁面載入中；
+    parent job 定期更新彙總進度。
+    """
+    cancel_ev = JM.cancel[batch_id]
+    children = list(JM.jobs[batch_id].children)
+    pools = ScanPools(max_pages)
+    JM.set_status(batch_id, "running", f"Batch: 0/{len(children)} pages")
+
+    def run_child(cid: str):
+        if cancel_ev.is_set():
+            JM.set_status(cid, "cancelled", "Cancelled.")
+            return
+        scan_worker(cid, JM.jobs[cid].url, pools=pools, **scan_opts)
+
+    try:
+        # 比頁面數多一倍 threads: 頁面載入完轉去驗證 / 縮圖時，下一個頁面可以即刻開始
+        with ThreadPoolExecutor(max_workers=max(1, min(len(children), max_pages * 2))) as ex:
+            pending = {ex.submit(run_child, cid) for cid in children}
+            while pending:
+                _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if cancel_ev.is_set():
+                    for cid in children:
+                        JM.cancel[cid].set()
+                sm = batch_summary(batch_id)
+                JM.set_progress(batch_id, sm["finished"], sm["total"],
+                                f"Batch: {sm['finished']}/{sm['total']} pages, running={sm['running']}, items={sm['items']}")
+    finally:
+        pools.shutdown()
+
+    sm = batch_summary(batch_id)
+    summary = f"{sm['total']} pages, {sm['items']} items (errors={sm['errors']})"
+    if cancel_ev.is_set():
+        JM.set_status(batch_id, "cancelled", f"Cancelled. {summary}")
+    else:
+        JM.set_status(batch_id, "done", f"Done. {summary}")
+
 # ----------------- Download Engines -----------------
-def download_builtin(urls: List[str], dest_dir: str) -> Dict[str, Any]:
-    s = get_session()
-    ok = 0
-    fail = 0
-    os.makedirs(dest_dir, exist_ok=True)
+class DownloadCancelled(Exception):
+    pass
 
-    for u in urls:
+class SegmentFallback(Exception):
+    """分段下載途中 server 唔再回 206 (唔支援 Range / 檔案已變)，改用單一連線重下"""
+    pass
+
+class HostLimiter:
+    """每個 host 一個 semaphore，限制同一 host 同時連線數"""
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.BoundedSemaphore] = {}
+
+    def get(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.per_host)
+            return self._sems[host]
+
+def interleave_by_host(urls: List[str]) -> List[int]:
+    """按 host 輪流排序 (回傳 index)，避免 worker 全部卡喺同一個 host 嘅 semaphore"""
+    buckets: Dict[str, List[int]] = {}
+    for i, u in enumerate(urls):
+        buckets.setdefault(urlparse(u).netloc, []).append(i)
+    order: List[int] = []
+    queues = list(buckets.values())
+    while queues:
+        for q in queues:
+            order.append(q.pop(0))
+        queues = [q for q in queues if q]
+    return order
+
+_final_name_lock = threading.Lock()
+
+def _finalize_part(part: str, outdir: str, base: str, ext: str, link_from: str = "") -> str:
+    """
+    揀一個未用嘅檔名 (base, base_1, base_2...) 並 rename；鎖住避免並行下載撞名。
+    有 link_from 就改為 hardlink 去已存在嘅相同檔案 (失敗會 raise OSError，part 保留)。
+    """
+    with _final_name_lock:
+        final_path = os.path.join(outdir, f"{base}.{ext}")
+        k = 1
+        while os.path.exists(final_path):
+            final_path = os.path.join(outdir, f"{base}_{k}.{ext}")
+            k += 1
+        if link_from:
+            os.link(link_from, final_path)
+            os.remove(part)
+        else:
+            os.replace(part, final_path)
+    return final_path
+
+class DedupDB:
+    """所有下載資料夾共用嘅 sha256 索引 (SQLite，放喺 APP_DATA，唔會喺使用者嘅下載資料夾留檔)"""
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+            dest_dir TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            added_at REAL NOT NULL,
+            PRIMARY KEY (dest_dir, sha256)
+        )""")
+        self.db.commit()
+
+class DedupIndex:
+    """
+    dest_dir (絕對路徑) 內已下載檔案嘅 sha256 索引，存喺 DedupDB。
+    每個 hash 記一個現存路徑；路徑已被刪除就當冇記錄。
+    """
+    def __init__(self, dest_dir: str, store: DedupDB):
+        self.dest_dir = dest_dir
+        self.lock = threading.Lock()  # lookup -> finalize -> add 要原子，避免兩個相同檔案同時寫入
+        self._store = store
+
+    def lookup(self, digest: str) -> str:
+        with self._store.lock:
+            db = self._store.db
+            row = db.execute("SELECT path FROM files WHERE dest_dir=? AND sha256=?",
+                             (self.dest_dir, digest)).fetchone()
+            if not row:
+                return ""
+            path = os.path.join(self.dest_dir, row[0])
+            if os.path.isfile(path):
+                return path
+            db.execute("DELETE FROM files WHERE dest_dir=? AND sha256=?", (self.dest_dir, digest))
+            db.commit()
+            return ""
+
+    def add(self, digest: str, path: str):
         try:
-            host = safe_name(urlparse(u).netloc)
-            outdir = os.path.join(dest_dir, host)
-            os.makedirs(outdir, exist_ok=True)
+            size = os.path.getsize(path)
+        except:
+            return
+        rel = os.path.relpath(path, self.dest_dir)
+        with self._store.lock:
+            self._store.db.execute("INSERT OR REPLACE INTO files (dest_dir, sha256, path, size, added_at) VALUES (?,?,?,?,?)",
+                                   (self.dest_dir, digest, rel, size, time.time()))
+            self._store.db.commit()
+
+_dedup_db: Optional[DedupDB] = None
+_dedup_indexes: Dict[str, DedupIndex] = {}
+_dedup_indexes_lock = threading.Lock()
+
+def get_dedup_index(dest_dir: str) -> DedupIndex:
+    global _dedup_db
+    key = os.path.abspath(dest_dir)
+    with _dedup_indexes_lock:
+        if _dedup_db is None:
+            _dedup_db = DedupDB(DEDUP_INDEX_PATH)
+        if key not in _dedup_indexes:
+            _dedup_indexes[key] = DedupIndex(key, _dedup_db)
+        return _dedup_indexes[key]
+
+def sha256_file(path: str, h=None):
+    """將檔案內容餵入 h (預設新 sha256) 並回傳 h"""
+    h = h or hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h
+
+def download_target(u: str, dest_dir: str) -> Tuple[str, str, str]:
+    """回傳 (outdir, base, part)；.part 名包含 URL hash，並行下載同名檔案唔會互相覆蓋，重試時亦搵得返"""
+    host = safe_name(urlparse(u).netloc)
+    outdir = os.path.join(dest_dir, host)
+    os.makedirs(outdir, exist_ok=True)
+
+    base = safe_name(os.path.basename(urlparse(u).path) or "")
+    if not base:
+        base = f"{host}_{hash8(u)}"
+    else:
+        base = os.path.splitext(base)[0] or f"{host}_{hash8(u)}"
+    return outdir, base, os.path.join(outdir, f"{base}.{hash8(u)}.part")
+
+def guess_ext(u: str, ct: str) -> str:
+    if is_image_content_type(ct):
+        return "jpg" if "jpeg" in ct.lower() else ct.split("/")[1].split(";")[0].strip().lower()
+    if is_video_content_type(ct):
+        return ct.split("/")[1].split(";")[0].strip().lower()
+    if looks_like_image_url(u) or looks_like_video_url(u):
+        return os.path.splitext(u.split("?")[0])[1].lstrip(".") or "bin"
+    return "bin"
 
-            base = safe_name(os.path.basename(urlparse(u).path) or "")
-            if not base:
-                base = f"{host}_{hash8(u)}"
-            else:
-                base = os.path.splitext(base)[0] or f"{host}_{hash8(u)}"
+def load_part_meta(part: str) -> dict:
+    """.part 旁邊嘅 .part.json: 記錄 url / etag / last_modified / total / ext，用嚟驗證續傳"""
+    try:
+        with open(part + ".json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return {}
+
+def save_part_meta(part: str, meta: dict):
+    try:
+        with open(part + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except:
+        pass
+
+def drop_part(part: str):
+    for p in (part, part + ".json"):
+        try:
+            os.remove(p)
+        except:
+            pass
 
-            part = os.path.join(outdir, base + ".part")
-            final = os.path.join(outdir, base)
+def if_range_validator(meta: dict) -> str:
+    """If-Range 只接受 strong ETag 或 Last-Modified；weak ETag (W/) 唔可以用"""
+    etag = meta.get("etag", "")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return meta.get("last_modified", "")
+
+def parse_content_range(v: str) -> Tuple[Optional[int], Optional[int]]:
+    """'bytes 100-199/1000' -> (100, 1000)；total 未知 ('*') 時為 None"""
+    m = re.match(r"\s*bytes\s+(\d+)-(\d+)/(\d+|\*)", v or "")
+    if not m:
+        return None, None
+    total = int(m.group(3)) if m.group(3) != "*" else None
+    return int(m.group(1)), total
+
+def _download_stream(session: requests.Session, u: str, part: str, entry: dict,
+                     cancel_ev: Optional[threading.Event] = None) -> dict:
+    """
+    單一連線下載到 part；已有 .part 就用 Range + If-Range 續傳 (以 ETag / Last-Modified 驗證)，
+    server 唔支援 Range 或檔案已變就由頭再下；串流中斷最多續傳 DOWNLOAD_RESUME_RETRIES 次。
+    回傳 part meta。
+    """
+    attempt = 0
+    while True:
+        meta = load_part_meta(part)
+        have = os.path.getsize(part) if os.path.exists(part) else 0
+        validator = if_range_validator(meta) if meta.get("url") == u else ""
+        if not (have and validator):
+            have = 0
+        headers = {"Accept-Encoding": "identity"}
+        if have:
+            headers["Range"] = f"bytes={have}-"
+            headers["If-Range"] = validator
 
-            with s.get(u, stream=True, timeout=DOWNLOAD_TIMEOUT, allow_redirects=True) as r:
+        try:
+            with session.get(u, stream=True, timeout=DOWNLOAD_TIMEOUT, allow_redirects=True, headers=headers) as r:
+                if r.status_code == 416 and have:
+                    # Range 超出檔尾: .part 已經完整就直接完成，否則由頭再下
+                    if meta.get("total") and have >= meta["total"]:
+                        entry["bytes"] = entry["total"] = have
+                        meta["sha256"] = sha256_file(part).hexdigest()
+                        return meta
+                    drop_part(part)
+                    continue
                 r.raise_for_status()
-                ct = r.headers.get("Content-Type", "")
 
-                ext = "bin"
-                if is_image_content_type(ct):
-                    ext = "jpg" if "jpeg" in ct.lower() else ct.split("/")[1].split(";")[0].strip().lower()
-                elif is_video_content_type(ct):
-                    ext = ct.split("/")[1].split(";")[0].strip().lower()
-                elif looks_like_image_url(u) or looks_like_video_url(u):
-                    ext = os.path.splitext(u.split("?")[0])[1].lstrip(".") or "bin"
-
-                final_path = final + "." + ext
-                k = 1
-                while os.path.exists(final_path):
-                    final_path = os.path.join(outdir, f"{base}_{k}.{ext}")
-                    k += 1
-
-                with open(part, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=1024 * 256):
+                start, total = parse_content_range(r.headers.get("Content-Range", ""))
+                if r.status_code == 206 and have and start == have:
+                    mode = "ab"
+                    entry["resumed_from"] = entry.get("resumed_from") or have
+                else:
+                    # 200 = server 忽略 Range 或 If-Range 驗證失敗 (檔案已變)
+                    have = 0
+                    mode = "wb"
+                    cl = r.headers.get("Content-Length", "")
+                    total = int(cl) if cl and cl.isdigit() else None
+                    meta = part_meta_from_headers(u, r.headers, total)
+                    save_part_meta(part, meta)
+
+                entry["total"] = total
+                entry["bytes"] = have
+                # 邊寫邊計 sha256 (續傳時先讀返已有部分)，dedup 唔使再讀一次檔案
+                hasher = sha256_file(part) if have else hashlib.sha256()
+                with open(part, mode) as f:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                        if cancel_ev is not None and cancel_ev.is_set():
+                            raise DownloadCancelled()
                         if chunk:
                             f.write(chunk)
+                            hasher.update(chunk)
+                            entry["bytes"] += len(chunk)
+                            entry["fetched"] = entry.get("fetched", 0) + len(chunk)
+
+            if total and entry["bytes"] < total:
+                raise requests.ConnectionError(f"incomplete body ({entry['bytes']}/{total})")
+            meta["sha256"] = hasher.hexdigest()
+            return meta
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            attempt += 1
+            if attempt > DOWNLOAD_RESUME_RETRIES:
+                raise
+            entry["retries"] = attempt
+            time.sleep(min(0.5 * (2 ** attempt), 8.0))
+
+def part_meta_from_headers(u: str, h, total: Optional[int]) -> dict:
+    return {
+        "url": u,
+        "etag": h.get("ETag", ""),
+        "last_modified": h.get("Last-Modified", ""),
+        "total": total,
+        "ext": guess_ext(u, h.get("Content-Type", "")),
+    }
 
-                os.replace(part, final_path)
-            ok += 1
-        except:
-            fail += 1
+def plan_segments(session: requests.Session, u: str) -> dict:
+    """
+    HEAD 一次: 夠大 (>= DOWNLOAD_SEGMENT_MIN_BYTES)、Accept-Ranges: bytes、有 validator
+    先分段，回傳連 segments 嘅 part meta；否則回傳 {} (用單一連線)。
+    """
+    try:
+        r = session.head(u, timeout=HEAD_TIMEOUT, allow_redirects=True, headers={"Accept-Encoding": "identity"})
+    except:
+        return {}
+    cl = r.headers.get("Content-Length", "")
+    if r.status_code != 200 or not (cl and cl.isdigit()):
+        return {}
+    total = int(cl)
+    if total < DOWNLOAD_SEGMENT_MIN_BYTES or "bytes" not in r.headers.get("Accept-Ranges", "").lower():
+        return {}
+    meta = part_meta_from_headers(u, r.headers, total)
+    if not if_range_validator(meta):
+        # 冇 validator 就保證唔到每段都係同一個版本
+        return {}
+
+    n = max(1, DOWNLOAD_SEGMENTS)
+    step = -(-total // n)
+    meta["segments"] = [{"start": i, "end": min(i + step, total) - 1, "done": 0} for i in range(0, total, step)]
+    return meta
+
+def _fetch_segment(u: str, part: str, seg: dict, validator: str, entry: dict, lock: threading.Lock,
+                   cancel_ev: Optional[threading.Event] = None, checkpoint: Optional[Callable[[], None]] = None,
+                   stop: Optional[threading.Event] = None):
+    """
+    下載一段 [start, end] 寫入預先分配好嘅 part 對應 offset；中斷就由 seg["done"] 續。
+    part 用 unbuffered 寫入，seg["done"] 只會喺資料交咗畀 OS 之後先加，checkpoint 存落嘅進度唔會超前。
+    stop 被 set (其他段失敗) 就即刻返回。
+    """
+    session = get_session()
+    seg_len = seg["end"] - seg["start"] + 1
+    attempt = 0
+    while seg["done"] < seg_len:
+        if stop is not None and stop.is_set():
+            return
+        pos = seg["start"] + seg["done"]
+        headers = {"Accept-Encoding": "identity", "Range": f"bytes={pos}-{seg['end']}", "If-Range": validator}
+        try:
+            with session.get(u, stream=True, timeout=DOWNLOAD_TIMEOUT, allow_redirects=True, headers=headers) as r:
+                r.raise_for_status()
+                start, _ = parse_content_range(r.headers.get("Content-Range", ""))
+                if r.status_code != 206 or start != pos:
+                    raise SegmentFallback()
+                with open(part, "r+b", buffering=0) as f:
+                    f.seek(pos)
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                        if cancel_ev is not None and cancel_ev.is_set():
+                            raise DownloadCancelled()
+                        if stop is not None and stop.is_set():
+                            return
+                        chunk = chunk[:seg_len - seg["done"]]
+                        if chunk:
+                            f.write(chunk)
+                            with lock:
+                                seg["done"] += len(chunk)
+                                entry["bytes"] += len(chunk)
+                                entry["fetched"] = entry.get("fetched", 0) + len(chunk)
+                            if checkpoint:
+                                checkpoint()
+                        if seg["done"] >= seg_len:
+                            break
+            if seg["done"] < seg_len:
+                raise requests.ConnectionError(f"incomplete segment ({seg['done']}/{seg_len})")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            attempt += 1
+            if attempt > DOWNLOAD_RESUME_RETRIES:
+                raise
+            backoff = min(0.5 * (2 ** attempt), 8.0)
+            if stop is None:
+                time.sleep(backoff)
+            elif stop.wait(backoff):
+                return
 
-    return {"ok": ok, "fail": fail}
+def _download_segmented(u: str, part: str, meta: dict, entry: dict,
+                        cancel_ev: Optional[threading.Event] = None,
+                        host_sem: Optional[threading.BoundedSemaphore] = None) -> dict:
+    """
+    最多 DOWNLOAD_SEGMENTS 條 Range 連線並行寫入同一個 part；每段進度存入 .part.json 以便續傳。
+    每條額外連線都要喺 host_sem (HostLimiter) 攞多一個 slot (唔等)，攞唔到就少開幾條，
+    所以同一 host 總連線數仍然唔超過 DOWNLOAD_PER_HOST。
+    """
+    total = meta["total"]
+    segs = meta["segments"]
+    if not os.path.exists(part) or os.path.getsize(part) != total:
+        with open(part, "wb") as f:
+            f.truncate(total)
+        for seg in segs:
+            seg["done"] = 0
+    validator = if_range_validator(meta)
+    lock = threading.Lock()
+    last_saved = [sum(seg["done"] for seg in segs)]
+
+    def checkpoint():
+        """每收到 DOWNLOAD_SEGMENT_SAVE_BYTES 存一次各段進度 (process 俾人 kill 都續傳得返)"""
+        with lock:
+            got = sum(seg["done"] for seg in segs)
+            if got - last_saved[0] < DOWNLOAD_SEGMENT_SAVE_BYTES:
+                return
+            last_saved[0] = got
+            save_part_meta(part, meta)
+
+    entry["total"] = total
+    entry["bytes"] = sum(seg["done"] for seg in segs)
+    entry["segments"] = segs
+    if entry["bytes"]:
+        entry["resumed_from"] = entry["bytes"]
+
+    todo = [seg for seg in segs if seg["done"] < seg["end"] - seg["start"] + 1]
+    extra = 0  # 呼叫者已經攞咗一個 host slot
+    if host_sem is None:
+        extra = max(0, len(todo) - 1)
+    else:
+        while extra < len(todo) - 1 and host_sem.acquire(blocking=False):
+            extra += 1
+    stop = threading.Event()  # 任何一段失敗 (SegmentFallback / 取消 / 重試用盡)，其他段即刻停
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, 1 + extra)) as ex:
+            futs = [ex.submit(_fetch_segment, u, part, seg, validator, entry, lock, cancel_ev, checkpoint, stop)
+                    for seg in todo]
+            try:
+                for fut in as_completed(futs):
+                    fut.result()
+            except BaseException:
+                stop.set()
+                for f in futs:
+                    f.cancel()
+                raise
+    finally:
+        if host_sem is not None:
+            for _ in range(extra):
+                host_sem.release()
+        with lock:
+            save_part_meta(part, meta)
+
+    # rename 之前確認長度
+    got = sum(seg["done"] for seg in segs)
+    if got != total or os.path.getsize(part) != total:
+        raise IOError(f"segmented download length mismatch ({got}/{total})")
+    return meta
+
+def download_one(session: requests.Session, u: str, dest_dir: str, entry: dict,
+                 cancel_ev: Optional[threading.Event] = None, dedup: str = "off",
+                 host_sem: Optional[threading.BoundedSemaphore] = None) -> str:
+    """
+    下載單一檔案，進度寫入 entry (bytes / total / status，分段時另有 segments)；回傳最終路徑。
+    大檔案 (見 plan_segments) 用多條 Range 連線分段下載，其餘用單一連線 (支援續傳)。
+    dedup != "off" 時用 sha256 對比 dest_dir 已有檔案 (見 DedupIndex)。
+    """
+    outdir, base, part = download_target(u, dest_dir)
+    entry["status"] = "downloading"
+
+    meta = load_part_meta(part)
+    if meta.get("url") != u:
+        meta = {}
+    if not meta.get("segments") and not os.path.exists(part):
+        meta = plan_segments(session, u)
+        if meta:
+            save_part_meta(part, meta)
+
+    if meta.get("segments"):
+        try:
+            meta = _download_segmented(u, part, meta, entry, cancel_ev, host_sem)
+        except SegmentFallback:
+            drop_part(part)
+            entry["segments"] = None
+            entry["bytes"] = 0
+            meta = _download_stream(session, u, part, entry, cancel_ev)
+    else:
+        meta = _download_stream(session, u, part, entry, cancel_ev)
+
+    ext = meta.get("ext") or "bin"
+    if dedup == "off":
+        final_path = _finalize_part(part, outdir, base, ext)
+        drop_part(part)
+        entry["path"] = final_path
+        entry["status"] = "done"
+        return final_path
+
+    digest = meta.get("sha256") or sha256_file(part).hexdigest()
+    entry["sha256"] = digest
+    index = get_dedup_index(dest_dir)
+    with index.lock:
+        dup = index.lookup(digest)
+        final_path = ""
+        if dup:
+            entry["duplicate_of"] = dup
+            if dedup == "skip":
+                drop_part(part)
+                entry["path"] = dup
+                entry["status"] = "duplicate"
+                return dup
+            if dedup == "hardlink":
+                try:
+                    final_path = _finalize_part(part, outdir, base, ext, link_from=dup)
+                except OSError:
+                    final_path = ""  # 唔支援 hardlink (例如跨磁碟/FAT) 就照常儲存
+        if not final_path:
+            final_path = _finalize_part(part, outdir, base, ext)
+        if not dup:
+            index.add(digest, final_path)
+    drop_part(part)
+    entry["path"] = final_path
+    entry["status"] = "done"
+    return final_path
+
+def format_speed(bps: float) -> str:
+    if bps >= 1024 * 1024:
+        return f"{bps / 1024 / 1024:.1f} MB/s"
+    return f"{bps / 1024:.0f} KB/s"
+
+def download_builtin(urls: List[str], dest_dir: str, job_id: Optional[str] = None,
+                     cancel_ev: Optional[threading.Event] = None, dedup: str = "off") -> Dict[str, Any]:
+    """
+    並行下載 (DOWNLOAD_WORKERS threads，每 host 最多 DOWNLOAD_PER_HOST)。
+    有 job_id 時定期將進度、速度同每個檔案狀態寫入 JobState。
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    # 所有 key 一開始就要有: files 同 JobState 共用，worker 只改值唔加 key，
+    # 否則 /api/status / SSE 嘅 asdict 會撞到 "dictionary changed size during iteration"
+    files = [{"url": u, "status": "queued", "bytes": 0, "total": None, "path": "", "error": "",
+              "fetched": 0, "retries": 0, "resumed_from": 0, "segments": None,
+              "sha256": "", "duplicate_of": ""} for u in urls]
+    limiter = HostLimiter(DOWNLOAD_PER_HOST)
+    if job_id:
+        JM.update(job_id, files=files)
+
+    def _task(i: int) -> bool:
+        u = urls[i]
+        entry = files[i]
+        host_sem = limiter.get(urlparse(u).netloc)
+        with host_sem:
+            if cancel_ev is not None and cancel_ev.is_set():
+                entry["status"] = "cancelled"
+                return False
+            try:
+                try:
+                    download_one(get_session(), u, dest_dir, entry, cancel_ev, dedup, host_sem)
+                finally:
+                    METRICS.inc("rio_fetch_bytes_total", entry.get("fetched", 0), stage="download")
+                METRICS.inc("rio_download_files_total", result=entry["status"])
+                return True
+            except DownloadCancelled:
+                entry["status"] = "cancelled"
+                METRICS.inc("rio_download_files_total", result="cancelled")
+                return False
+            except Exception as e:
+                entry["status"] = "error"
+                entry["error"] = str(e)[:200]
+                code = getattr(getattr(e, "response", None), "status_code", None)
+                METRICS.http_error(u, code or type(e).__name__)
+                METRICS.inc("rio_download_files_total", result="error")
+                return False
+
+    last_t = time.time()
+    last_b = 0
+    speed = 0.0
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="download") as ex:
+        METRICS.track_pool(ex)
+        pending = {ex.submit(_task, i) for i in interleave_by_host(urls)}
+        while pending:
+            _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if not job_id:
+                continue
+            now = time.time()
+            done_b = sum(f["bytes"] for f in files)
+            # 速度只計今次實際收到嘅 bytes (續傳前已有嘅部分唔計)
+            fetched = sum(f.get("fetched", 0) for f in files)
+            if now - last_t >= 0.5 or not pending:
+                inst = (fetched - last_b) / max(now - last_t, 1e-6)
+                speed = inst if speed == 0 else speed * 0.6 + inst * 0.4
+                last_t, last_b = now, fetched
+            n = len(urls) - len(pending)
+            JM.update(job_id, bytes_done=done_b, bytes_per_sec=round(speed, 1),
+                      progress_i=n, progress_total=max(len(urls), 1),
+                      message=f"Downloading... ({n}/{len(urls)}) {format_speed(speed)}")
+
+    ok = sum(1 for f in files if f["status"] in ("done", "duplicate"))
+    dup = sum(1 for f in files if f.get("duplicate_of"))
+    return {"ok": ok, "fail": len(urls) - ok, "dup": dup}
+
+def builtin_download_worker(job_id: str, urls: List[str], dest_dir: str, dedup: str = "off"):
+    cancel_ev = JM.cancel[job_id]
+    JM.set_status(job_id, "running", f"Downloading {len(urls)} files...")
+    try:
+        res = download_builtin(urls, dest_dir, job_id=job_id, cancel_ev=cancel_ev, dedup=dedup)
+    except Exception as e:
+        JM.set_status(job_id, "error", f"Error: {str(e)[:200]}")
+        return
+
+    summary = f"ok={res['ok']} fail={res['fail']} dup={res['dup']}"
+    if cancel_ev.is_set():
+        JM.set_status(job_id, "cancelled", f"Cancelled. {summary}")
+    else:
+        JM.set_status(job_id, "done", f"Done. {summary}")
 
 def download_gallery_dl(urls: List[str], dest_dir: str) -> Dict[str, Any]:
     cmd = get_gdl_command()
@@ -1177,12 +4250,73 @@ def clear_login():
         shutil.rmtree(PROFILE_DIR, ignore_errors=True)
     return {"ok": True, "message": "Login profile cleared."}
 
-@app.post("/api/scan")
-def scan(payload: dict):
-    url = (payload or {}).get("url", "").strip()
-    if not url:
-        raise HTTPException(400, "url required")
+@app.get("/api/cache/meta")
+def meta_cache_info(url: str = ""):
+    """metadata 快取統計；帶 ?url= 時回傳該 entry"""
+    if url:
+        row = META_CACHE.get(url)
+        if not row:
+            raise HTTPException(404, "not cached")
+        return row
+    return META_CACHE.stats()
+
+@app.post("/api/cache/meta/clear")
+def meta_cache_clear(payload: dict = None):
+    """清除 metadata 快取: {"url_prefix": "..."} 只清該前綴, {"expired_only": true} 只清過期/超量"""
+    n = META_CACHE.clear(url_prefix=((payload or {}).get("url_prefix") or "").strip(),
+                         expired_only=bool((payload or {}).get("expired_only", False)))
+    return {"ok": True, "removed": n}
+
+@app.get("/api/stats/probe")
+def probe_stats():
+    """尺寸探測統計 (被提早淘汰嘅細圖數量 / 節省嘅下載 bytes)"""
+    return PROBE_STATS.snapshot()
+
+@app.get("/api/stats/browser_pool")
+def browser_pool_stats():
+    """常駐 browser pool 狀態 (冷啟動次數 / 重啟次數 / 每個 browser 用咗幾多次)"""
+    return BROWSER_POOL.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format：掃描各階段耗時、驗證結果、HTTP 錯誤、pool queue 深度…"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/trace/{job_id}")
+def get_trace(job_id: str):
+    """掃描嘅 Chrome trace-event JSON (chrome://tracing / ui.perfetto.dev)；掃描中會回傳目前為止嘅 span"""
+    headers = {"Content-Disposition": f'attachment; filename="trace-{job_id}.json"'}
+    tr = TRACES.get(job_id)
+    if tr is not None:
+        return JSONResponse(tr.to_json(), headers=headers)
+    p = trace_path(job_id)
+    if os.path.isfile(p):
+        return FileResponse(p, media_type="application/json", filename=f"trace-{job_id}.json")
+    if JM.peek(job_id) is None:
+        raise HTTPException(404, "job not found")
+    raise HTTPException(404, "no trace for this job (scan with \"trace\": true)")
+
+@app.get("/api/stats/scheduler")
+def scheduler_stats():
+    """每類 slot 嘅容量 / 執行中 / 排隊中 / 累計排過隊嘅 job 數"""
+    return SCHED.stats()
+
+@app.get("/api/stats/jobs")
+def job_store_stats():
+    """記憶體入面嘅 job 數 / 已移走 / lazy load 次數 + SQLite job store 大小"""
+    return JM.stats()
+
+@app.get("/api/cache/thumbs")
+def thumb_store_info():
+    return THUMB_STORE.stats()
 
+@app.post("/api/cache/thumbs/gc")
+def thumb_store_gc():
+    """立即執行清理: 孤立 job 目錄 + 縮圖庫超額淘汰 + 過期 metadata"""
+    return {"ok": True, **run_maintenance()}
+
+def parse_scan_options(payload: dict) -> dict:
+    """/api/scan 同 /api/scan/batch 共用嘅掃描參數 (scan_worker 嘅 keyword args)"""
     ultra = bool((payload or {}).get("ultra", False))
     use_login_profile = bool((payload or {}).get("use_login_profile", False))
     debug_browser = bool((payload or {}).get("debug_browser", False))
@@ -1191,16 +4325,93 @@ def scan(payload: dict):
     want_image = bool((payload or {}).get("want_image", True))
     want_video = bool((payload or {}).get("want_video", True))
     blacklist = (payload or {}).get("blacklist", ",".join(DEFAULT_BLACKLIST))
+    verify_engine = str((payload or {}).get("verify_engine") or VERIFY_ENGINE_DEFAULT).strip().lower()
+    if verify_engine not in ("thread", "async"):
+        raise HTTPException(400, "verify_engine must be 'thread' or 'async'")
+    use_meta_cache = bool((payload or {}).get("use_meta_cache", True))
+    pipeline = str((payload or {}).get("pipeline") or PIPELINE_DEFAULT).strip().lower()
+    if pipeline not in ("staged", "fused"):
+        raise HTTPException(400, "pipeline must be 'staged' or 'fused'")
+    thumb_backend = str((payload or {}).get("thumb_backend") or THUMB_BACKEND_DEFAULT).strip().lower()
+    if thumb_backend not in ("thread", "process"):
+        raise HTTPException(400, "thumb_backend must be 'thread' or 'process'")
+    cluster = bool((payload or {}).get("cluster", CLUSTER_DEFAULT))
+    block_media = bool((payload or {}).get("block_media", BLOCK_MEDIA_DEFAULT))
+    scroll_mode = str((payload or {}).get("scroll_mode") or SCROLL_MODE_DEFAULT).strip().lower()
+    if scroll_mode not in ("fixed", "adaptive"):
+        raise HTTPException(400, "scroll_mode must be 'fixed' or 'adaptive'")
+    trace = bool((payload or {}).get("trace", TRACE_DEFAULT))
+    return {
+        "ultra": ultra, "use_login_profile": use_login_profile, "debug_browser": debug_browser,
+        "min_w": min_w, "min_h": min_h, "want_image": want_image, "want_video": want_video,
+        "blacklist_csv": blacklist, "verify_engine": verify_engine, "use_meta_cache": use_meta_cache,
+        "pipeline": pipeline, "thumb_backend": thumb_backend, "cluster": cluster,
+        "block_media": block_media, "scroll_mode": scroll_mode, "trace": trace,
+    }
+
+def parse_priority(payload: dict) -> int:
+    """排程優先度: 整數，大先 (-10 ~ 10，預設 0)"""
+    try:
+        p = int((payload or {}).get("priority") or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "priority must be an integer")
+    return max(-10, min(p, 10))
+
+@app.post("/api/scan")
+def scan(payload: dict):
+    url = (payload or {}).get("url", "").strip()
+    if not url:
+        raise HTTPException(400, "url required")
+    opts = parse_scan_options(payload)
 
-    job_id = JM.new_job(job_type="scan")
-    t = threading.Thread(
-        target=scan_worker,
-        args=(job_id, url, ultra, use_login_profile, debug_browser, min_w, min_h, want_image, want_video, blacklist),
-        daemon=True
-    )
+    job_id = JM.new_job(job_type="scan", url=url, priority=parse_priority(payload))
+    t = threading.Thread(target=scan_worker, args=(job_id, url), kwargs=opts, daemon=True)
     t.start()
     return {"job_id": job_id}
 
+@app.post("/api/scan/batch")
+def scan_batch(payload: dict):
+    """批次掃描多個網址，回傳 parent job_id (子 job 見 /api/batch/{job_id})"""
+    urls = [str(u).strip() for u in ((payload or {}).get("urls") or []) if str(u).strip()]
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        raise HTTPException(400, "urls required")
+    if len(urls) > BATCH_MAX_URLS:
+        raise HTTPException(400, f"too many urls (max {BATCH_MAX_URLS})")
+    opts = parse_scan_options(payload)
+    if opts["use_login_profile"] or opts["debug_browser"]:
+        # persistent profile 同一時間只可以俾一個 browser 用
+        raise HTTPException(400, "use_login_profile / debug_browser not supported in batch")
+    try:
+        max_pages = int((payload or {}).get("max_concurrent") or BATCH_MAX_PAGES)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "max_concurrent must be an integer")
+    max_pages = max(1, min(max_pages, 16))
+
+    priority = parse_priority(payload)
+    batch_id = JM.new_job(job_type="batch", priority=priority)
+    children = [JM.new_job(job_type="scan", url=u, parent_id=batch_id, priority=priority) for u in urls]
+    JM.update(batch_id, children=children, progress_total=len(children))
+    threading.Thread(target=batch_scan_worker, args=(batch_id, opts, max_pages), daemon=True).start()
+    return {"job_id": batch_id, "children": [{"url": u, "job_id": c} for u, c in zip(urls, children)]}
+
+@app.get("/api/batch/{job_id}")
+def batch_status(job_id: str):
+    """批次掃描: 彙總 + 每個網址嘅進度"""
+    js = JM.get(job_id)
+    if not js or js.job_type != "batch":
+        raise HTTPException(404, "batch job not found")
+    children = []
+    for cid in js.children:
+        head = JM.peek(cid)
+        if not head:
+            continue
+        c, n_items = head
+        children.append({"job_id": cid, "url": c.url, "status": c.status, "message": c.message,
+                         "progress_i": c.progress_i, "progress_total": c.progress_total,
+                         "n_items": n_items})
+    return {"job": JM.snapshot(job_id), "summary": batch_summary(job_id), "children": children}
+
 @app.post("/api/gdl_direct")
 def gdl_direct(payload: dict):
     url = (payload or {}).get("url", "").strip()
@@ -1215,8 +4426,8 @@ def gdl_direct(payload: dict):
     if not cmd:
         raise HTTPException(400, "gallery-dl not available")
 
-    job_id = JM.new_job(job_type="gdl_direct")
-    t = threading.Thread(target=gdl_direct_worker, args=(job_id, url, dest_dir), daemon=True)
+    job_id = JM.new_job(job_type="gdl_direct", url=url, priority=parse_priority(payload))
+    t = threading.Thread(target=run_scheduled, args=("tool", job_id, gdl_direct_worker, url, dest_dir), daemon=True)
     t.start()
     return {"job_id": job_id}
 
@@ -1235,46 +4446,97 @@ def ytdlp_direct(payload: dict):
     if not cmd:
         raise HTTPException(400, "yt-dlp not available")
 
-    job_id = JM.new_job(job_type="ytdlp_direct")
-    t = threading.Thread(target=ytdlp_direct_worker, args=(job_id, url, dest_dir), daemon=True)
+    job_id = JM.new_job(job_type="ytdlp_direct", url=url, priority=parse_priority(payload))
+    t = threading.Thread(target=run_scheduled, args=("tool", job_id, ytdlp_direct_worker, url, dest_dir), daemon=True)
     t.start()
     return {"job_id": job_id}
 
 @app.post("/api/stop/{job_id}")
 def cancel(job_id: str):
-    if job_id not in JM.jobs:
+    if not JM.ensure(job_id):
         raise HTTPException(404, "job not found")
     JM.cancel[job_id].set()
     return {"ok": True}
 
 @app.get("/api/status/{job_id}")
 def job_status(job_id: str):
-    if job_id not in JM.jobs:
+    if not JM.ensure(job_id):
+        raise HTTPException(404, "job not found")
+    return JM.snapshot(job_id)
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _job_event_stream(job_id: str, since: int):
+    """
+    推送 job 事件 (由 set_status / set_progress / add_items 直接喚醒):
+    status = JobState (包括進度), items = 新增 items + next_since, end = job 結束。
+    """
+    loop = asyncio.get_running_loop()
+    ev = asyncio.Event()
+    JM.watch(job_id, loop, ev)
+    try:
+        last_st = None
+        while True:
+            ev.clear()
+            st = JM.snapshot(job_id)
+            st.pop("stats", None)  # 每輪滾動記錄唔經 SSE 推，要睇用 /api/status
+            if st != last_st:
+                yield sse_event("status", st)
+                last_st = st
+            items, last_seq = JM.get_items(job_id, since)
+            if items:
+                since = last_seq
+                yield sse_event("items", {"items": [asdict(x) for x in items], "next_since": last_seq})
+            if st["status"] in ("done", "error", "cancelled"):
+                yield sse_event("end", {"status": st["status"]})
+                break
+            try:
+                await asyncio.wait_for(ev.wait(), timeout=SSE_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        JM.unwatch(job_id, loop, ev)
+
+@app.get("/api/events/{job_id}")
+def job_events(job_id: str, since: int = 0):
+    """Server-Sent Events: 取代 /api/status 輪詢"""
+    if not JM.ensure(job_id):
         raise HTTPException(404, "job not found")
-    return asdict(JM.jobs[job_id])
+    return StreamingResponse(_job_event_stream(job_id, since), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/api/items/{job_id}")
-def job_items(job_id: str):
-    if job_id not in JM.jobs:
+def job_items(job_id: str, since: int = 0):
+    """since: 上次回傳嘅 next_since，只回傳之後新增嘅 items"""
+    if not JM.ensure(job_id):
         raise HTTPException(404, "job not found")
-    items = JM.items.get(job_id, [])
-    return {"items": [asdict(x) for x in items]}
+    items, last_seq = JM.get_items(job_id, since)
+    return {"items": [asdict(x) for x in items], "next_since": last_seq}
+
+def _resolve_thumb_path(job_id: str, item_id: str, suffix: str = "") -> Optional[str]:
+    """縮圖路徑: 先查 job item (全域縮圖庫)，再退回舊版 JOBS_DIR/<job>/thumbs"""
+    it = JM.get_item(job_id, item_id) if JM.ensure(job_id) else None
+    if it and it.thumb_path and not suffix and os.path.exists(it.thumb_path):
+        return it.thumb_path
+    p = os.path.join(JOBS_DIR, job_id, "thumbs", f"{item_id}{suffix}.jpg")
+    return p if os.path.exists(p) else None
 
 @app.get("/api/thumb/{job_id}/{item_id}.jpg")
 def thumb(job_id: str, item_id: str):
-    p = os.path.join(JOBS_DIR, job_id, "thumbs", f"{item_id}.jpg")
-    if not os.path.exists(p):
+    p = _resolve_thumb_path(job_id, item_id)
+    if not p:
         raise HTTPException(404, "thumb not found")
     return FileResponse(p, media_type="image/jpeg")
 
 @app.get("/api/thumb_large/{job_id}/{item_id}.jpg")
 def thumb_large(job_id: str, item_id: str):
     """Lightbox large thumbnail (800x800)"""
-    p = os.path.join(JOBSDIR, job_id, "thumbs", f"{item_id}_large.jpg")
-    if not os.path.exists(p):
+    p = _resolve_thumb_path(job_id, item_id, "_large")
+    if not p:
         # Fallback to normal thumbnail
-        p = os.path.join(JOBSDIR, job_id, "thumbs", f"{item_id}.jpg")
-        if not os.path.exists(p):
+        p = _resolve_thumb_path(job_id, item_id)
+        if not p:
             raise HTTPException(404, "thumb not found")
     return FileResponse(p, media_type="image/jpeg")
 
@@ -1297,12 +4559,21 @@ def download(payload: dict):
     if not isinstance(urls, list) or not urls:
         raise HTTPException(400, "urls required")
 
+    dedup = (payload or {}).get("dedup") or load_config().get("dedup_policy", DOWNLOAD_DEDUP_DEFAULT)
+    if dedup not in ("off", "skip", "hardlink", "report"):
+        raise HTTPException(400, "dedup must be 'off', 'skip', 'hardlink' or 'report'")
+
     if engine == "gallery-dl":
         res = download_gallery_dl(urls, dest_dir)
     elif engine == "yt-dlp":
         res = download_ytdlp(urls, dest_dir)
     else:
-        res = download_builtin(urls, dest_dir)
+        # 內建下載器: 背景 job，即時回傳 job_id (進度見 /api/status 或 /api/events)
+        job_id = JM.new_job(job_type="download", priority=parse_priority(payload))
+        t = threading.Thread(target=run_scheduled, args=("download", job_id, builtin_download_worker, urls, dest_dir, dedup),
+                             daemon=True)
+        t.start()
+        return {"ok": True, "job_id": job_id}
 
     return {"ok": True, "result": res}
 
@@ -1318,6 +4589,9 @@ def _auto_open_ui():
 
 if __name__ == "__main__":
     auto_install_update_gdl_linux()
+    start_maintenance_thread()
+    if BROWSER_POOL_ENABLED:
+        threading.Thread(target=BROWSER_POOL.warm, args=(default_browser_channel(),), daemon=True).start()
     threading.Thread(target=_auto_open_ui, daemon=True).start()
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8787, log_level="info")
@@ -12,6 +12,8 @@ let state = {
     ytdlpInfo: "",
     filterFormats: new Set(),
     platformType: "unknown",
+    downloadJobId: null,  // 進行中的內建下載 job
+    showVariants: false,  // 顯示被分組收起的相似圖 (不同尺寸版本)
 };
 
 const $ = (id) => document.getElementById(id);
@@ -186,6 +188,7 @@ function toggleFilterFormat(fmt) {
 function getFilteredItems() {
     return state.items.filter(it => {
         if (it.fmt === "ERR" || it.fmt === "BIG") return false;
+        if (it.dup_of && !state.showVariants) return false;
         
         if (state.filterFormats.size > 0 && it.kind === "image") {
             const fmt = (it.fmt || "").toUpperCase();
@@ -253,6 +256,20 @@ function render() {
         left.appendChild(b1);
         left.appendChild(b2);
         
+        // 相似圖分組: 代表顯示 +N，成員顯示「相似」
+        if (it.variants && it.variants.length > 0) {
+            const b3 = document.createElement("span");
+            b3.className = "badge";
+            b3.textContent = `+${it.variants.length}`;
+            b3.title = "其他尺寸版本已收起 (勾選「顯示相似圖」查看)";
+            left.appendChild(b3);
+        } else if (it.dup_of) {
+            const b3 = document.createElement("span");
+            b3.className = "badge";
+            b3.textContent = "相似";
+            left.appendChild(b3);
+        }
+        
         const cb = document.createElement("input");
         cb.type = "checkbox";
         cb.checked = state.selected.has(it.id);
@@ -358,6 +375,11 @@ function resetFilter() {
     render();
 }
 
+function toggleVariants() {
+    state.showVariants = $("showVariants").checked;
+    render();
+}
+
 function selectAll() {
     getFilteredItems().forEach(it => state.selected.add(it.id));
     render();
@@ -407,9 +429,10 @@ async function startScan() {
     }
     
     const ultra = $("ultraCheck").checked;
+    const block_media = $("blockMediaCheck").checked;
     
     try {
-        const data = await api("/api/scan", "POST", { url, ultra });
+        const data = await api("/api/scan", "POST", { url, ultra, block_media });
         state.jobId = data.job_id;
         state.items = [];
         state.selected.clear();
@@ -440,35 +463,81 @@ function clearJob() {
   setProgress(0);
 }
 
+function isJobFinished(st) {
+    return st.status === "done" || st.status === "error" || st.status === "cancelled";
+}
+
+// 以 Server-Sent Events 接收任務事件 (status / items / end)
+// 回傳 true = 已收到 end；false = 瀏覽器不支援或連線中斷，呼叫端改用輪詢
+function streamJob(jid, onStatus, onItems, since = 0) {
+    return new Promise((resolve) => {
+        if (!window.EventSource) {
+            resolve(false);
+            return;
+        }
+        const es = new EventSource(`/api/events/${jid}?since=${since}`);
+        es.addEventListener("status", (e) => onStatus(JSON.parse(e.data)));
+        es.addEventListener("items", (e) => onItems && onItems(JSON.parse(e.data)));
+        es.addEventListener("end", () => {
+            es.close();
+            resolve(true);
+        });
+        es.onerror = () => {
+            es.close();
+            resolve(false);
+        };
+    });
+}
+
 async function pollJob(jid) {
-    while (true) {
+    let since = 0;  // /api/items 游標，只攞新增的項目
+    let finished = false;
+    
+    const onStatus = (st) => {
+        setStatus(st.message || st.status);
+        if (st.progress_total > 0) {
+            const pct = (st.progress_i / st.progress_total) * 100;
+            setProgress(pct);
+        }
+        if (isJobFinished(st)) finished = true;
+    };
+    const onItems = (data) => {
+        if (state.jobId === jid && data.items && data.items.length > 0) {
+            state.items.push(...data.items);
+            render();
+        }
+        since = data.next_since || since;
+    };
+    
+    // 優先用推送；不可用時退回 500ms 輪詢
+    const streamed = await streamJob(jid, onStatus, onItems);
+    while (!streamed && !finished) {
         try {
-            const st = await api(`/api/status/${jid}`);
-            setStatus(st.message || st.status);
-            
-            if (st.progress_total > 0) {
-                const pct = (st.progress_i / st.progress_total) * 100;
-                setProgress(pct);
-            }
-            
-            if (st.status === "done" || st.status === "error" || st.status === "cancelled") {
-                $("scanBtn").disabled = false;
-                $("stopBtn").disabled = true;
-                $("scanBtn").classList.remove("running");
-                
-                if (st.status === "done") {
-                    const itemsData = await api(`/api/items/${jid}`);
-                    state.items = itemsData.items || [];
-                    render();
-                }
-                break;
-            }
+            onStatus(await api(`/api/status/${jid}`));
+            if (finished) break;
+            onItems(await api(`/api/items/${jid}?since=${since}`));
         } catch (e) {
             console.error(e);
             break;
         }
         await new Promise(r => setTimeout(r, 500));
     }
+    
+    if (!finished) return;
+    $("scanBtn").disabled = false;
+    $("stopBtn").disabled = true;
+    $("scanBtn").classList.remove("running");
+    
+    // 完成後攞一次已排序的完整列表
+    if (state.jobId === jid) {
+        try {
+            const itemsData = await api(`/api/items/${jid}`);
+            state.items = itemsData.items || [];
+            render();
+        } catch (e) {
+            console.error(e);
+        }
+    }
 }
 
 // gallery-dl 直接下載
@@ -520,25 +589,78 @@ async function startYTDLP() {
 }
 
 async function pollJobForDirectDownload(jid, btnId) {
-    while (true) {
+    let finished = false;
+    const onStatus = (st) => {
+        setStatus(st.message || st.status);
+        if (isJobFinished(st)) finished = true;
+    };
+    
+    const streamed = await streamJob(jid, onStatus, null);
+    while (!streamed && !finished) {
         try {
-            const st = await api(`/api/status/${jid}`);
-            setStatus(st.message || st.status);
-            
-            if (st.status === "done" || st.status === "error" || st.status === "cancelled") {
-                $(btnId).disabled = false;
-                $(btnId).classList.remove("running");
-                break;
-            }
+            onStatus(await api(`/api/status/${jid}`));
         } catch (e) {
             console.error(e);
             break;
         }
+        if (finished) break;
         await new Promise(r => setTimeout(r, 500));
     }
+    
+    if (finished) {
+        $(btnId).disabled = false;
+        $(btnId).classList.remove("running");
+    }
+}
+
+// 追蹤內建下載 job (SSE，失敗時改用輪詢)，完成後顯示成功/失敗數
+async function trackDownloadJob(jid) {
+    const btn = $("downloadBtn");
+    state.downloadJobId = jid;
+    btn.textContent = "停止下載";
+    let last = null;
+    const onStatus = (st) => {
+        last = st;
+        setStatus(st.message || st.status);
+        if (st.progress_total > 0) setProgress(st.progress_i / st.progress_total * 100);
+    };
+    
+    const streamed = await streamJob(jid, onStatus, null);
+    while (!streamed && !(last && isJobFinished(last))) {
+        try {
+            onStatus(await api(`/api/status/${jid}`));
+        } catch (e) {
+            console.error(e);
+            break;
+        }
+        if (isJobFinished(last)) break;
+        await new Promise(r => setTimeout(r, 500));
+    }
+    
+    state.downloadJobId = null;
+    btn.textContent = "下載選取項目";
+    setProgress(0);
+    if (last) {
+        const files = last.files || [];
+        const ok = files.filter(f => f.status === "done" || f.status === "duplicate").length;
+        const dup = files.filter(f => f.duplicate_of).length;
+        const title = last.status === "cancelled" ? "下載已停止" : "下載完成";
+        alert(`${title}\n成功: ${ok}\n失敗: ${files.length - ok}\n重複內容: ${dup}`);
+    }
+    setStatus("Ready.");
 }
 
 async function downloadSelected() {
+    // 下載進行中再按 = 停止
+    if (state.downloadJobId) {
+        try {
+            await api(`/api/stop/${state.downloadJobId}`, "POST");
+        } catch (e) {
+            console.error(e);
+        }
+        return;
+    }
+    
     const sel = Array.from(state.selected);
     if (sel.length === 0) {
         alert("請先選取項目");
@@ -562,6 +684,10 @@ async function downloadSelected() {
             dest_dir: dest
         });
         
+        if (res.job_id) {
+            trackDownloadJob(res.job_id);
+            return;
+        }
         if (res.result) {
             alert(`下載完成\n成功: ${res.result.ok}\n失敗: ${res.result.fail}`);
         } else {